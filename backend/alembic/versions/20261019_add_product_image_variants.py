@@ -0,0 +1,28 @@
+"""add image_variants column to products
+
+Revision ID: 20261019_add_image_variants
+Revises: 20241231_add_admin_logs
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_image_variants'
+down_revision = '20241231_add_admin_logs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """添加商品衍生图URL列"""
+    op.add_column('products',
+                  sa.Column('image_variants', sa.JSON(), nullable=True)
+                  )
+
+
+def downgrade():
+    """回滚更改"""
+    op.drop_column('products', 'image_variants')
@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from decimal import Decimal
 
-from app.core.database import get_db
+from app.core.database import get_reporting_db
 from app.core.security import get_current_admin
 from app.models import Admin
 from app.schemas import (
@@ -20,7 +20,7 @@ router = APIRouter(prefix="/admin/analytics", tags=["管理后台-统计分析"]
 
 @router.get("/today", response_model=AdminTodayStatsResponse)
 async def get_today_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_reporting_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
@@ -53,7 +53,7 @@ async def get_today_stats(
 @router.get("/trend", response_model=AdminTrendResponse)
 async def get_trend_analysis(
     days: int = Query(7, ge=1, le=90, description="统计天数(1-90天)"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_reporting_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
@@ -96,7 +96,7 @@ async def get_trend_analysis(
 @router.get("/hot-products", response_model=List[AdminHotProductResponse])
 async def get_hot_products(
     limit: int = Query(10, ge=1, le=50, description="返回数量(1-50)"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_reporting_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
@@ -133,7 +133,7 @@ async def get_hot_products(
 async def get_category_sales(
     start_date: str = Query(None, description="开始日期(YYYY-MM-DD)"),
     end_date: str = Query(None, description="结束日期(YYYY-MM-DD)"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_reporting_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
@@ -173,7 +173,7 @@ async def get_category_sales(
 @router.get("/users/growth")
 async def get_user_growth(
     days: int = Query(30, ge=1, le=90, description="统计天数(1-90天)"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_reporting_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
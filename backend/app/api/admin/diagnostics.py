@@ -0,0 +1,88 @@
+"""
+管理后台诊断API(性能分析)
+"""
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core import profiler as profiler_module
+from app.core.config import get_settings
+from app.core.exceptions import ConflictException, NotFoundException
+from app.core.loop_monitor import loop_detector
+from app.core.security import get_current_admin
+from app.models import Admin
+from app.schemas import MessageResponse
+
+settings = get_settings()
+
+router = APIRouter(prefix="/admin/diagnostics", tags=["管理后台-诊断"])
+
+
+@router.get("/loop-blocking", response_model=dict)
+async def get_loop_blocking_report(
+    limit: int = Query(50, ge=1, le=500, description="返回的阻塞位置数量"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    事件循环阻塞汇总
+
+    需要开启LOOP_MONITOR_ENABLED; 按(路由, 阻塞位置)汇总次数和阻塞时间,
+    附带首次采样的调用栈和asyncio慢回调日志
+    """
+    return loop_detector.report(limit)
+
+
+@router.delete("/loop-blocking", response_model=MessageResponse)
+async def reset_loop_blocking_report(current_admin: Admin = Depends(get_current_admin)):
+    """清空事件循环阻塞汇总"""
+    loop_detector.reset()
+    return MessageResponse(message="已清空")
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=settings.PROFILER_MAX_SECONDS, description="采样时长(秒)"),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000, description="采样间隔(毫秒), 默认PROFILER_INTERVAL"),
+    all_threads: bool = Query(False, description="是否包括线程池等非事件循环线程"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    采样分析处理本请求的worker
+
+    返回collapsed stack文本(flamegraph.pl/speedscope可直接读取);
+    多进程部署时只分析处理本请求的那个worker, 同一worker同时只允许一个分析
+    """
+    try:
+        profiler = await profiler_module.profile_worker(
+            seconds,
+            interval=interval_ms / 1000 if interval_ms else None,
+            all_threads=all_threads,
+        )
+    except profiler_module.ProfilerBusy:
+        raise ConflictException("已有性能分析正在进行")
+    summary = profiler.summary()
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "X-Profile-Samples": str(summary["samples"]),
+            "X-Profile-Duration": str(summary["duration_seconds"]),
+            "X-Profile-Pid": str(os.getpid()),
+        },
+    )
+
+
+@router.get("/profiles", response_model=list)
+async def list_request_profiles(current_admin: Admin = Depends(get_current_admin)):
+    """最近的单请求分析结果(不含栈)"""
+    return profiler_module.profile_store.list()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str, current_admin: Admin = Depends(get_current_admin)):
+    """单请求分析结果(collapsed stack文本)"""
+    result = profiler_module.profile_store.get(profile_id)
+    if result is None:
+        raise NotFoundException("分析结果不存在(可能已过期或由其他worker处理)")
+    return PlainTextResponse(result["collapsed"], headers={"X-Profile-Samples": str(result["samples"])})
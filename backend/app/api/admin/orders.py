@@ -9,7 +9,7 @@ from typing import Optional
 from decimal import Decimal
 from datetime import datetime, timedelta
 
-from app.core.database import get_db
+from app.core.database import get_db, get_reporting_db
 from app.core.security import get_current_admin
 from app.models import Admin
 from app.schemas import (
@@ -410,12 +410,13 @@ async def export_orders_csv(
     start_date: Optional[str] = Query(None, description="开始日期(YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="结束日期(YYYY-MM-DD)"),
     db: AsyncSession = Depends(get_db),
+    report_db: AsyncSession = Depends(get_reporting_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
     导出订单数据为CSV
 
-    生成包含订单信息的CSV文件并下载
+    生成包含订单信息的CSV文件并下载(查询使用报表连接池, 审计日志写入主库)
     """
     try:
         service = AdminService()
@@ -424,7 +425,7 @@ async def export_orders_csv(
             status=status,
             start_date=start_date,
             end_date=end_date,
-            db=db
+            db=report_db
         )
 
         # 记录导出操作
@@ -463,7 +464,7 @@ async def export_orders_csv(
 async def get_order_stats(
     start_date: Optional[str] = Query(None, description="开始日期(YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="结束日期(YYYY-MM-DD)"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_reporting_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
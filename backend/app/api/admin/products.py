@@ -1,7 +1,9 @@
 """
 管理后台商品管理API
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+import io
+
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
@@ -11,12 +13,14 @@ from app.models import Admin
 from app.schemas import (
     AdminProductStockUpdate,
     AdminProductBatchOperation,
+    AdminProductBatchResult,
     MessageResponse,
+    ProductImportReport,
     ProductCreate,
     ProductUpdate,
     ProductResponse
 )
-from app.services import AdminService, ProductService
+from app.services import AdminService, ProductService, ProductImportService
 from app.repositories import ProductRepository
 from app.models import Product
 
@@ -265,8 +269,7 @@ async def update_product_stock(
         )
 
         # 清除缓存
-        from app.core.redis_client import redis_client
-        await redis_client.delete_pattern("products:*")
+        await ProductService.invalidate_cache([product_id])
 
         action = "增加" if adjustment > 0 else "减少"
         return MessageResponse(
@@ -279,7 +282,7 @@ async def update_product_stock(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/batch", response_model=MessageResponse)
+@router.post("/batch", response_model=AdminProductBatchResult)
 async def batch_product_operation(
     batch_op: AdminProductBatchOperation,
     db: AsyncSession = Depends(get_db),
@@ -294,48 +297,31 @@ async def batch_product_operation(
     - delete: 批量删除
     """
     try:
-        product_repo = ProductRepository(Product, db)
         service = ProductService()
 
         if batch_op.operation not in ["activate", "deactivate", "delete"]:
             raise HTTPException(status_code=400, detail="无效的操作类型")
 
-        success_count = 0
-        failed_products = []
-
-        for product_id in batch_op.product_ids:
-            try:
-                product = await product_repo.get_by_id(product_id)
-
-                if not product:
-                    failed_products.append({
-                        "product_id": product_id,
-                        "reason": "商品不存在"
-                    })
-                    continue
-
-                if batch_op.operation == "activate":
-                    product.is_active = True
-                    await db.commit()
-
-                elif batch_op.operation == "deactivate":
-                    product.is_active = False
-                    await db.commit()
-
-                elif batch_op.operation == "delete":
-                    await service.delete_product(product_id, db)
-
-                success_count += 1
-
-            except Exception as e:
-                failed_products.append({
-                    "product_id": product_id,
-                    "reason": str(e)
-                })
+        # 整批在一个事务中以集合语句执行, 由RETURNING的ID得出每个商品的结果
+        referenced = []
+        if batch_op.operation == "delete":
+            succeeded, referenced = await service.batch_delete(batch_op.product_ids, db)
+        else:
+            succeeded = await service.batch_set_active(
+                batch_op.product_ids, batch_op.operation == "activate", db
+            )
 
-        # 清除缓存
-        from app.core.redis_client import redis_client
-        await redis_client.delete_pattern("products:*")
+        succeeded_ids = set(succeeded)
+        referenced_ids = set(referenced)
+        failed_products = [
+            {
+                "product_id": product_id,
+                "reason": "商品存在订单或评价记录,无法删除" if product_id in referenced_ids else "商品不存在"
+            }
+            for product_id in dict.fromkeys(batch_op.product_ids)
+            if product_id not in succeeded_ids
+        ]
+        success_count = len(succeeded_ids)
 
         # 记录审计日志
         await AdminService().log_action(
@@ -352,6 +338,13 @@ async def batch_product_operation(
             },
             db=db
         )
+        await db.commit()
+
+        # 提交后清除一次缓存
+        if succeeded:
+            await ProductService.invalidate_cache(
+                succeeded, price_changed=batch_op.operation == "delete"
+            )
 
         operation_names = {
             "activate": "上架",
@@ -363,14 +356,69 @@ async def batch_product_operation(
         if failed_products:
             message += f",失败{len(failed_products)}个"
 
-        return MessageResponse(
+        return AdminProductBatchResult(
             message=message,
-            success=True
+            success=True,
+            success_count=success_count,
+            failed_products=failed_products
         )
     except HTTPException:
         raise
     except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/import", response_model=ProductImportReport)
+async def import_products(
+    file: UploadFile = File(..., description="CSV(带表头)或NDJSON文件, UTF-8编码"),
+    format: Optional[str] = Query(None, description="文件格式: csv/ndjson, 默认按扩展名判断"),
+    create_categories: bool = Query(False, description="自动创建不存在的分类"),
+    db: AsyncSession = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    批量导入商品
+
+    按标题匹配: 已有商品更新文件中提供的字段, 其余商品新增。
+    逐行校验, 不合法的行跳过并在结果中报告行号和原因, 合法行在一个事务中导入。
+    """
+    service = ProductImportService()
+    try:
+        fmt = service.detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report, updated_ids = await service.import_records(
+            service.iter_records(stream, fmt), db, create_missing_categories=create_categories
+        )
+
+        await AdminService().log_action(
+            admin_id=current_admin.id,
+            action="import_products",
+            target_type="product",
+            target_id=None,
+            details={
+                "filename": file.filename,
+                **{key: value for key, value in report.items() if key != "errors"}
+            },
+            db=db
+        )
+        await db.commit()
+
+        await service.invalidate_cache(updated_ids, report["categories_created"])
+        return report
+    except UnicodeDecodeError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="文件必须为UTF-8编码")
+    except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 不关闭上传文件, 由UploadFile负责
+        stream.detach()
 
 
 @router.get("/stock/low")
@@ -1,13 +1,20 @@
 """
 文件上传API路由
 """
+import asyncio
+import hashlib
 import os
-import uuid
+
+import aiofiles
+import aiofiles.os
+import aiofiles.tempfile
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.core.database import get_db
+from app.core import image_store
+from app.core.images import create_variants
 from app.core.security import get_current_admin
 from app.models import Admin
 from app.schemas import MessageResponse
@@ -17,8 +24,57 @@ router = APIRouter(prefix="/admin/uploads", tags=["管理后台-文件上传"])
 # 允许的图片扩展名
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
-# 上传目录
-UPLOAD_DIR = "public/images/products"
+# 单个文件大小上限(5MB)和每次读取的块大小
+MAX_FILE_SIZE = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """上传文件不符合要求(格式或大小)"""
+
+
+async def save_upload(file: UploadFile) -> dict:
+    """
+    分块写入临时文件并计算内容哈希, 超过大小上限时立即中止;
+    完成后放入内容寻址存储, 相同图片只保存一份
+
+    Raises:
+        UploadRejected: 格式不支持或文件过大
+    """
+    file_ext = os.path.splitext(file.filename or "")[1].lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise UploadRejected(f"不支持的文件格式。支持的格式: {', '.join(ALLOWED_EXTENSIONS)}")
+
+    tmp_dir = await asyncio.to_thread(image_store.tmp_dir)
+
+    hasher = hashlib.sha256()
+    size = 0
+    async with aiofiles.tempfile.NamedTemporaryFile(dir=tmp_dir, suffix=".part", delete=False) as tmp:
+        try:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise UploadRejected("文件大小不能超过5MB")
+                hasher.update(chunk)
+                await tmp.write(chunk)
+        except BaseException:
+            await tmp.close()
+            await aiofiles.os.remove(tmp.name)
+            raise
+
+    digest = hasher.hexdigest()
+    url, created = await asyncio.to_thread(image_store.commit_file, tmp.name, digest, file_ext)
+
+    return {
+        "url": url,
+        "filename": os.path.basename(url),
+        "original_filename": file.filename,
+        "size": size,
+        "sha256": digest,
+        "duplicate": not created,
+        # 缩略图和WebP版本(同一原图不会重复生成)
+        "variants": await create_variants(image_store.blob_path(digest, file_ext))
+    }
 
 
 @router.post("/image", response_model=dict)
@@ -32,45 +88,12 @@ async def upload_product_image(
 
     支持的图片格式: jpg, jpeg, png, gif, webp
     最大文件大小: 5MB
+    相同内容的图片返回已有文件(duplicate为true)
     """
     try:
-        # 验证文件扩展名
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        if file_ext not in ALLOWED_EXTENSIONS:
-            raise HTTPException(
-                status_code=400,
-                detail=f"不支持的文件格式。支持的格式: {', '.join(ALLOWED_EXTENSIONS)}"
-            )
-
-        # 创建上传目录
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-        # 生成唯一文件名
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-        # 保存文件
-        contents = await file.read()
-
-        # 验证文件大小（5MB）
-        if len(contents) > 5 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="文件大小不能超过5MB")
-
-        with open(file_path, "wb") as f:
-            f.write(contents)
-
-        # 返回图片URL路径
-        image_url = f"/images/products/{unique_filename}"
-
-        return {
-            "url": image_url,
-            "filename": unique_filename,
-            "original_filename": file.filename,
-            "size": len(contents)
-        }
-
-    except HTTPException:
-        raise
+        return await save_upload(file)
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
 
@@ -84,49 +107,18 @@ async def upload_product_images(
     """
     批量上传商品图片
 
-    支持一次上传多张图片
+    支持一次上传多张图片(并行处理), 格式不支持或超过大小的文件跳过
     """
-    try:
-        if len(files) > 10:
-            raise HTTPException(status_code=400, detail="最多只能上传10张图片")
-
-        uploaded_files = []
-        for file in files:
-            # 验证文件扩展名
-            file_ext = os.path.splitext(file.filename)[1].lower()
-            if file_ext not in ALLOWED_EXTENSIONS:
-                continue
-
-            # 创建上传目录
-            os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-            # 生成唯一文件名
-            unique_filename = f"{uuid.uuid4()}{file_ext}"
-            file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-            # 保存文件
-            contents = await file.read()
-
-            # 验证文件大小（5MB）
-            if len(contents) > 5 * 1024 * 1024:
-                continue
-
-            with open(file_path, "wb") as f:
-                f.write(contents)
-
-            # 返回图片URL路径
-            image_url = f"/images/products/{unique_filename}"
-
-            uploaded_files.append({
-                "url": image_url,
-                "filename": unique_filename,
-                "original_filename": file.filename,
-                "size": len(contents)
-            })
-
-        return uploaded_files
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+    if len(files) > 10:
+        raise HTTPException(status_code=400, detail="最多只能上传10张图片")
+
+    results = await asyncio.gather(*(save_upload(file) for file in files), return_exceptions=True)
+
+    uploaded_files = []
+    for result in results:
+        if isinstance(result, UploadRejected):
+            continue
+        if isinstance(result, BaseException):
+            raise HTTPException(status_code=500, detail=f"文件上传失败: {str(result)}")
+        uploaded_files.append(result)
+    return uploaded_files
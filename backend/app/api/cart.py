@@ -3,7 +3,6 @@
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from typing import List
 from decimal import Decimal
 
@@ -11,7 +10,7 @@ from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models import User
 from app.schemas import (
-    CartItemCreate, CartItemUpdate, CartItemResponse,
+    CartItemCreate, CartItemUpdate, CartItemResponse, CartBatchUpdate,
     MessageResponse
 )
 from app.services import CartService
@@ -19,6 +18,16 @@ from app.services import CartService
 router = APIRouter(prefix="/cart", tags=["购物车管理"])
 
 
+def cart_summary_response(cart_summary: dict) -> dict:
+    """购物车汇总响应"""
+    return {
+        "total_items": cart_summary["total_items"],
+        "total_quantity": cart_summary["total_quantity"],
+        "total_amount": float(cart_summary["total_amount"]),
+        "items": [CartItemResponse.model_validate(item) for item in cart_summary["items"]]
+    }
+
+
 @router.get("", response_model=dict)
 async def get_cart(
     db: AsyncSession = Depends(get_db),
@@ -28,19 +37,45 @@ async def get_cart(
     获取购物车
 
     返回当前用户的购物车内容及汇总信息
-    - 缓存时间: 5分钟
     """
     try:
         service = CartService()
         cart_summary = await service.get_cart_summary(current_user.id, db)
 
-        return {
-            "total_items": cart_summary["total_items"],
-            "total_quantity": cart_summary["total_quantity"],
-            "total_amount": float(cart_summary["total_amount"]),
-            "items": [CartItemResponse.model_validate(item) for item in cart_summary["items"]]
-        }
+        return cart_summary_response(cart_summary)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.patch("", response_model=dict)
+async def batch_update_cart(
+    batch_data: CartBatchUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量修改购物车
+
+    按顺序执行多个set/increment/remove操作, 全部成功或全部失败
+    - 一次批量查询校验所有商品和库存
+    - 返回修改后的购物车(格式同GET /cart)
+    """
+    try:
+        service = CartService()
+        await service.apply_operations(
+            current_user.id,
+            [op.model_dump(mode="json") for op in batch_data.operations],
+            db
+        )
+        await db.commit()
+
+        cart_summary = await service.get_cart_summary(current_user.id, db)
+        return cart_summary_response(cart_summary)
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -66,17 +101,9 @@ async def add_to_cart(
             db=db
         )
 
-        # 手动提交并刷新
+        # 提交(Redis购物车由后台任务写回数据库)
         await db.commit()
 
-        # 重新加载cart_item并eager load product
-        from sqlalchemy.orm import selectinload
-        from app.models import CartItem
-        result = await db.execute(
-            select(CartItem).options(selectinload(CartItem.product)).where(CartItem.id == cart_item.id)
-        )
-        cart_item = result.scalar_one()
-
         return CartItemResponse.model_validate(cart_item)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -106,17 +133,9 @@ async def update_cart_item(
             db=db
         )
 
-        # 手动提交并刷新
+        # 提交(Redis购物车由后台任务写回数据库)
         await db.commit()
 
-        # 重新加载cart_item并eager load product
-        from sqlalchemy.orm import selectinload
-        from app.models import CartItem
-        result = await db.execute(
-            select(CartItem).options(selectinload(CartItem.product)).where(CartItem.id == cart_item.id)
-        )
-        cart_item = result.scalar_one()
-
         return CartItemResponse.model_validate(cart_item)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -146,6 +165,7 @@ async def remove_from_cart(
         if not success:
             raise HTTPException(status_code=404, detail="购物车商品不存在")
 
+        await db.commit()
         return MessageResponse(message="商品已从购物车删除", success=True)
     except HTTPException:
         raise
@@ -166,6 +186,7 @@ async def clear_cart(
     try:
         service = CartService()
         success = await service.clear_cart(current_user.id, db)
+        await db.commit()
 
         return MessageResponse(message="购物车已清空", success=True)
     except Exception as e:
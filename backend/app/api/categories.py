@@ -1,7 +1,7 @@
 """
 分类相关API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
@@ -13,12 +13,14 @@ from app.schemas import (
     MessageResponse
 )
 from app.services import CategoryService
+from app.core.response_cache import cached_json_response, check_catalog_etag, request_encoding
 
 router = APIRouter(prefix="/categories", tags=["分类管理"])
 
 
 @router.get("", response_model=List[CategoryResponse])
 async def get_categories(
+    request: Request,
     skip: int = Query(0, ge=0, description="跳过数量"),
     limit: int = Query(100, ge=1, le=100, description="返回数量"),
     db: AsyncSession = Depends(get_db)
@@ -28,11 +30,18 @@ async def get_categories(
 
     返回所有启用的分类,按排序字段和创建时间排序
     - 缓存时间: 30分钟
+    - 支持ETag/If-None-Match
     """
     try:
+        etag, not_modified = await check_catalog_etag(request)
+        if not_modified:
+            return not_modified
+
         service = CategoryService()
-        categories = await service.get_categories(db, skip, limit)
-        return [CategoryResponse.model_validate(c) for c in categories]
+        cached = await service.get_categories_response(
+            db, skip, limit, encoding=request_encoding(request)
+        )
+        return cached_json_response(request, cached, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -13,6 +13,7 @@ from app.schemas import (
     ProductResponse, MessageResponse
 )
 from app.models import Favorite, Product
+from app.services import ProductService
 
 
 router = APIRouter(prefix="/favorites", tags=["收藏"])
@@ -38,20 +39,9 @@ async def get_favorites(
         result = await db.execute(stmt)
         favorites = result.scalars().all()
 
-        # 获取收藏的商品详情
+        # 获取收藏的商品详情(批量读取缓存, 按收藏顺序返回)
         product_ids = [f.product_id for f in favorites]
-        products = []
-
-        if product_ids:
-            stmt = select(Product).where(Product.id.in_(product_ids))
-            result = await db.execute(stmt)
-            product_list = result.scalars().all()
-
-            # 按收藏顺序排序
-            product_dict = {p.id: p for p in product_list}
-            for pid in product_ids:
-                if pid in product_dict:
-                    products.append(product_dict[pid])
+        products = await ProductService().get_products_by_ids(product_ids, db)
 
         # 转换为ProductResponse
         product_responses = [
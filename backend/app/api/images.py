@@ -0,0 +1,49 @@
+"""
+图片API路由
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, Response
+
+from app.core.config import get_settings
+from app.core.images import RESIZE_FORMATS, resize_cache, resolve_source
+
+settings = get_settings()
+
+router = APIRouter(prefix="/images", tags=["图片"])
+
+
+@router.get("/resize")
+async def resize_image(
+    path: str = Query(..., description="商品图片路径(local_image_path, 如/static/xxx.png)"),
+    w: int = Query(..., ge=1, le=settings.IMAGE_RESIZE_MAX_DIMENSION, description="最大宽度"),
+    h: Optional[int] = Query(None, ge=1, le=settings.IMAGE_RESIZE_MAX_DIMENSION, description="最大高度, 默认与宽度相同"),
+    format: str = Query("webp", description=f"输出格式: {'/'.join(RESIZE_FORMATS)}")
+):
+    """
+    按需缩放商品图片
+
+    等比缩放到不超过w x h(不放大)。首次请求时生成并缓存在磁盘, 之后直接返回缓存文件。
+    """
+    fmt = format.lower()
+    if fmt not in RESIZE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的格式: {format}")
+
+    source = resolve_source(path)
+    if source is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+
+    try:
+        cached = await resize_cache.get(source, w, h or w, fmt)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"图片处理失败: {e}")
+
+    headers = {"Cache-Control": f"public, max-age={settings.IMAGE_RESIZE_MAX_AGE}"}
+    if settings.IMAGE_RESIZE_ACCEL_PREFIX:
+        # 由nginx直接发送缓存文件(sendfile)
+        headers["X-Accel-Redirect"] = (
+            settings.IMAGE_RESIZE_ACCEL_PREFIX + str(cached.relative_to(resize_cache.directory))
+        )
+        return Response(media_type=RESIZE_FORMATS[fmt], headers=headers)
+    return FileResponse(cached, media_type=RESIZE_FORMATS[fmt], headers=headers)
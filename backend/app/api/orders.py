@@ -6,14 +6,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional
 
+from app.core import metrics
 from app.core.database import get_db
+from app.core.read_routing import mark_user_write
 from app.core.security import get_current_user
 from app.models import User
 from app.schemas import (
     OrderCreate, OrderResponse, OrderAmountBreakdown,
     MessageResponse, PaginatedResponse
 )
-from app.services import OrderService
+from app.services import OrderService, CartService, ProductService
 
 router = APIRouter(prefix="/orders", tags=["订单管理"])
 
@@ -85,6 +87,9 @@ async def create_order(
 
         # 提交事务
         await db.commit()
+        metrics.ORDERS_CREATED.inc(getattr(order.delivery_type, "value", order.delivery_type))
+        await mark_user_write(current_user.id)
+        await ProductService.invalidate_stock([item.product_id for item in order.order_items])
 
         print("DEBUG[API]: 事务提交完成", file=sys.stderr)
         return OrderResponse.model_validate(order)
@@ -179,7 +184,11 @@ async def cancel_order(
     """
     try:
         service = OrderService()
-        await service.cancel_order(order_id, current_user.id, db)
+        order = await service.cancel_order(order_id, current_user.id, db)
+        product_ids = [item.product_id for item in order.order_items]
+        await db.commit()
+        await mark_user_write(current_user.id)
+        await ProductService.invalidate_stock(product_ids)
 
         return MessageResponse(message="订单已取消", success=True)
     except ValueError as e:
@@ -207,6 +216,7 @@ async def pay_order(
 
         # 提交事务以保存状态更改
         await db.commit()
+        await mark_user_write(current_user.id)
 
         # Eager load order_items以避免MissingGreenlet错误
         from sqlalchemy.orm import selectinload
@@ -240,6 +250,7 @@ async def confirm_order(
     try:
         service = OrderService()
         order = await service.confirm_order(order_id, current_user.id, db)
+        await mark_user_write(current_user.id)
 
         # Eager load order_items以避免MissingGreenlet错误
         from sqlalchemy.orm import selectinload
@@ -268,20 +279,16 @@ async def preview_order_amount(
     根据当前购物车和配送类型计算订单金额(不创建订单)
     """
     try:
-        from app.repositories import CartRepository
-        from app.models import CartItem
-
-        cart_repo = CartRepository(CartItem, db)
         service = OrderService()
 
-        # 获取购物车
-        cart_items = await cart_repo.get_user_cart(current_user.id)
+        # 获取购物车汇总(预先维护的汇总, 不加载购物车行)
+        cart_totals = await CartService().get_cart_totals(current_user.id, db)
 
-        if not cart_items:
+        if not cart_totals["total_items"]:
             raise HTTPException(status_code=400, detail="购物车为空")
 
         # 计算金额
-        amount_breakdown = service.calculate_order_amount(cart_items, delivery_type)
+        amount_breakdown = service.calculate_amount_breakdown(cart_totals["total_amount"], delivery_type)
 
         return OrderAmountBreakdown(
             subtotal=float(amount_breakdown["subtotal"]),
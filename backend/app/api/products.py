@@ -1,7 +1,7 @@
 """
 商品相关API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from decimal import Decimal
@@ -14,6 +14,8 @@ from app.schemas import (
     MessageResponse, PaginatedResponse
 )
 from app.services import ProductService
+from app.core.response_cache import cached_json_response, check_catalog_etag, request_encoding
+from app.core.redis_client import redis_client
 from app.core.exceptions import AppException
 
 router = APIRouter(prefix="/products", tags=["商品管理"])
@@ -21,6 +23,7 @@ router = APIRouter(prefix="/products", tags=["商品管理"])
 
 @router.get("", response_model=dict)
 async def get_products(
+    request: Request,
     category_id: Optional[int] = Query(None, description="分类ID"),
     keyword: Optional[str] = Query(None, description="搜索关键词"),
     sort_by: str = Query("created_at", description="排序方式: price_asc, price_desc, sales, views, created_at"),
@@ -34,36 +37,31 @@ async def get_products(
     支持分类筛选、关键词搜索、排序、分页
     - 缓存时间: 10分钟
     - 排序选项: price_asc(价格升序), price_desc(价格降序), sales(销量), views(浏览量), created_at(创建时间)
+    - 支持ETag/If-None-Match
     """
     try:
+        etag, not_modified = await check_catalog_etag(request)
+        if not_modified:
+            return not_modified
+
         service = ProductService()
-        products, total = await service.get_products(
+        cached = await service.get_products_response(
             category_id=category_id,
             keyword=keyword,
             sort_by=sort_by,
             page=page,
             page_size=page_size,
-            db=db
+            db=db,
+            encoding=request_encoding(request)
         )
-
-        # 计算总页数
-        total_pages = (total + page_size - 1) // page_size
-
-        return {
-            "products": [ProductResponse.model_validate(p) for p in products],
-            "pagination": {
-                "total": total,
-                "page": page,
-                "page_size": page_size,
-                "total_pages": total_pages
-            }
-        }
+        return cached_json_response(request, cached, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/hot", response_model=List[ProductResponse])
 async def get_hot_products(
+    request: Request,
     limit: int = Query(10, ge=1, le=50, description="返回数量"),
     db: AsyncSession = Depends(get_db)
 ):
@@ -72,11 +70,18 @@ async def get_hot_products(
 
     按销量排序,返回最热销的商品
     - 缓存时间: 30分钟
+    - 支持ETag/If-None-Match
     """
     try:
+        etag, not_modified = await check_catalog_etag(request)
+        if not_modified:
+            return not_modified
+
         service = ProductService()
-        products = await service.get_hot_products(limit=limit, db=db)
-        return [ProductResponse.model_validate(p) for p in products]
+        cached = await service.get_hot_products_response(
+            limit=limit, db=db, encoding=request_encoding(request)
+        )
+        return cached_json_response(request, cached, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -121,6 +126,7 @@ async def search_products(
 
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product_detail(
+    request: Request,
     product_id: int,
     db: AsyncSession = Depends(get_db)
 ):
@@ -130,15 +136,24 @@ async def get_product_detail(
     返回商品的详细信息,包括分类信息
     - 缓存时间: 1小时
     - 自动增加浏览量
+    - 支持ETag/If-None-Match
     """
     try:
+        etag, not_modified = await check_catalog_etag(request)
+        if not_modified:
+            # 客户端使用本地副本, 仍计入浏览量
+            await redis_client.increment_view_count(product_id)
+            return not_modified
+
         service = ProductService()
-        product = await service.get_product_detail(product_id, db)
+        cached = await service.get_product_detail_response(
+            product_id, db, encoding=request_encoding(request)
+        )
 
-        if not product:
+        if not cached:
             raise HTTPException(status_code=404, detail="商品不存在")
 
-        return ProductResponse.model_validate(product)
+        return cached_json_response(request, cached, etag)
     except HTTPException:
         raise
     except Exception as e:
@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.core.database import get_db
+from app.core.read_routing import mark_user_write
 from app.core.security import get_current_user
 from app.models import User
 from app.schemas import (
@@ -46,6 +47,7 @@ async def create_review(
             images=review_data.images,
             db=db
         )
+        await mark_user_write(current_user.id)
 
         # 解析图片JSON字符串
         if review.images:
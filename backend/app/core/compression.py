@@ -0,0 +1,94 @@
+"""
+响应压缩
+- 缓存的目录响应在写入缓存时预压缩(gzip, 安装brotli时同时生成br), 命中时直接返回
+- 其余API响应由APICompressionMiddleware动态gzip压缩
+"""
+import gzip
+from typing import Dict, Optional, Tuple
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+settings = get_settings()
+
+# 支持的编码, 按优先级排列
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """按指定编码压缩"""
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime固定为0, 相同内容的压缩结果相同
+        return gzip.compress(body, compresslevel=settings.PRECOMPRESS_GZIP_LEVEL, mtime=0)
+    raise ValueError(f"不支持的编码: {encoding}")
+
+
+def precompress(body: bytes) -> Dict[str, bytes]:
+    """生成所有支持编码的压缩版本, 小响应不压缩"""
+    if len(body) < settings.COMPRESSION_MIN_SIZE:
+        return {}
+    return {encoding: compress(body, encoding) for encoding in SUPPORTED_ENCODINGS}
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """根据Accept-Encoding选择编码, 客户端不接受任何支持的编码时返回None"""
+    if not accept_encoding:
+        return None
+
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    for encoding in SUPPORTED_ENCODINGS:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class APICompressionMiddleware(GZipMiddleware):
+    """API响应gzip压缩
+
+    只处理API路径, exclude_prefixes下的路径(返回图片等已压缩格式的接口)不处理;
+    已设置Content-Encoding的响应(预压缩的缓存响应)原样返回
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        path_prefix: str,
+        minimum_size: int = 500,
+        compresslevel: int = 6,
+        exclude_prefixes: Tuple[str, ...] = ()
+    ):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.path_prefix = path_prefix
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if (
+            scope["type"] == "http"
+            and path.startswith(self.path_prefix)
+            and not path.startswith(self.exclude_prefixes)
+        ):
+            await super().__call__(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -1,6 +1,21 @@
+"""
+数据库引擎和会话
+- primary: 主库, 所有写操作和默认的读操作(get_db)
+- replica: 只读副本(DATABASE_REPLICA_URL, 可选); 配置后get_db的会话为RoutingSession,
+  只有@replica_reads标记的只读service方法中的普通SELECT会发到副本, 其余仍走主库;
+  回填共享缓存的方法用@primary_reads标记, 始终读主库
+- reporting: 报表/导出专用的小连接池(get_reporting_db), 默认连接只读副本或主库;
+  独立的连接池保证耗时的统计和导出不会占满下单等请求使用的主库连接
+连接池参数均来自Settings
+"""
+import functools
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from typing import AsyncGenerator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import Delete, Insert, Select, Update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from typing import AsyncGenerator, Dict, Optional
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -8,47 +23,172 @@ settings = get_settings()
 # 检查是否为测试环境
 IS_TESTING = os.getenv("TESTING", "false").lower() == "true"
 
-# 只在非测试环境创建生产数据库引擎
-if not IS_TESTING:
-    # 根据数据库类型创建引擎
-    if "sqlite" in settings.DATABASE_URL.lower():
-        # SQLite配置
-        engine = create_async_engine(
-            settings.DATABASE_URL,
-            echo=settings.DEBUG,
-        )
-    else:
-        # PostgreSQL/MySQL配置（带连接池）
-        engine = create_async_engine(
-            settings.DATABASE_URL,
-            echo=settings.DEBUG,
-            pool_pre_ping=True,
-            pool_size=10,
-            max_overflow=20
-        )
+# 连接池名称
+PRIMARY, REPLICA, REPORTING = "primary", "replica", "reporting"
 
-    # 创建异步SessionLocal类
-    AsyncSessionLocal = async_sessionmaker(
-        engine,
+
+def create_engine_for(
+    url: str,
+    pool_size: int,
+    max_overflow: int,
+    pool_timeout: float = 30.0,
+) -> AsyncEngine:
+    """
+    按数据库类型创建引擎(SQLite不使用连接池参数)
+
+    asyncpg连接按DB_PREPARED_STATEMENT_CACHE_SIZE缓存预编译语句,
+    同一SQL再次执行时跳过服务端的解析和计划
+    """
+    if "sqlite" in url.lower():
+        return create_async_engine(url, echo=settings.DEBUG, query_cache_size=settings.DB_COMPILED_CACHE_SIZE)
+    connect_args = {}
+    if "asyncpg" in url.lower():
+        connect_args["prepared_statement_cache_size"] = settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+    # PostgreSQL/MySQL配置（带连接池）
+    return create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        query_cache_size=settings.DB_COMPILED_CACHE_SIZE,
+        connect_args=connect_args,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+
+
+# 当前调用处于@replica_reads标记的只读方法中
+_replica_allowed: ContextVar[bool] = ContextVar("replica_allowed", default=False)
+# 当前请求必须读主库(写请求, 或刚写入过的用户, 见read_routing)
+_primary_pinned: ContextVar[bool] = ContextVar("primary_pinned", default=False)
+
+
+def replica_reads(func):
+    """标记只读的异步方法: 其中的查询可以发到只读副本"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _replica_allowed.set(True)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _replica_allowed.reset(token)
+
+    return wrapper
+
+
+def primary_reads(func):
+    """
+    标记回填共享缓存(Redis)的异步方法: 其中的查询始终读主库
+
+    副本有延迟, 从副本回填会把写入前的数据以新的目录版本号缓存CACHE_TTL;
+    即使调用方处于@replica_reads方法中也读主库
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with pin_primary():
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def pin_primary():
+    """范围内的查询都读主库(即使处于@replica_reads方法中)"""
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+class RoutingSession(Session):
+    """
+    按语句选择连接: 只读方法中的普通SELECT发到副本(info["replica"]), 其余发到主库
+
+    会话写入(flush或INSERT/UPDATE/DELETE)后, 之后的查询都读主库, 保证读到自己的写入;
+    SELECT ... FOR UPDATE始终在主库
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.info.get(REPLICA)
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info["wrote"] = True
+        elif (
+            replica is not None
+            and _replica_allowed.get()
+            and not _primary_pinned.get()
+            and not self.info.get("wrote")
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+        ):
+            return replica
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+def create_session_factory(bind: AsyncEngine, replica: Optional[AsyncEngine] = None) -> async_sessionmaker:
+    """会话工厂; 提供replica时使用RoutingSession"""
+    options = {}
+    if replica is not None:
+        options = {"sync_session_class": RoutingSession, "info": {REPLICA: replica.sync_engine}}
+    return async_sessionmaker(
+        bind,
         class_=AsyncSession,
         expire_on_commit=False,
         autocommit=False,  # 保持autocommit=False，手动管理事务
-        autoflush=False
+        autoflush=False,
+        **options
+    )
+
+
+# 只在非测试环境创建生产数据库引擎
+if not IS_TESTING:
+    engine = create_engine_for(
+        settings.DATABASE_URL,
+        settings.DB_POOL_SIZE,
+        settings.DB_MAX_OVERFLOW,
+        settings.DB_POOL_TIMEOUT,
+    )
+    replica_engine: Optional[AsyncEngine] = None
+    if settings.DATABASE_REPLICA_URL:
+        replica_engine = create_engine_for(
+            settings.DATABASE_REPLICA_URL,
+            settings.DB_REPLICA_POOL_SIZE,
+            settings.DB_REPLICA_MAX_OVERFLOW,
+            settings.DB_POOL_TIMEOUT,
+        )
+    reporting_engine = create_engine_for(
+        settings.DATABASE_REPORTING_URL or settings.DATABASE_REPLICA_URL or settings.DATABASE_URL,
+        settings.DB_REPORTING_POOL_SIZE,
+        settings.DB_REPORTING_MAX_OVERFLOW,
+        settings.DB_REPORTING_POOL_TIMEOUT,
     )
+
+    # 创建异步SessionLocal类
+    AsyncSessionLocal = create_session_factory(engine, replica_engine)
+    ReportingSessionLocal = create_session_factory(reporting_engine)
 else:
     # 测试环境使用占位符
     engine = None
+    replica_engine = None
+    reporting_engine = None
     AsyncSessionLocal = None
+    ReportingSessionLocal = None
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    """获取异步数据库会话"""
+def get_engines() -> Dict[str, AsyncEngine]:
+    """已创建的引擎(按连接池名称; 测试环境为空)"""
+    engines = {PRIMARY: engine, REPLICA: replica_engine, REPORTING: reporting_engine}
+    return {name: value for name, value in engines.items() if value is not None}
+
+
+async def _session(factory: async_sessionmaker) -> AsyncGenerator[AsyncSession, None]:
     if IS_TESTING:
         # 测试环境不应该调用这个函数
         raise RuntimeError("测试环境应该使用test_db fixture")
 
     # 创建session但不使用context manager，避免自动rollback
-    session = AsyncSessionLocal()
+    session = factory()
     try:
         yield session
     finally:
@@ -57,6 +197,18 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """获取异步数据库会话(主库; 配置副本时@replica_reads方法中的查询可读副本)"""
+    async for session in _session(AsyncSessionLocal):
+        yield session
+
+
+async def get_reporting_db() -> AsyncGenerator[AsyncSession, None]:
+    """获取报表/导出用的数据库会话(独立连接池, 可能连接只读副本, 不要用于写操作)"""
+    async for session in _session(ReportingSessionLocal):
+        yield session
+
+
 async def init_db():
     """初始化数据库（仅在非测试环境）"""
     if IS_TESTING:
@@ -65,3 +217,9 @@ async def init_db():
     from app.models import Base
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def dispose_engines():
+    """关闭所有连接池"""
+    for value in get_engines().values():
+        await value.dispose()
@@ -0,0 +1,205 @@
+"""
+健康检查和就绪探针
+- /health/live: 进程存活即返回200, 不访问外部依赖
+- /health/ready: 带超时地检查数据库和Redis, 报告连接池饱和度和事件循环延迟;
+  结果缓存HEALTH_CACHE_SECONDS秒, 并发探针共享同一次检查
+- Redis不可用时进入只读降级模式: ReadOnlyModeMiddleware拒绝写请求(503),
+  避免购物车等依赖Redis的写入绕过缓存直接写库后与Redis中未写回的数据冲突
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.redis_client import redis_client
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 检查结果状态
+OK, WARN, ERROR, DISABLED = "ok", "warn", "error", "disabled"
+
+# 不会修改数据的请求方法
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _default_engine():
+    from app.core.database import engine
+    return engine
+
+
+async def check_database(engine, timeout: float) -> dict:
+    """执行SELECT 1(包含从连接池获取连接的时间)"""
+    if engine is None:
+        return {"status": DISABLED}
+    started = time.perf_counter()
+    try:
+        async def ping():
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        await asyncio.wait_for(ping(), timeout)
+    except asyncio.TimeoutError:
+        return {"status": ERROR, "error": f"超时({timeout}s)"}
+    except Exception as e:
+        return {"status": ERROR, "error": str(e)[:200]}
+    return {"status": OK, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+async def check_redis(timeout: float) -> dict:
+    """PING Redis(未初始化时为disabled)"""
+    if not redis_client.is_connected:
+        return {"status": DISABLED}
+    started = time.perf_counter()
+    if not await redis_client.ping(timeout):
+        return {"status": ERROR, "error": "PING失败或超时"}
+    return {"status": OK, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+def check_pool(engine) -> dict:
+    """连接池饱和度(已借出连接数 / 最大连接数)"""
+    pool = getattr(engine, "pool", None)
+    if pool is None or not hasattr(pool, "checkedout"):
+        return {"status": DISABLED}
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    checked_out = pool.checkedout()
+    saturation = checked_out / capacity if capacity else 0.0
+    return {
+        "status": WARN if saturation >= settings.HEALTH_POOL_SATURATION_WARN else OK,
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "saturation": round(saturation, 3),
+    }
+
+
+def check_event_loop() -> dict:
+    """最近测得的事件循环延迟"""
+    lag = metrics.LOOP_LAG.value()
+    return {
+        "status": WARN if lag >= settings.HEALTH_LOOP_LAG_WARN else OK,
+        "lag_ms": round(lag * 1000, 2),
+    }
+
+
+class HealthChecker:
+    """依赖检查(结果短时间缓存, 并发调用共享同一次检查)"""
+
+    def __init__(self, engine_getter: Callable = _default_engine):
+        self._engine_getter = engine_getter
+        self._report: Optional[dict] = None
+        self._checked_at = 0.0
+        self._pending: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def read_only(self) -> bool:
+        """是否处于只读降级模式(最近一次检查Redis不可用)"""
+        return bool(self._report and self._report["read_only"])
+
+    async def check(self, max_age: Optional[float] = None) -> dict:
+        """返回不超过max_age秒的检查结果, 默认HEALTH_CACHE_SECONDS"""
+        if max_age is None:
+            max_age = settings.HEALTH_CACHE_SECONDS
+        if self._report is not None and time.monotonic() - self._checked_at < max_age:
+            return self._report
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._refresh())
+            self._pending.add_done_callback(self._clear_pending)
+        return await asyncio.shield(self._pending)
+
+    def _clear_pending(self, future: asyncio.Future):
+        self._pending = None
+
+    async def _refresh(self) -> dict:
+        engine = self._engine_getter()
+        timeout = settings.HEALTH_CHECK_TIMEOUT
+        database, redis = await asyncio.gather(check_database(engine, timeout), check_redis(timeout))
+        checks = {
+            "database": database,
+            "redis": redis,
+            "db_pool": check_pool(engine),
+            "event_loop": check_event_loop(),
+        }
+        read_only = redis["status"] == ERROR and settings.HEALTH_READ_ONLY_WHEN_REDIS_DOWN
+        if database["status"] == ERROR:
+            overall = "unavailable"
+        elif any(check["status"] in (ERROR, WARN) for check in checks.values()):
+            overall = "degraded"
+        else:
+            overall = "ok"
+
+        report = {
+            "status": overall,
+            "read_only": read_only,
+            "checked_at": datetime.utcnow().isoformat(),
+            "checks": checks,
+        }
+        if self._report is not None and self._report["read_only"] != read_only:
+            if read_only:
+                logger.error("Redis不可用, 进入只读降级模式")
+            else:
+                logger.info("Redis已恢复, 退出只读降级模式")
+        self._report, self._checked_at = report, time.monotonic()
+        return report
+
+    def start(self) -> None:
+        """启动后台定期检查(没有探针请求时也能及时进入/退出只读模式)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台检查"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check(max_age=0)
+            except Exception as e:
+                logger.error(f"健康检查失败: {e}")
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+
+health_checker = HealthChecker()
+
+
+class ReadOnlyModeMiddleware:
+    """只读降级模式下拒绝API写请求(登录等豁免路径除外)"""
+
+    def __init__(self, app: ASGIApp, checker: HealthChecker, path_prefix: str):
+        self.app = app
+        self.checker = checker
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] == "http"
+            and self.checker.read_only
+            and scope["method"] not in SAFE_METHODS
+            and scope["path"].startswith(self.path_prefix)
+            and scope["path"] not in settings.HEALTH_READ_ONLY_EXEMPT_PATHS
+        ):
+            response = JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"message": "服务暂时只读, 请稍后重试", "success": False, "detail": "read_only"},
+                headers={"Retry-After": str(int(settings.HEALTH_CHECK_INTERVAL) or 1)},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
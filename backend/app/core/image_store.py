@@ -0,0 +1,169 @@
+"""
+图片内容寻址存储
+上传和导入的商品图片按内容SHA-256命名, 存放在两级分片目录中(ab/cd/abcd...ext):
+- 相同图片只保存一份, 重复写入直接返回已有文件
+- 文件内容与URL一一对应且不会改变, 可以设置长期缓存(immutable)
+- 引用计数来自Product.local_image_path, 不再被任何商品引用的文件由collect_garbage回收
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 计算哈希和复制时每次读取的块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 写入中的临时文件目录(与存储目录在同一文件系统, 完成后原子重命名)
+TMP_DIR_NAME = ".tmp"
+
+
+def blob_name(digest: str, ext: str) -> str:
+    """文件相对路径(按哈希前4位分两级目录)"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def blob_url(digest: str, ext: str) -> str:
+    """文件访问URL"""
+    return f"{settings.IMAGE_STORE_URL}/{blob_name(digest, ext)}"
+
+
+def blob_path(digest: str, ext: str) -> Path:
+    """文件本地路径"""
+    return Path(settings.IMAGE_STORE_DIR) / blob_name(digest, ext)
+
+
+def tmp_dir() -> Path:
+    """临时文件目录"""
+    path = Path(settings.IMAGE_STORE_DIR) / TMP_DIR_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def url_to_name(url: Optional[str]) -> Optional[str]:
+    """存储URL转换为文件相对路径, 不是存储中的URL时返回None"""
+    prefix = f"{settings.IMAGE_STORE_URL}/"
+    if not url or not url.startswith(prefix):
+        return None
+    return url[len(prefix):]
+
+
+def file_digest(path: Path) -> str:
+    """分块计算文件SHA-256"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def commit_file(tmp_path: str, digest: str, ext: str) -> Tuple[str, bool]:
+    """
+    将已写完的临时文件放入存储(在线程池中执行)
+
+    Returns:
+        (URL, 是否新建); 文件已存在时删除临时文件
+    """
+    path = blob_path(digest, ext)
+    if path.exists():
+        os.remove(tmp_path)
+        # 刷新mtime, 避免刚上传的重复图片在保存商品前被回收
+        os.utime(path)
+        return blob_url(digest, ext), False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, path)
+    return blob_url(digest, ext), True
+
+
+def store_file(source: Path) -> Tuple[str, bool]:
+    """
+    复制本地文件到存储(导入时使用), 内容已存在时不复制
+
+    Returns:
+        (URL, 是否新建)
+    """
+    source = Path(source)
+    ext = source.suffix.lower()
+    digest = file_digest(source)
+    path = blob_path(digest, ext)
+    if path.exists():
+        os.utime(path)
+        return blob_url(digest, ext), False
+
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir(), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as dst, open(source, "rb") as src:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return commit_file(tmp_path, digest, ext)
+
+
+def iter_blobs() -> Iterator[Path]:
+    """遍历存储中的全部文件(不含临时目录)"""
+    root = Path(settings.IMAGE_STORE_DIR)
+    if not root.exists():
+        return
+    for shard in sorted(root.iterdir()):
+        if shard.name == TMP_DIR_NAME or not shard.is_dir():
+            continue
+        for path in shard.glob("*/*"):
+            if path.is_file():
+                yield path
+
+
+def collect_garbage(
+    referenced: Iterable[str],
+    grace_seconds: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """
+    删除未被引用的文件(在线程池或脚本中执行)
+
+    Args:
+        referenced: 仍被引用的存储URL
+        grace_seconds: 最近写入的文件保留时间, 默认IMAGE_STORE_GC_GRACE_SECONDS
+        dry_run: 只统计不删除
+
+    Returns:
+        {"scanned", "referenced", "removed", "freed_bytes"}
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.IMAGE_STORE_GC_GRACE_SECONDS
+    names = {name for name in map(url_to_name, referenced) if name}
+    root = Path(settings.IMAGE_STORE_DIR)
+    cutoff = time.time() - grace_seconds
+    stats = {"scanned": 0, "referenced": 0, "removed": 0, "freed_bytes": 0}
+
+    for path in iter_blobs():
+        stats["scanned"] += 1
+        if path.relative_to(root).as_posix() in names:
+            stats["referenced"] += 1
+            continue
+        stat = path.stat()
+        if stat.st_mtime > cutoff:
+            continue
+        stats["removed"] += 1
+        stats["freed_bytes"] += stat.st_size
+        if not dry_run:
+            path.unlink(missing_ok=True)
+
+    # 中断的写入留下的临时文件
+    tmp_root = root / TMP_DIR_NAME
+    if not dry_run and tmp_root.exists():
+        for path in tmp_root.iterdir():
+            if path.stat().st_mtime <= cutoff:
+                path.unlink(missing_ok=True)
+
+    if not dry_run:
+        logger.info(f"图片存储回收完成: {stats}")
+    return stats
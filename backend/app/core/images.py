@@ -0,0 +1,305 @@
+"""
+商品图片衍生图
+为商品原图生成固定尺寸的缩略图, 编码为WebP(安装pillow-avif-plugin时同时生成AVIF):
+- 文件名由原图内容哈希和尺寸组成, 同一原图只生成一次, 重复调用直接返回已有文件
+- 解码/缩放/编码在进程池中执行, 不阻塞事件循环
+
+按需缩放(ResizeCache): 任意尺寸在首次请求时于线程池中生成, 结果缓存在磁盘,
+按总字节数LRU淘汰, 同一尺寸的并发请求只生成一次。
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+from app.core.config import get_settings
+
+try:
+    import pillow_avif  # noqa: F401  可选依赖, 导入时注册AVIF编码器
+except ImportError:
+    pillow_avif = None
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 生成的格式, 按优先级排列
+VARIANT_FORMATS = ("avif", "webp") if pillow_avif is not None else ("webp",)
+
+# 按需缩放支持的输出格式 -> Content-Type
+RESIZE_FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+if pillow_avif is not None:
+    RESIZE_FORMATS["avif"] = "image/avif"
+
+# 商品图片路径前缀 -> 文件目录(与main.py中的静态文件挂载一致)
+PUBLIC_IMAGES_DIR = "public/images"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def content_hash(data: bytes) -> str:
+    """原图内容哈希"""
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+
+def variant_name(digest: str, max_size: int, fmt: str) -> str:
+    """衍生图相对路径(按哈希前两位分目录)"""
+    return f"{digest[:2]}/{digest}_{max_size}.{fmt}"
+
+
+def save_options(fmt: str) -> dict:
+    """各格式的编码参数"""
+    if fmt == "avif":
+        return {"quality": settings.IMAGE_AVIF_QUALITY}
+    if fmt == "jpeg":
+        return {"quality": settings.IMAGE_WEBP_QUALITY, "optimize": True}
+    if fmt == "png":
+        return {"optimize": True}
+    return {"quality": settings.IMAGE_WEBP_QUALITY, "method": 4}
+
+
+def load_image(data: bytes, fmt: str) -> Image.Image:
+    """解码原图, 按EXIF方向旋转, 转换为目标格式支持的色彩模式"""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    has_alpha = image.mode in ("RGBA", "LA", "P")
+    return image.convert("RGBA" if has_alpha and fmt != "jpeg" else "RGB")
+
+
+def write_image(image: Image.Image, path: Path, fmt: str):
+    """编码并写入文件(先写临时文件再替换, 并发生成同一张图时不会读到半个文件)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{id(image)}.tmp")
+    image.save(tmp_path, format=fmt.upper(), **save_options(fmt))
+    os.replace(tmp_path, path)
+
+
+def resolve_source(image_path: Optional[str]) -> Optional[Path]:
+    """商品图片路径(/static/..., /images/...)转换为本地文件, 文件不存在或路径越界时返回None"""
+    if not image_path:
+        return None
+    for prefix, directory in (
+        (f"{settings.STATIC_URL_PREFIX}/", settings.STATIC_FILES_PATH),
+        ("/images/", PUBLIC_IMAGES_DIR),
+    ):
+        if image_path.startswith(prefix):
+            base = Path(directory).resolve()
+            path = (base / image_path[len(prefix):]).resolve()
+            if base in path.parents and path.is_file():
+                return path
+            return None
+    return None
+
+
+def generate_variants(source_path: str) -> Dict[str, Dict[str, str]]:
+    """
+    生成一张原图的全部衍生图(在进程池中执行), 已存在的文件跳过
+
+    Returns:
+        {尺寸名: {格式: URL}}
+    """
+    data = Path(source_path).read_bytes()
+    digest = content_hash(data)
+    output_dir = Path(settings.IMAGE_DERIVATIVES_DIR)
+    image = None
+
+    variants: Dict[str, Dict[str, str]] = {}
+    for size_name, max_size in settings.IMAGE_VARIANT_SIZES.items():
+        variants[size_name] = {}
+        for fmt in VARIANT_FORMATS:
+            name = variant_name(digest, max_size, fmt)
+            path = output_dir / name
+            if not path.exists():
+                if image is None:
+                    image = load_image(data, fmt)
+                resized = image.copy()
+                # 等比缩放到最长边不超过max_size, 不放大
+                resized.thumbnail((max_size, max_size), Image.LANCZOS)
+                write_image(resized, path, fmt)
+            variants[size_name][fmt] = f"{settings.IMAGE_DERIVATIVES_URL}/{name}"
+    return variants
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """图片处理进程池(首次使用时创建)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS or None)
+    return _executor
+
+
+def shutdown_executor():
+    """关闭图片处理进程池和缩放线程池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    resize_cache.shutdown()
+
+
+async def create_variants(source_path: Path) -> Optional[Dict[str, Dict[str, str]]]:
+    """在进程池中生成衍生图, 原图无法解码时返回None"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_executor(), generate_variants, str(source_path))
+    except Exception as e:
+        logger.warning(f"生成衍生图失败 {source_path}: {e}")
+        return None
+
+
+def resize_to_file(source_path: str, output_path: str, width: int, height: int, fmt: str) -> int:
+    """等比缩放到不超过width x height(不放大)并写入文件, 返回文件大小(在线程池中执行)"""
+    image = load_image(Path(source_path).read_bytes(), fmt)
+    image.thumbnail((width, height), Image.LANCZOS)
+    write_image(image, Path(output_path), fmt)
+    return os.path.getsize(output_path)
+
+
+class ResizeCache:
+    """
+    按需缩放结果的磁盘缓存
+
+    - key由(原图路径, 原图mtime, 宽, 高, 格式)生成, 原图更新后自动生成新文件
+    - 多个worker进程共享缓存目录, 磁盘是唯一的状态: 命中时更新文件mtime, 淘汰按mtime从旧到新
+    - 每个进程估算总字节数(上次扫描结果 + 本进程此后写入的字节); 估算超过上限或距上次扫描
+      超过IMAGE_RESIZE_CACHE_SCAN_SECONDS时, 在线程中重新扫描目录并淘汰到上限的EVICT_RATIO,
+      其他进程的写入最迟在一个扫描间隔后计入
+    - 同一key的并发请求共享一个生成任务
+    """
+
+    # 淘汰到上限的比例, 避免每次写入都触发扫描
+    EVICT_RATIO = 0.9
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        scan_seconds: Optional[float] = None
+    ):
+        self.directory = Path(directory or settings.IMAGE_RESIZE_CACHE_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else settings.IMAGE_RESIZE_CACHE_MAX_BYTES
+        self.scan_seconds = scan_seconds if scan_seconds is not None else settings.IMAGE_RESIZE_CACHE_SCAN_SECONDS
+        self._scanned_bytes = 0
+        self._written_bytes = 0
+        self._scanned_at: Optional[float] = None
+        self._scan_lock = asyncio.Lock()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def total_bytes(self) -> int:
+        """估算的缓存总字节数"""
+        return self._scanned_bytes + self._written_bytes
+
+    def _scan_and_evict(self, keep: Optional[str] = None) -> int:
+        """扫描缓存目录, 总字节数超过上限时按mtime淘汰最旧的文件(在线程中执行), 返回剩余字节数"""
+        files = []
+        if self.directory.exists():
+            for path in self.directory.glob("*/*"):
+                if path.suffix == ".tmp":
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    # 被其他进程淘汰
+                    continue
+                files.append((stat.st_mtime_ns, str(path.relative_to(self.directory)), stat.st_size))
+        files.sort()
+
+        total = sum(size for _, _, size in files)
+        if total > self.max_bytes:
+            target = self.max_bytes * self.EVICT_RATIO
+            for _, name, size in files:
+                if total <= target:
+                    break
+                if name == keep:
+                    continue
+                try:
+                    (self.directory / name).unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+        return total
+
+    async def _rescan(self, keep: Optional[str] = None):
+        """重新扫描目录并淘汰(调用方持有_scan_lock)"""
+        self._scanned_at = time.monotonic()
+        self._written_bytes = 0
+        self._scanned_bytes = await asyncio.to_thread(self._scan_and_evict, keep)
+
+    def _needs_scan(self) -> bool:
+        return (
+            self._scanned_at is None
+            or self.total_bytes > self.max_bytes
+            or time.monotonic() - self._scanned_at > self.scan_seconds
+        )
+
+    @staticmethod
+    def cache_name(source: Path, width: int, height: int, fmt: str) -> str:
+        """缓存文件相对路径"""
+        stat = source.stat()
+        key = hashlib.blake2b(
+            f"{source}|{stat.st_mtime_ns}|{stat.st_size}|{width}|{height}|{fmt}".encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+        return f"{key[:2]}/{key}.{fmt}"
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_RESIZE_THREADS, thread_name_prefix="image-resize"
+            )
+        return self._executor
+
+    async def _generate(self, source: Path, name: str, width: int, height: int, fmt: str) -> Path:
+        """在线程池中生成缓存文件"""
+        loop = asyncio.get_running_loop()
+        path = self.directory / name
+        size = await loop.run_in_executor(
+            self._get_executor(), resize_to_file, str(source), str(path), width, height, fmt
+        )
+        self._written_bytes += size
+        # 已有扫描在进行时不再排队, 下次写入时再检查
+        if self._needs_scan() and not self._scan_lock.locked():
+            async with self._scan_lock:
+                await self._rescan(keep=name)
+        return path
+
+    async def get(self, source: Path, width: int, height: int, fmt: str) -> Path:
+        """获取缩放后的文件路径, 未缓存时生成"""
+        if self._scanned_at is None:
+            # 首次使用时在线程中扫描已有缓存(重启后保留)
+            async with self._scan_lock:
+                if self._scanned_at is None:
+                    await self._rescan()
+
+        name = self.cache_name(source, width, height, fmt)
+        path = self.directory / name
+        try:
+            # 命中: 更新mtime作为最近访问时间
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        future = self._pending.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self._generate(source, name, width, height, fmt))
+            self._pending[name] = future
+            future.add_done_callback(lambda _: self._pending.pop(name, None))
+        # shield: 某个请求被取消时不影响其他等待同一结果的请求
+        return await asyncio.shield(future)
+
+    def shutdown(self):
+        """关闭缩放线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+resize_cache = ResizeCache()
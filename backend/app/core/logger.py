@@ -1,67 +1,269 @@
 """
 日志配置
+- 业务代码只把日志记录放进内存队列(QueueHandler), 格式化和文件/控制台写入由
+  QueueListener后台线程完成, 事件循环中不做阻塞的文件I/O
+- 每条记录带上当前请求的request_id/method/path(RequestLoggingMiddleware设置),
+  默认输出JSON, 额外字段通过logger.info(..., extra={...})附加
+- 日志文件按时间(默认每天零点)和大小双重切分, 保留LOG_BACKUP_COUNT个历史文件
+- DEBUG日志每秒超过LOG_DEBUG_RATE_LIMIT条后按LOG_DEBUG_SAMPLE_RATIO抽样;
+  队列满时丢弃新记录并计数, 不阻塞调用方
 """
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from pathlib import Path
-from datetime import datetime
+from typing import Optional
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.config import get_settings
 
 settings = get_settings()
 
+# 当前请求的上下文(request_id/method/path)
+request_context: ContextVar[Optional[dict]] = ContextVar("request_context", default=None)
+
+# LogRecord自带的属性, 其余属性视为extra字段
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["ContextQueueHandler"] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """一条记录一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return orjson.dumps(data, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """可读文本格式(本地开发), 有请求上下文时追加request_id"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{text} [{request_id}]" if request_id else text
+
+
+class DebugSampler(logging.Filter):
+    """DEBUG日志每秒超过limit条后按ratio抽样(近似计数, 不加锁)"""
+
+    def __init__(self, limit: int, ratio: float):
+        super().__init__()
+        self.limit = limit
+        self.ratio = ratio
+        self._second = 0
+        self._count = 0
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        second = int(time.monotonic())
+        if second != self._second:
+            self._second, self._count = second, 0
+        self._count += 1
+        if self._count <= self.limit or random.random() < self.ratio:
+            return True
+        self.dropped += 1
+        return False
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    在调用方线程中附加请求上下文并合并消息参数, 然后放入队列
+
+    保留异常文本(不同于默认prepare把异常并入message), 由JSONFormatter单独输出;
+    队列满时丢弃并计数
+    """
 
-def setup_logger():
-    """配置日志系统"""
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
 
-    # 创建logs目录
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = request_context.get()
+        if context is not None:
+            for key, value in context.items():
+                setattr(record, key, value)
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # 日志记录可能被其他handler继续使用, 修改副本
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.message, record.args = message, message, None
+        record.exc_info = None
+        return record
 
-    # 配置日志格式
-    log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    date_format = "%Y-%m-%d %H:%M:%S"
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-    # 配置formatter
-    formatter = logging.Formatter(log_format, datefmt=date_format)
 
-    # 配置root logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """按时间切分, 单个文件超过max_bytes时提前切分(同一时段内的文件名追加序号)"""
 
-    # 清除现有handlers
-    logger.handlers.clear()
+    def __init__(self, filename, max_bytes: int = 0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        name, index = default_name, 0
+        while os.path.exists(name):
+            index += 1
+            name = f"{default_name}.{index:03d}"
+        return name
+
+
+def _make_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JSONFormatter()
+    return TextFormatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+
+def _file_handler(path: Path, level: int) -> logging.Handler:
+    handler = SizedTimedRotatingFileHandler(
+        path,
+        max_bytes=settings.LOG_MAX_BYTES,
+        when=settings.LOG_ROTATE_WHEN,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setLevel(level)
+    return handler
+
+
+def setup_logger() -> logging.Logger:
+    """配置日志系统(重复调用时直接返回root logger)"""
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    if _listener is not None:
+        return root
+    level = logging.DEBUG if settings.DEBUG else logging.INFO
+
+    log_dir = Path(settings.LOG_DIR)
+    log_dir.mkdir(parents=True, exist_ok=True)
 
-    # 控制台handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # 文件handler - 所有日志
-    today = datetime.now().strftime("%Y-%m-%d")
-    all_log_file = log_dir / f"app_{today}.log"
-    file_handler = logging.FileHandler(all_log_file, encoding="utf-8")
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
-    # 文件handler - 错误日志
-    error_log_file = log_dir / f"error_{today}.log"
-    error_handler = logging.FileHandler(error_log_file, encoding="utf-8")
-    error_handler.setLevel(logging.ERROR)
-    error_handler.setFormatter(formatter)
-    logger.addHandler(error_handler)
+    console_handler.setLevel(level)
+    handlers = [
+        console_handler,
+        _file_handler(log_dir / "app.log", logging.DEBUG),
+        _file_handler(log_dir / "error.log", logging.ERROR),
+    ]
+    formatter = _make_formatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = ContextQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(DebugSampler(settings.LOG_DEBUG_RATE_LIMIT, settings.LOG_DEBUG_SAMPLE_RATIO))
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logger)
+
+    root.setLevel(level)
+    root.handlers.clear()
+    root.addHandler(_queue_handler)
 
     # 第三方库日志级别
     logging.getLogger("uvicorn").setLevel(logging.INFO)
     logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
     logging.getLogger("redis").setLevel(logging.WARNING)
 
-    logger.info("日志系统初始化完成")
+    root.info("日志系统初始化完成")
+    return root
+
+
+def shutdown_logger() -> None:
+    """写出队列中剩余的日志并关闭文件"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener, _queue_handler = None, None
+
+
+class RequestLoggingMiddleware:
+    """
+    为每个请求设置日志上下文(沿用请求头X-Request-ID, 没有时生成), 响应头返回X-Request-ID;
+    开启LOG_ACCESS_ENABLED时请求结束后记录一条带状态码和耗时的访问日志
+    """
+
+    def __init__(self, app: ASGIApp, access_log: bool = True):
+        self.app = app
+        self.access_log = access_log
+        self.logger = logging.getLogger("app.access")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-    return logger
+        request_id = Headers(scope=scope).get("x-request-id") or uuid.uuid4().hex
+        token = request_context.set({"request_id": request_id[:64], "method": scope["method"], "path": scope["path"]})
+        status = 500
+        started = time.perf_counter()
 
+        async def send_with_request_id(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", request_id[:64])
+            await send(message)
 
-# 初始化日志
-logger = setup_logger()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            if self.access_log:
+                route = scope.get("route")
+                self.logger.info(
+                    f"{scope['method']} {scope['path']} {status}",
+                    extra={
+                        "status": status,
+                        "route": getattr(route, "path", None),
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    },
+                )
+            request_context.reset(token)
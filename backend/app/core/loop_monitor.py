@@ -0,0 +1,211 @@
+"""
+事件循环阻塞检测(调试/性能分析模式, LOOP_MONITOR_ENABLED开启)
+- 事件循环中的心跳回调定期更新时间戳; 监视线程发现心跳超过阈值未更新时,
+  采样事件循环线程当前的调用栈(即正在阻塞的代码), 并按当时正在执行的请求路由归类
+- 心跳恢复后得到本次阻塞的实际时长, 按(路由, 阻塞位置)汇总次数和耗时
+- 同时开启asyncio调试模式的慢回调检测(slow_callback_duration), 收集其日志
+汇总报告通过 GET /api/admin/diagnostics/loop-blocking 查看
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 项目代码所在目录(定位阻塞位置时优先取项目代码的栈帧)
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def request_label(scope: Scope) -> str:
+    """请求的路由标签(路由模板, 未匹配时为原始路径)"""
+    route = scope.get("route")
+    return f"{scope.get('method', '')} {getattr(route, 'path', None) or scope.get('path', '')}"
+
+
+def blocking_site(stack: List[traceback.FrameSummary]) -> str:
+    """栈中最内层的项目代码位置; 没有项目代码时取最内层栈帧"""
+    for frame in reversed(stack):
+        if frame.filename.startswith(APP_ROOT) and "loop_monitor" not in frame.filename:
+            return f"{os.path.relpath(frame.filename, APP_ROOT)}:{frame.lineno} {frame.name}"
+    if stack:
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} {frame.name}"
+    return "unknown"
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """收集asyncio调试模式输出的慢回调日志"""
+
+    def __init__(self, records: deque):
+        super().__init__(logging.WARNING)
+        self.records = records
+
+    def emit(self, record: logging.LogRecord):
+        message = record.getMessage()
+        if message.startswith("Executing "):
+            self.records.append({"time": record.created, "message": message[:500]})
+
+
+class LoopBlockingDetector:
+    """事件循环阻塞检测器"""
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.02, max_stack_depth: int = 30):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_stack_depth = max_stack_depth
+        # 正在处理的请求: task -> ASGI scope
+        self.task_scopes: "weakref.WeakKeyDictionary[asyncio.Task, Scope]" = weakref.WeakKeyDictionary()
+        self.slow_callbacks: deque = deque(maxlen=100)
+        self._offenders: Dict[Tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        # 监视线程采样到、等待心跳恢复后记录时长的阻塞
+        self._pending: Optional[dict] = None
+        self._beat_handle: Optional[asyncio.TimerHandle] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._log_handler: Optional[_SlowCallbackHandler] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None, asyncio_debug: bool = True) -> None:
+        """在事件循环线程中调用: 启动心跳和监视线程"""
+        if self.running:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if asyncio_debug:
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.threshold
+            self._log_handler = _SlowCallbackHandler(self.slow_callbacks)
+            logging.getLogger("asyncio").addHandler(self._log_handler)
+
+        self._stop.clear()
+        self._last_beat = time.monotonic()
+        self._beat()
+        self._thread = threading.Thread(target=self._watch, name="loop-blocking-detector", daemon=True)
+        self._thread.start()
+        logger.info(f"事件循环阻塞检测已开启(阈值{self.threshold * 1000:.0f}ms)")
+
+    def stop(self) -> None:
+        """停止检测(在事件循环线程中调用)"""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+        if self._beat_handle is not None:
+            self._beat_handle.cancel()
+            self._beat_handle = None
+        if self._log_handler is not None:
+            logging.getLogger("asyncio").removeHandler(self._log_handler)
+            self._log_handler = None
+            self._loop.set_debug(False)
+
+    def _beat(self) -> None:
+        """事件循环中的心跳: 更新时间戳, 结算上一次阻塞的时长"""
+        now = time.monotonic()
+        gap = now - self._last_beat
+        self._last_beat = now
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._record(pending, max(gap - self.interval, 0.0))
+        self._beat_handle = self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self) -> None:
+        """监视线程: 心跳停滞超过阈值时采样一次事件循环线程的调用栈"""
+        sampled_beat = None
+        while not self._stop.wait(self.interval):
+            last_beat = self._last_beat
+            if time.monotonic() - last_beat < self.threshold or last_beat == sampled_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=self.max_stack_depth)
+            task = asyncio.current_task(self._loop)
+            scope = self.task_scopes.get(task) if task is not None else None
+            with self._lock:
+                self._pending = {
+                    "route": request_label(scope) if scope is not None else "(background)",
+                    "site": blocking_site(stack),
+                    "stack": traceback.format_list(stack),
+                }
+            sampled_beat = last_beat
+
+    def _record(self, sample: dict, seconds: float) -> None:
+        key = (sample["route"], sample["site"])
+        offender = self._offenders.get(key)
+        if offender is None:
+            offender = self._offenders[key] = {
+                "route": sample["route"],
+                "site": sample["site"],
+                "count": 0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0,
+                "stack": sample["stack"],
+            }
+        offender["count"] += 1
+        offender["total_seconds"] += seconds
+        offender["max_seconds"] = max(offender["max_seconds"], seconds)
+        logger.warning(f"事件循环阻塞{seconds * 1000:.0f}ms: {sample['route']} @ {sample['site']}")
+
+    def report(self, limit: int = 50) -> dict:
+        """按总阻塞时间降序的汇总"""
+        offenders = sorted(self._offenders.values(), key=lambda item: item["total_seconds"], reverse=True)
+        return {
+            "enabled": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "offenders": [
+                {**item, "total_seconds": round(item["total_seconds"], 4), "max_seconds": round(item["max_seconds"], 4)}
+                for item in offenders[:limit]
+            ],
+            "slow_callbacks": list(self.slow_callbacks),
+        }
+
+    def reset(self) -> None:
+        """清空汇总"""
+        self._offenders.clear()
+        self.slow_callbacks.clear()
+
+
+loop_detector = LoopBlockingDetector(
+    threshold=settings.LOOP_MONITOR_THRESHOLD,
+    interval=settings.LOOP_MONITOR_INTERVAL,
+)
+
+
+class LoopBlockingMiddleware:
+    """记录每个请求所在的task, 阻塞采样时据此归类到路由"""
+
+    def __init__(self, app: ASGIApp, detector: LoopBlockingDetector):
+        self.app = app
+        self.detector = detector
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.detector.running:
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        self.detector.task_scopes[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.detector.task_scopes.pop(task, None)
@@ -0,0 +1,311 @@
+"""
+应用指标(Prometheus文本格式, GET /metrics)
+- Counter/Gauge/Histogram为进程内轻量实现: 只在事件循环线程中记录, 记录路径无锁,
+  只做字典查找和整数加法; 格式化在抓取时进行
+- Gauge可以注册回调, 在抓取时读取当前值(如连接池状态)
+- 多进程部署时每个worker各自暴露指标, 由Prometheus按实例汇总
+"""
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Response会追加charset=utf-8
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# 请求耗时分桶(秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 事件循环延迟分桶(秒)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指标基类"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        (registry or default_registry).register(self)
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, str, float]]:
+        """(指标名后缀, 标签值, 额外标签, 值)"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """单调递增计数"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        values = self._values
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield "", labels, "", value
+
+
+class Gauge(Metric):
+    """当前值; 提供collect回调时在抓取时读取({标签值: 值})"""
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+        registry=None
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        values = self._values
+        if self._collect is not None:
+            try:
+                values = self._collect()
+            except Exception as e:
+                logger.warning(f"采集指标{self.name}失败: {e}")
+                values = {}
+        for labels, value in list(values.items()):
+            yield "", labels, "", value
+
+
+class Histogram(Metric):
+    """分桶统计(记录时只累加所在的桶, 抓取时再累计)"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry=None
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数..., +Inf桶计数, 总和]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series):
+                cumulative += bucket_count
+                yield "_bucket", labels, f'le="{_format_value(bound)}"', cumulative
+            yield "_sum", labels, "", series[-1]
+            yield "_count", labels, "", cumulative
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已注册: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Prometheus文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+default_registry = Registry()
+
+
+def redis_key_family(key: str) -> str:
+    """key所属的类别(前两段), 如product:detail:1 -> product:detail"""
+    return ":".join(key.split(":", 2)[:2])
+
+
+def _pool_stats() -> Dict[LabelValues, float]:
+    """各数据库连接池状态(测试环境或无连接池时为空)"""
+    from app.core.database import get_engines
+
+    stats = {}
+    for name, engine in get_engines().items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        stats.update({
+            (name, "size"): pool.size(),
+            (name, "checked_out"): pool.checkedout(),
+            (name, "checked_in"): pool.checkedin(),
+            (name, "overflow"): pool.overflow(),
+        })
+    return stats
+
+
+# HTTP
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP请求数", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP请求耗时(秒)", ("method", "route"))
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "处理中的HTTP请求数")
+
+# Redis缓存
+REDIS_CACHE = Counter("redis_cache_requests_total", "Redis读取结果(hit/miss/error)", ("family", "result"))
+REDIS_ERRORS = Counter("redis_errors_total", "Redis命令失败次数", ("operation",))
+
+# 数据库连接池
+DB_POOL = Gauge("db_pool_connections", "数据库连接池状态", ("pool", "state"), collect=_pool_stats)
+
+# 事件循环
+LOOP_LAG = Gauge("event_loop_lag_last_seconds", "最近一次测得的事件循环延迟(秒)")
+LOOP_LAG_HISTOGRAM = Histogram("event_loop_lag_seconds", "事件循环延迟分布(秒)", buckets=LOOP_LAG_BUCKETS)
+
+# 订单和库存
+ORDERS_CREATED = Counter("orders_created_total", "创建成功的订单数", ("delivery_type",))
+ORDER_STATUS_CHANGES = Counter("order_status_changes_total", "订单状态变更次数", ("status",))
+STOCK_LOCKED = Counter("stock_locked_units_total", "下单锁定的库存件数")
+STOCK_RELEASED = Counter("stock_released_units_total", "取消订单释放的库存件数")
+STOCK_REJECTIONS = Counter("stock_rejections_total", "库存不足导致的下单失败次数")
+
+
+def record_cache(key: str, hit: bool):
+    """记录一次缓存读取结果"""
+    REDIS_CACHE.inc(redis_key_family(key), "hit" if hit else "miss")
+
+
+def record_redis_error(operation: str, key: Optional[str] = None):
+    """记录Redis命令失败"""
+    REDIS_ERRORS.inc(operation)
+    if key is not None:
+        REDIS_CACHE.inc(redis_key_family(key), "error")
+
+
+class MetricsMiddleware:
+    """记录每个HTTP请求的耗时和状态码(按路由模板聚合, 未匹配路由归为unmatched)"""
+
+    def __init__(self, app: ASGIApp, exclude_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.set(HTTP_IN_PROGRESS.value() + 1)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_PROGRESS.set(HTTP_IN_PROGRESS.value() - 1)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route_path)
+            HTTP_REQUESTS.inc(scope["method"], route_path, str(status))
+
+
+class LoopLagMonitor:
+    """定期测量事件循环延迟(sleep实际醒来时间与预期时间之差)"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """启动后台测量任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval or settings.METRICS_LOOP_LAG_INTERVAL))
+
+    async def stop(self) -> None:
+        """停止后台任务"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG.set(lag)
+            LOOP_LAG_HISTOGRAM.observe(lag)
+
+
+loop_lag_monitor = LoopLagMonitor()
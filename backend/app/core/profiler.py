@@ -0,0 +1,241 @@
+"""
+采样式性能分析(生产worker按需开启)
+- 采样线程每隔PROFILER_INTERVAL秒读取一次目标线程的调用栈(sys._current_frames),
+  不修改被分析的代码, 开销只与采样频率有关, 未开启时没有任何开销
+- 输出collapsed stack格式(每行"根帧;...;叶帧 次数"), 可直接交给flamegraph.pl、
+  speedscope等工具生成火焰图
+- 整个worker: GET /api/admin/diagnostics/profile?seconds=N
+- 单个请求: 请求带上PROFILER_REQUEST_HEADER头(值为管理员access token), 只统计
+  事件循环正在执行该请求task时的样本, 响应头X-Profile-Id返回结果编号, 通过
+  GET /api/admin/diagnostics/profiles/{profile_id} 获取
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 项目根目录(栈帧中的项目文件显示为相对路径)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def frame_label(code) -> str:
+    """栈帧名称: 函数名(文件:函数起始行), 同一函数内的不同行合并为一帧"""
+    filename = code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse_frame(frame, max_depth: int) -> str:
+    """把栈帧链转换为collapsed格式(根帧在前)"""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def render_collapsed(stacks: Counter) -> str:
+    """collapsed stack文本(按样本数降序)"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class SamplingProfiler:
+    """
+    采样线程
+
+    thread_ids为None时采样除采样线程外的所有线程(每条栈以线程名为根帧);
+    指定task时只在事件循环当前正在执行该task时记录样本
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.01,
+        max_depth: int = 64,
+        thread_ids: Optional[Iterable[int]] = None,
+        task: Optional[asyncio.Task] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.task = task
+        self.loop = loop
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._stop.clear()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+            self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.task is not None and asyncio.current_task(self.loop) is not self.task:
+                continue
+            if self.thread_ids is None:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = collapse_frame(frame, self.max_depth)
+                if self.thread_ids is None:
+                    stack = f"{names.get(thread_id, thread_id)};{stack}"
+                self.stacks[stack] += 1
+            self.samples += 1
+
+    def summary(self) -> dict:
+        """采样概况(不含栈)"""
+        return {
+            "interval_ms": self.interval * 1000,
+            "duration_seconds": round(self.duration, 3),
+            "samples": self.samples,
+            "unique_stacks": len(self.stacks),
+        }
+
+    def collapsed(self) -> str:
+        return render_collapsed(self.stacks)
+
+
+class ProfilerBusy(Exception):
+    """已有按需分析正在进行"""
+
+
+class ProfileStore:
+    """单请求分析结果(只保留最近PROFILER_KEEP_RESULTS个, 各worker独立保存)"""
+
+    def __init__(self, limit: int = 20):
+        self.limit = limit
+        self._results: "OrderedDict[str, dict]" = OrderedDict()
+
+    def add(self, profile_id: str, label: str, profiler: SamplingProfiler) -> None:
+        self._results[profile_id] = {
+            "id": profile_id,
+            "request": label,
+            **profiler.summary(),
+            "collapsed": profiler.collapsed(),
+        }
+        while len(self._results) > self.limit:
+            self._results.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        return self._results.get(profile_id)
+
+    def list(self) -> list:
+        return [
+            {key: value for key, value in item.items() if key != "collapsed"}
+            for item in reversed(self._results.values())
+        ]
+
+
+profile_store = ProfileStore(settings.PROFILER_KEEP_RESULTS)
+_profile_lock = asyncio.Lock()
+
+
+async def profile_worker(seconds: float, interval: Optional[float] = None, all_threads: bool = False) -> SamplingProfiler:
+    """
+    分析当前worker seconds秒(同一worker同时只允许一个)
+
+    默认只采样事件循环线程; all_threads时包括线程池等其他线程
+    """
+    if _profile_lock.locked():
+        raise ProfilerBusy()
+    async with _profile_lock:
+        profiler = SamplingProfiler(
+            interval=interval or settings.PROFILER_INTERVAL,
+            thread_ids=None if all_threads else [threading.get_ident()],
+        ).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    logger.info(f"性能分析完成: {seconds}s, {profiler.samples}个样本")
+    return profiler
+
+
+async def is_admin_token(app, token: str) -> bool:
+    """用get_current_admin校验token(数据库会话遵循应用的依赖覆盖)"""
+    from app.core.database import get_db
+    from app.core.security import get_current_admin
+
+    session_factory = app.dependency_overrides.get(get_db, get_db)
+    sessions = session_factory()
+    try:
+        db = await sessions.__anext__()
+        await get_current_admin(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), db)
+        return True
+    except HTTPException:
+        return False
+    finally:
+        await sessions.aclose()
+
+
+class RequestProfilerMiddleware:
+    """请求带分析头且token属于管理员时, 采样分析本次请求"""
+
+    def __init__(self, app: ASGIApp, header_name: str = "X-Profile-Token"):
+        self.app = app
+        self.header_name = header_name.lower()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = Headers(scope=scope).get(self.header_name)
+        if not token or not await is_admin_token(scope["app"], token):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = SamplingProfiler(
+            interval=settings.PROFILER_INTERVAL,
+            thread_ids=[threading.get_ident()],
+            task=asyncio.current_task(),
+            loop=asyncio.get_running_loop(),
+        )
+        profile_id = uuid.uuid4().hex[:16]
+
+        async def send_with_profile_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            label = f"{scope['method']} {scope['path']}"
+            profile_store.add(profile_id, label, profiler)
@@ -0,0 +1,153 @@
+"""
+按请求统计SQL查询
+通过SQLAlchemy引擎事件记录每个请求的查询次数、数据库耗时和重复语句(按指纹归并):
+- QueryStatsMiddleware为每个请求开启统计, 结果写入Server-Timing响应头
+- 查询次数超过预算或同一语句重复执行(疑似N+1)时记录警告日志;
+  QUERY_BUDGET_STRICT开启时抛出QueryBudgetExceeded(测试中使请求失败)
+- track_queries()可在测试或脚本中统计任意代码块
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 当前生效的统计(嵌套时外层也会计入)
+_active: ContextVar[Tuple["QueryStats", ...]] = ContextVar("query_stats", default=())
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\?|%\(\w+\)s|%s|\$\d+|:\w+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """语句指纹: 字面量和绑定参数替换为?, IN列表合并, 空白归一"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """查询次数超过预算"""
+
+
+class QueryStats:
+    """一段代码(一个请求)内的查询统计"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """执行次数不少于threshold的语句(疑似N+1), 按次数降序"""
+        threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        """Server-Timing响应头的值"""
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+
+    def check(self, budget: Optional[int]) -> Optional[str]:
+        """超过预算或存在重复语句时返回问题描述"""
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f"查询{self.count}次, 超过预算{budget}次")
+        for sql, count in self.repeated()[:3]:
+            problems.append(f"重复执行{count}次: {sql[:200]}")
+        return "; ".join(problems) or None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get():
+        conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active.get()
+    started = conn.info.get("query_stats_started")
+    if not active or not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for stats in active:
+        stats.record(statement, seconds)
+
+
+def instrument_engines():
+    """为所有引擎注册查询事件(重复调用无副作用)"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries(budget: Optional[int] = None, label: str = "") -> Iterator[QueryStats]:
+    """
+    统计代码块内的查询
+
+    Args:
+        budget: 查询次数上限, 超出时退出代码块抛出QueryBudgetExceeded
+    """
+    stats = QueryStats(label)
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+    if budget is not None and stats.count > budget:
+        raise QueryBudgetExceeded(f"{label or '代码块'}查询{stats.count}次, 超过预算{budget}次: {stats.repeated(2)}")
+
+
+class QueryStatsMiddleware:
+    """统计每个HTTP请求的查询, 写入Server-Timing响应头并检查查询预算"""
+
+    def __init__(self, app: ASGIApp, budget: Optional[int] = None, strict: bool = False):
+        self.app = app
+        self.budget = budget
+        self.strict = strict
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']} {scope['path']}"
+
+        with track_queries(label=label) as stats:
+            async def send_with_timing(message: Message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+        problem = stats.check(self.budget)
+        if problem:
+            logger.warning(f"{label} {problem}")
+            if self.strict:
+                raise QueryBudgetExceeded(f"{label} {problem}")
+        elif stats.count:
+            logger.debug(f"{label} 查询{stats.count}次, 耗时{stats.seconds * 1000:.1f}ms")
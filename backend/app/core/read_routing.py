@@ -0,0 +1,127 @@
+"""
+只读副本的读写一致性(read-your-writes)
+- 写入主库后设置写入标记(Redis key, 有效期REPLICA_READ_YOUR_WRITES_SECONDS, 应大于副本延迟):
+  用户下单/评价后标记该用户, 管理员修改商品/分类后标记整个商品目录
+- ReadRoutingMiddleware在请求开始时决定本次请求能否读副本:
+  写请求、带有效写入标记的用户的请求、目录写入标记有效期内的请求都固定读主库;
+  标记无法读取(Redis故障)时也读主库
+- 目录写入时先设置标记再清除缓存; 回填Redis缓存的方法(@primary_reads)始终读主库,
+  副本上写入前的数据不会以新的目录版本号进入共享缓存
+- 未配置只读副本时中间件直接透传, 标记也不写入
+- Redis未初始化时(本地开发/测试)标记保存在进程内
+"""
+import logging
+import time
+from typing import Dict, List, Optional
+
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.database import pin_primary, replica_engine
+from app.core.redis_client import redis_client
+from app.core.security import decode_token
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CATALOG = "catalog"
+
+# 不会修改数据的请求方法
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+class WriteFence:
+    """写入标记(Redis未初始化时保存在进程内)"""
+
+    def __init__(self, seconds: float, enabled: bool = True):
+        self.seconds = seconds
+        self.enabled = enabled
+        self._local: Dict[str, float] = {}
+
+    async def mark(self, *scopes: str) -> None:
+        """标记scopes刚写入过主库"""
+        if not self.enabled:
+            return
+        if not redis_client.is_connected:
+            now = time.monotonic()
+            if len(self._local) > 10000:
+                self._local = {key: value for key, value in self._local.items() if value > now}
+            deadline = now + self.seconds
+            for scope in scopes:
+                self._local[scope] = deadline
+            return
+        async with redis_client.pipeline() as pipe:
+            for scope in scopes:
+                pipe.set(redis_client.write_fence_key(scope), b"1", px=int(self.seconds * 1000))
+
+    async def active(self, scopes: List[str]) -> bool:
+        """任一scope的写入标记仍有效(无法读取时视为有效)"""
+        if not redis_client.is_connected:
+            now = time.monotonic()
+            return any(self._local.get(scope, 0) > now for scope in scopes)
+        count = await redis_client.count_existing([redis_client.write_fence_key(scope) for scope in scopes])
+        return count is None or count > 0
+
+
+write_fence = WriteFence(settings.REPLICA_READ_YOUR_WRITES_SECONDS, enabled=replica_engine is not None)
+
+
+async def mark_user_write(user_id: int) -> None:
+    """
+    用户写入后调用(下单、取消、支付、确认收货、评价)
+
+    只标记该用户: 下单引起的库存和评价引起的评分变化对其他用户短暂延迟可以接受
+    """
+    await write_fence.mark(user_scope(user_id))
+
+
+async def mark_catalog_write() -> None:
+    """商品、分类等目录数据写入后调用"""
+    await write_fence.mark(CATALOG)
+
+
+def token_user_id(headers: Headers) -> Optional[int]:
+    """从Bearer token取用户ID(只校验签名, 不查库; 管理员token返回None)"""
+    scheme, token = get_authorization_scheme_param(headers.get("authorization"))
+    if scheme.lower() != "bearer" or not token:
+        return None
+    payload = decode_token(token)
+    if not payload or payload.get("is_admin") or payload.get("type") != "access":
+        return None
+    try:
+        return int(payload.get("sub"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ReadRoutingMiddleware:
+    """决定本次请求是否固定读主库(未配置只读副本时透传)"""
+
+    def __init__(self, app: ASGIApp, fence: WriteFence = write_fence):
+        self.app = app
+        self.fence = fence
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.fence.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        pinned = scope["method"] not in SAFE_METHODS
+        if not pinned:
+            scopes = [CATALOG]
+            user_id = token_user_id(Headers(scope=scope))
+            if user_id is not None:
+                scopes.append(user_scope(user_id))
+            pinned = await self.fence.active(scopes)
+
+        if not pinned:
+            await self.app(scope, receive, send)
+            return
+        with pin_primary():
+            await self.app(scope, receive, send)
@@ -1,32 +1,65 @@
 """
 Redis客户端和缓存管理
 """
+import asyncio
 import json
 import logging
-from typing import Optional, Any, List
+from contextlib import asynccontextmanager
+from typing import Optional, Any, List, Dict, Union, Tuple
 from redis import asyncio as aioredis
 from redis.asyncio import Redis, ConnectionPool
 
 from app.core.config import get_settings
+from app.core.metrics import record_cache, record_redis_error
+from app.core.serialization import CacheCodec, get_codec, decode_cache_value
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
 
+class RedisPipeline:
+    """批量命令缓冲区
+
+    在 ``RedisClient.pipeline()`` 上下文中记录命令, 退出上下文时一次性发送,
+    结果按入队顺序写入 ``results``。Redis不可用或执行失败时结果全部为None。
+    """
+
+    def __init__(self):
+        self._commands: List[Tuple[str, tuple, dict]] = []
+        self.results: List[Any] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs) -> "RedisPipeline":
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+
 class RedisClient:
     """Redis客户端封装"""
 
-    def __init__(self):
+    def __init__(self, codec: Optional[CacheCodec] = None):
         self._pool: Optional[ConnectionPool] = None
         self._redis: Optional[Redis] = None
+        # 已注册的Lua脚本(EVALSHA)
+        self._scripts: Dict[str, Any] = {}
+        # JSON缓存值的编码器(读取时按值上的标签解码, 与写入codec无关)
+        self.codec = codec or get_codec(settings.CACHE_CODEC)
 
     async def connect(self):
         """连接Redis"""
         try:
+            # 不自动解码响应: 缓存值可能是msgpack等二进制格式, 文本接口自行解码
             self._pool = ConnectionPool.from_url(
                 settings.REDIS_URL,
-                encoding="utf-8",
-                decode_responses=True
+                decode_responses=False
             )
             self._redis = Redis(connection_pool=self._pool)
             await self._redis.ping()
@@ -49,18 +82,37 @@ class RedisClient:
             raise RuntimeError("Redis未初始化,请先调用connect()")
         return self._redis
 
+    @property
+    def is_connected(self) -> bool:
+        """Redis是否已连接(测试环境或连接失败时为False)"""
+        return self._redis is not None
+
+    async def ping(self, timeout: float = 1.0) -> bool:
+        """检查Redis是否可用(超时或失败返回False), 未初始化时抛出RuntimeError"""
+        try:
+            return bool(await asyncio.wait_for(self.redis.ping(), timeout))
+        except RuntimeError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis PING失败: {e!r}")
+            record_redis_error("PING")
+            return False
+
     async def get(self, key: str) -> Optional[str]:
         """获取缓存"""
         try:
             if self._redis is None:
                 # Redis未初始化时,返回None(用于测试环境)
                 return None
-            return await self.redis.get(key)
+            value = await self.redis.get(key)
+            record_cache(key, value is not None)
+            return value.decode("utf-8") if isinstance(value, bytes) else value
         except Exception as e:
             logger.error(f"Redis GET失败: {e}")
+            record_redis_error("GET", key)
             return None
 
-    async def set(self, key: str, value: str, expire: int = None) -> bool:
+    async def set(self, key: str, value: Union[str, bytes], expire: int = None) -> bool:
         """设置缓存"""
         try:
             if self._redis is None:
@@ -69,6 +121,7 @@ class RedisClient:
             return await self.redis.set(key, value, ex=expire)
         except Exception as e:
             logger.error(f"Redis SET失败: {e}")
+            record_redis_error("SET", key)
             return False
 
     async def delete(self, key: str) -> bool:
@@ -77,6 +130,7 @@ class RedisClient:
             return await self.redis.delete(key) > 0
         except Exception as e:
             logger.error(f"Redis DELETE失败: {e}")
+            record_redis_error("DELETE", key)
             return False
 
     async def exists(self, key: str) -> bool:
@@ -88,35 +142,206 @@ class RedisClient:
             return await self.redis.exists(key) > 0
         except Exception as e:
             logger.error(f"Redis EXISTS失败: {e}")
+            record_redis_error("EXISTS", key)
             return False
 
+    async def count_existing(self, keys: List[str]) -> Optional[int]:
+        """keys中存在的数量(一次EXISTS), 未初始化时为0, 失败时返回None"""
+        try:
+            if self._redis is None or not keys:
+                return 0
+            return await self.redis.exists(*keys)
+        except Exception as e:
+            logger.error(f"Redis EXISTS失败: {e}")
+            record_redis_error("EXISTS")
+            return None
+
     async def expire(self, key: str, seconds: int) -> bool:
         """设置过期时间"""
         try:
             return await self.redis.expire(key, seconds)
         except Exception as e:
             logger.error(f"Redis EXPIRE失败: {e}")
+            record_redis_error("EXPIRE", key)
             return False
 
+    @staticmethod
+    def loads_json(value: Union[bytes, str, None]) -> Optional[Any]:
+        """解码缓存值(按标签选择codec), 空值或格式错误返回None"""
+        return decode_cache_value(value)
+
     async def get_json(self, key: str) -> Optional[Any]:
         """获取JSON缓存"""
-        value = await self.get(key)
-        if value:
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
+        try:
+            if self._redis is None:
                 return None
-        return None
+            value = await self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis GET失败: {e}")
+            record_redis_error("GET", key)
+            return None
+        record_cache(key, value is not None)
+        return self.loads_json(value)
 
     async def set_json(self, key: str, value: Any, expire: int = None) -> bool:
-        """设置JSON缓存"""
+        """设置JSON缓存(使用当前codec编码)"""
         try:
-            json_value = json.dumps(value, ensure_ascii=False)
-            return await self.set(key, json_value, expire)
+            return await self.set(key, self.codec.encode(value), expire)
         except Exception as e:
             logger.error(f"Redis SET_JSON失败: {e}")
+            record_redis_error("SET_JSON", key)
             return False
 
+    # 批量操作
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False):
+        """批量命令上下文(一次往返)
+
+        用法::
+
+            async with redis_client.pipeline() as pipe:
+                pipe.get(key)
+                pipe.incr(counter_key)
+            cached, count = pipe.results
+        """
+        batch = RedisPipeline()
+        yield batch
+        batch.results = await self._execute_batch(batch, transaction)
+
+    async def _execute_batch(self, batch: RedisPipeline, transaction: bool = False) -> List[Any]:
+        """执行缓冲的命令, 失败时返回全None结果"""
+        empty = [None] * len(batch)
+        if not batch or self._redis is None:
+            return empty
+        try:
+            async with self.redis.pipeline(transaction=transaction) as pipe:
+                for name, args, kwargs in batch._commands:
+                    getattr(pipe, name)(*args, **kwargs)
+                return await pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis PIPELINE失败: {e}")
+            record_redis_error("PIPELINE")
+            return empty
+
+    async def mget_json(self, keys: List[str]) -> List[Optional[Any]]:
+        """批量获取JSON缓存(MGET), 结果与keys一一对应, 未命中为None"""
+        if not keys:
+            return []
+        try:
+            if self._redis is None:
+                return [None] * len(keys)
+            values = await self.redis.mget(keys)
+        except Exception as e:
+            logger.error(f"Redis MGET失败: {e}")
+            record_redis_error("MGET")
+            return [None] * len(keys)
+
+        for key, value in zip(keys, values):
+            record_cache(key, value is not None)
+
+        return [self.loads_json(value) for value in values]
+
+    async def mset_json(
+        self,
+        mapping: Dict[str, Any],
+        expire: Union[int, Dict[str, int], None] = None
+    ) -> bool:
+        """批量设置JSON缓存
+
+        Args:
+            mapping: {key: value}
+            expire: 统一过期秒数, 或 {key: 过期秒数} 指定每个key的TTL
+        """
+        if not mapping:
+            return True
+        if self._redis is None:
+            # Redis未初始化时,静默失败(用于测试环境)
+            return True
+        async with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                ttl = expire.get(key) if isinstance(expire, dict) else expire
+                try:
+                    pipe.set(key, self.codec.encode(value), ex=ttl)
+                except (TypeError, ValueError) as e:
+                    logger.error(f"Redis MSET_JSON序列化失败 {key}: {e}")
+        return all(result is not None for result in pipe.results)
+
+    # Hash操作(原始字节)
+    async def hmget(self, key: str, fields: List[str]) -> List[Optional[bytes]]:
+        """批量读取hash字段, 结果与fields一一对应, 未命中为None"""
+        try:
+            if self._redis is None:
+                return [None] * len(fields)
+            values = await self.redis.hmget(key, fields)
+            record_cache(key, any(value is not None for value in values))
+            return values
+        except Exception as e:
+            logger.error(f"Redis HMGET失败: {e}")
+            record_redis_error("HMGET", key)
+            return [None] * len(fields)
+
+    async def hset(self, key: str, mapping: Dict[str, Union[str, bytes]], expire: int = None) -> bool:
+        """写入hash字段并设置过期时间(一次往返)"""
+        if self._redis is None:
+            # Redis未初始化时,静默失败(用于测试环境)
+            return True
+        async with self.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=mapping)
+            if expire:
+                pipe.expire(key, expire)
+        return all(result is not None for result in pipe.results)
+
+    async def hgetall(self, key: str) -> Optional[Dict[bytes, bytes]]:
+        """读取整个hash, Redis不可用或失败时返回None(key不存在返回空字典)"""
+        try:
+            if self._redis is None:
+                return None
+            values = await self.redis.hgetall(key)
+            record_cache(key, bool(values))
+            return values
+        except Exception as e:
+            logger.error(f"Redis HGETALL失败: {e}")
+            record_redis_error("HGETALL", key)
+            return None
+
+    # 集合操作
+    async def sadd(self, key: str, *members: Any) -> int:
+        """添加集合成员"""
+        try:
+            if self._redis is None or not members:
+                return 0
+            return await self.redis.sadd(key, *members)
+        except Exception as e:
+            logger.error(f"Redis SADD失败: {e}")
+            record_redis_error("SADD", key)
+            return 0
+
+    async def spop(self, key: str, count: int = 1) -> List[bytes]:
+        """随机弹出最多count个集合成员"""
+        try:
+            if self._redis is None:
+                return []
+            return await self.redis.spop(key, count) or []
+        except Exception as e:
+            logger.error(f"Redis SPOP失败: {e}")
+            record_redis_error("SPOP", key)
+            return []
+
+    # Lua脚本
+    async def eval_script(self, script: str, keys: List[str], args: List[Any]) -> Optional[Any]:
+        """执行Lua脚本(首次注册, 之后EVALSHA), Redis不可用或执行失败时返回None"""
+        try:
+            if self._redis is None:
+                return None
+            runner = self._scripts.get(script)
+            if runner is None:
+                runner = self._scripts[script] = self.redis.register_script(script)
+            return await runner(keys=keys, args=args)
+        except Exception as e:
+            logger.error(f"Redis EVALSHA失败: {e}")
+            record_redis_error("EVALSHA")
+            return None
+
     async def delete_pattern(self, pattern: str) -> int:
         """删除匹配模式的所有key"""
         try:
@@ -128,6 +353,7 @@ class RedisClient:
             return 0
         except Exception as e:
             logger.error(f"Redis DELETE_PATTERN失败: {e}")
+            record_redis_error("DELETE_PATTERN")
             return 0
 
     # Token黑名单相关
@@ -159,21 +385,62 @@ class RedisClient:
         """生成商品详情缓存key"""
         return f"product:detail:{product_id}"
 
+    @staticmethod
+    def product_views_key(product_id: int) -> str:
+        """生成商品浏览量计数key"""
+        return f"product:views:{product_id}"
+
     @staticmethod
     def hot_products_key(limit: int = 10) -> str:
-        """生成热门商品缓存key"""
-        return f"products:hot:{limit}"
+        """生成热门商品ID列表缓存key(商品详情单独缓存)"""
+        return f"products:hot:ids:{limit}"
+
+    @staticmethod
+    def product_list_response_key(
+        category_id: Optional[int] = None,
+        keyword: Optional[str] = None,
+        sort_by: str = "created_at",
+        page: int = 1,
+        page_size: int = 20
+    ) -> str:
+        """生成商品列表响应缓存key"""
+        return f"products:response:list:{category_id}:{keyword}:{sort_by}:{page}:{page_size}"
+
+    @staticmethod
+    def hot_products_response_key(limit: int = 10) -> str:
+        """生成热销商品响应缓存key"""
+        return f"products:response:hot:{limit}"
+
+    @staticmethod
+    def product_detail_response_key(product_id: int) -> str:
+        """生成商品详情响应缓存key"""
+        return f"product:response:{product_id}"
 
     @staticmethod
     def cart_key(user_id: int) -> str:
-        """生成购物车缓存key"""
+        """生成购物车hash key(字段为商品ID, 值为数量)"""
         return f"cart:user:{user_id}"
 
+    @staticmethod
+    def cart_dirty_key() -> str:
+        """待写回数据库的购物车用户ID集合"""
+        return "cart:dirty"
+
+    @staticmethod
+    def price_version_key() -> str:
+        """商品价格版本号(改价或删除商品时递增, 购物车汇总据此判断是否需要重新计算)"""
+        return "catalog:price_version"
+
     @staticmethod
     def user_info_key(user_id: int) -> str:
         """生成用户信息缓存key"""
         return f"user:info:{user_id}"
 
+    @staticmethod
+    def write_fence_key(scope: str) -> str:
+        """刚写入过主库的标记(存在期间相关读请求不读只读副本), scope如catalog、user:1"""
+        return f"db:fence:{scope}"
+
     # Pub/Sub相关
     async def publish(self, channel: str, message: Any) -> int:
         """发布消息"""
@@ -182,6 +449,7 @@ class RedisClient:
             return await self.redis.publish(channel, message_str)
         except Exception as e:
             logger.error(f"Redis PUBLISH失败: {e}")
+            record_redis_error("PUBLISH")
             return 0
 
     async def subscribe(self, channel: str):
@@ -192,6 +460,7 @@ class RedisClient:
             return pubsub
         except Exception as e:
             logger.error(f"Redis SUBSCRIBE失败: {e}")
+            record_redis_error("SUBSCRIBE")
             return None
 
     # Session相关
@@ -213,21 +482,23 @@ class RedisClient:
     # 统计相关
     async def increment_view_count(self, product_id: int) -> int:
         """增加商品浏览量"""
-        key = f"product:views:{product_id}"
+        key = self.product_views_key(product_id)
         try:
             return await self.redis.incr(key)
         except Exception as e:
             logger.error(f"Redis INCR失败: {e}")
+            record_redis_error("INCR", key)
             return 0
 
     async def get_view_count(self, product_id: int) -> int:
         """获取商品浏览量"""
-        key = f"product:views:{product_id}"
+        key = self.product_views_key(product_id)
         try:
             value = await self.redis.get(key)
             return int(value) if value else 0
         except Exception as e:
             logger.error(f"Redis GET失败: {e}")
+            record_redis_error("GET", key)
             return 0
 
 
@@ -0,0 +1,212 @@
+"""
+响应级缓存
+缓存接口最终的JSON字节和ETag(Redis hash), 命中时直接返回Response,
+跳过ORM查询、pydantic校验和重新编码
+
+目录(商品/分类)接口的ETag由目录版本号生成: 任何商品或分类写操作(包括下单、取消订单
+引起的库存变化)都会递增版本号,
+条件请求只需读取版本号即可判断是否返回304, 不需要读取缓存内容或查询数据库。
+Redis不可用时回退为内容哈希ETag。
+
+写入缓存时同时保存gzip/br预压缩版本, 压缩开销每次缓存填充只付出一次。
+压缩版本的ETag带编码后缀(强校验值必须区分内容编码), 条件请求接受任一编码版本的ETag。
+"""
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.core.compression import SUPPORTED_ENCODINGS, negotiate_encoding, precompress
+from app.core.redis_client import redis_client
+from app.core.serialization import dumps_json
+
+logger = logging.getLogger(__name__)
+
+# hash字段: 原始内容、ETag, 以及各压缩版本(字段名为编码名, 如gzip/br)
+BODY_FIELD = "body"
+ETAG_FIELD = "etag"
+
+# 目录版本号key
+CATALOG_GENERATION_KEY = "catalog:generation"
+
+
+def make_etag(body: bytes) -> str:
+    """根据响应内容生成强ETag"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+class CachedResponse:
+    """预序列化的响应
+
+    从缓存按编码读取时只加载需要的版本: body可能为None, encoded只包含请求的编码
+    """
+
+    __slots__ = ("body", "etag", "encoded")
+
+    def __init__(
+        self,
+        body: Optional[bytes],
+        etag: Optional[str] = None,
+        encoded: Optional[Dict[str, bytes]] = None
+    ):
+        self.body = body
+        self.etag = etag or make_etag(body)
+        self.encoded = encoded or {}
+
+    @classmethod
+    def from_payload(cls, payload: Any) -> "CachedResponse":
+        """序列化响应数据并预压缩(payload应为model_dump(mode="json")后的结构)"""
+        body = dumps_json(payload)
+        return cls(body, encoded=precompress(body))
+
+
+def request_encoding(request: Request) -> Optional[str]:
+    """客户端可接受的压缩编码"""
+    return negotiate_encoding(request.headers.get("accept-encoding"))
+
+
+def response_fields(encoding: Optional[str] = None) -> List[str]:
+    """读取缓存时需要的hash字段(只读取一种版本)"""
+    return [ETAG_FIELD, encoding or BODY_FIELD]
+
+
+def parse_cached_response(values: List[Optional[bytes]], encoding: Optional[str] = None) -> Optional[CachedResponse]:
+    """由response_fields对应的hash字段值构造CachedResponse(也用于pipeline读取的结果)"""
+    etag, data = values
+    if not etag or not data:
+        return None
+    etag = etag.decode("utf-8")
+    if encoding:
+        return CachedResponse(None, etag, {encoding: data})
+    return CachedResponse(data, etag)
+
+
+async def get_cached_response(key: str, encoding: Optional[str] = None) -> Optional[CachedResponse]:
+    """读取缓存的响应(优先读取指定编码的版本), 未命中返回None"""
+    values = await redis_client.hmget(key, response_fields(encoding))
+    cached = parse_cached_response(values, encoding)
+    if cached is None and encoding and values[0]:
+        # 缓存存在但没有该编码的版本(响应太小未压缩), 读取原始内容
+        cached = parse_cached_response(await redis_client.hmget(key, response_fields()))
+    return cached
+
+
+async def set_cached_response(key: str, cached: CachedResponse, expire: int = None) -> bool:
+    """写入响应缓存(原始内容和所有压缩版本)"""
+    return await redis_client.hset(
+        key,
+        {BODY_FIELD: cached.body, ETAG_FIELD: cached.etag, **cached.encoded},
+        expire=expire
+    )
+
+
+def encoded_etag(etag: str, encoding: Optional[str] = None) -> str:
+    """压缩版本的ETag: 强校验值必须区分内容编码, 在引号内加编码后缀(如"<hash>-gzip")"""
+    if not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _strip_encoding(etag: str) -> str:
+    """去掉ETag的编码后缀"""
+    for encoding in SUPPORTED_ENCODINGS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def matching_etag(request: Request, etag: str) -> Optional[str]:
+    """返回If-None-Match中与etag(任一编码版本)匹配的值, 不匹配返回None(支持多个值、*和弱校验前缀)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*":
+            return etag
+        if _strip_encoding(candidate) == etag:
+            return candidate
+    return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match是否命中etag的任一编码版本"""
+    return matching_etag(request, etag) is not None
+
+
+def not_modified_response(etag: str) -> Response:
+    """304响应"""
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def cached_json_response(request: Request, cached: CachedResponse, etag: Optional[str] = None) -> Response:
+    """返回缓存的JSON字节(客户端支持时返回预压缩版本), If-None-Match命中时返回304
+
+    Args:
+        etag: 使用指定ETag(目录版本ETag), 默认使用内容哈希
+    """
+    etag = etag or cached.etag
+    matched = matching_etag(request, etag)
+    if matched:
+        return not_modified_response(matched)
+
+    encoding = request_encoding(request)
+    if encoding in cached.encoded:
+        headers = {"ETag": encoded_etag(etag, encoding), "Vary": "Accept-Encoding", "Content-Encoding": encoding}
+        return Response(content=cached.encoded[encoding], media_type="application/json", headers=headers)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+# 目录版本号
+async def get_catalog_generation() -> Optional[int]:
+    """读取目录版本号, Redis不可用时返回None"""
+    if not redis_client.is_connected:
+        return None
+    async with redis_client.pipeline() as pipe:
+        # 版本号不存在时(首次使用或Redis数据丢失)以当前毫秒时间戳初始化,
+        # 避免重新从0开始计数而与客户端持有的旧ETag冲突
+        pipe.set(CATALOG_GENERATION_KEY, int(time.time() * 1000), nx=True)
+        pipe.get(CATALOG_GENERATION_KEY)
+    generation = pipe.results[1]
+    return int(generation) if generation is not None else None
+
+
+async def bump_catalog_generation() -> None:
+    """商品或分类变更后递增目录版本号, 使所有目录ETag失效"""
+    if not redis_client.is_connected:
+        return
+    async with redis_client.pipeline() as pipe:
+        pipe.set(CATALOG_GENERATION_KEY, int(time.time() * 1000), nx=True)
+        pipe.incr(CATALOG_GENERATION_KEY)
+
+
+def catalog_etag(request: Request, generation: int) -> str:
+    """目录版本ETag(同一版本下不同URL的ETag不同)"""
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    resource = hashlib.blake2b(
+        f"{request.url.path}?{params}".encode("utf-8"), digest_size=8
+    ).hexdigest()
+    return f'"c{generation}-{resource}"'
+
+
+async def check_catalog_etag(request: Request) -> Tuple[Optional[str], Optional[Response]]:
+    """在读取缓存内容或查询数据库之前检查条件请求
+
+    Returns:
+        (etag, 304响应): 版本ETag命中时第二项为304响应;
+        Redis不可用时etag为None, 调用方使用内容哈希ETag
+    """
+    generation = await get_catalog_generation()
+    if generation is None:
+        return None, None
+    etag = catalog_etag(request, generation)
+    matched = matching_etag(request, etag)
+    if matched:
+        return etag, not_modified_response(matched)
+    return etag, None
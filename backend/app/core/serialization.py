@@ -0,0 +1,151 @@
+"""
+序列化工具
+- 缓存值编解码: 可插拔codec(orjson/msgpack/标准库json), 写入时带格式标签,
+  读取时按标签选择解码器, 切换codec无需清空缓存
+- API默认响应类: 安装orjson时使用ORJSONResponse
+"""
+import enum
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Union
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# 标签格式: b"\x00" + 1字节格式标识 + 数据
+# JSON文本不可能以\x00开头, 因此未带标签的旧缓存值按JSON解析
+TAG_MARKER = b"\x00"
+
+
+def _default(value: Any) -> Any:
+    """序列化标准类型以外的值"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
+
+
+class CacheCodec:
+    """缓存编解码器基类"""
+
+    # 数据格式标识(同一格式的不同实现共用标识, 可以互相读取)
+    tag: bytes = b""
+    name: str = ""
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+    def encode(self, value: Any) -> bytes:
+        """编码并加上格式标签"""
+        return TAG_MARKER + self.tag + self.dumps(value)
+
+
+class JsonCodec(CacheCodec):
+    """标准库json(兜底实现)"""
+
+    tag = b"j"
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=_default).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson实现(与JsonCodec输出相同的JSON格式)"""
+
+    name = "orjson"
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(CacheCodec):
+    """msgpack二进制格式"""
+
+    tag = b"m"
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=_default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _available_codecs() -> Dict[str, CacheCodec]:
+    codecs: Dict[str, CacheCodec] = {"json": JsonCodec()}
+    if orjson is not None:
+        codecs["orjson"] = OrjsonCodec()
+    if msgpack is not None:
+        codecs["msgpack"] = MsgpackCodec()
+    return codecs
+
+
+CODECS = _available_codecs()
+
+# 解码器按标签索引, JSON格式优先使用orjson
+DECODERS: Dict[bytes, CacheCodec] = {}
+for _codec in CODECS.values():
+    if _codec.tag not in DECODERS or _codec.name == "orjson":
+        DECODERS[_codec.tag] = _codec
+
+
+def get_codec(name: str) -> CacheCodec:
+    """按名称获取codec, 依赖未安装时回退到标准库json"""
+    codec = CODECS.get(name)
+    if codec is None:
+        logger.warning(f"缓存codec {name} 不可用, 使用标准库json")
+        codec = CODECS["json"]
+    return codec
+
+
+def decode_cache_value(data: Union[bytes, str, None]) -> Optional[Any]:
+    """解码缓存值(带标签或旧的纯JSON), 空值或无法解码时返回None"""
+    if not data:
+        return None
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        if data[:1] == TAG_MARKER:
+            decoder = DECODERS.get(data[1:2])
+            if decoder is None:
+                # 写入方使用了本进程不支持的codec, 按未命中处理
+                return None
+            return decoder.loads(data[2:])
+        return DECODERS[JsonCodec.tag].loads(data)
+    except Exception:
+        return None
+
+
+def dumps_json(value: Any) -> bytes:
+    """序列化为UTF-8 JSON字节(有orjson时使用orjson)"""
+    return CODECS.get("orjson", CODECS["json"]).dumps(value)
+
+
+# API默认响应类
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
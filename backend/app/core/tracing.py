@@ -0,0 +1,403 @@
+"""
+请求链路追踪(轻量实现, span模型与OpenTelemetry一致)
+- TracingMiddleware为每个请求创建根span(沿用请求头traceparent中的trace, W3C Trace Context),
+  响应头X-Trace-Id返回trace_id, 并写入日志上下文
+- instrument_layers()自动包装service、repository和RedisClient的异步方法, 每次调用
+  生成一个子span; 当前span保存在ContextVar中, 随await和create_task自动传递
+- 不在请求链路中(或未被采样)时包装层只多一次ContextVar读取
+- 导出器可插拔: TRACING_EXPORTER为memory(测试)、file(JSON lines)或"模块:工厂函数"
+  (如对接OpenTelemetry SDK的适配器); 除memory外由后台线程批量导出, 不阻塞事件循环
+"""
+import functools
+import importlib
+import inspect
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# span类型(OpenTelemetry SpanKind)
+INTERNAL, SERVER, CLIENT = "SPAN_KIND_INTERNAL", "SPAN_KIND_SERVER", "SPAN_KIND_CLIENT"
+# span状态
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = "STATUS_CODE_UNSET", "STATUS_CODE_OK", "STATUS_CODE_ERROR"
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """一次操作的耗时记录(to_dict字段名与OTLP JSON一致, attributes为普通对象)"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_span_id", "kind", "attributes",
+        "start_time", "end_time", "status", "status_message", "events",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: Optional[str] = None,
+        kind: str = INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.events: List[dict] = []
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_status(self, status: str, message: str = "") -> None:
+        self.status, self.status_message = status, message
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.events.append({
+            "name": "exception",
+            "timeUnixNano": time.time_ns(),
+            "attributes": {"exception.type": type(exc).__name__, "exception.message": str(exc)[:500]},
+        })
+        self.set_status(STATUS_ERROR, f"{type(exc).__name__}: {exc}"[:200])
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_time,
+            "endTimeUnixNano": self.end_time,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class SpanExporter:
+    """导出器接口"""
+
+    def export(self, spans: List[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """保存在内存中(测试用)"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span]) -> None:
+        self.spans.extend(spans)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """追加写入JSON lines文件, 每行一个span"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "ab") as f:
+            f.write(b"".join(orjson.dumps(span.to_dict(), default=str) + b"\n" for span in spans))
+
+
+class SimpleSpanProcessor:
+    """span结束时同步导出(只用于内存导出器)"""
+
+    def __init__(self, exporter: SpanExporter):
+        self.exporter = exporter
+
+    def on_end(self, span: Span) -> None:
+        self.exporter.export([span])
+
+    def shutdown(self) -> None:
+        self.exporter.shutdown()
+
+
+class BatchSpanProcessor:
+    """结束的span放入队列, 后台线程按批导出; 队列满时丢弃并计数"""
+
+    def __init__(self, exporter: SpanExporter, max_queue_size: int = 4096, batch_size: int = 512, interval: float = 2.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(max_queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> None:
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self.exporter.export(batch)
+            except Exception as e:
+                logger.error(f"导出span失败: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._drain()
+        self._drain()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.exporter.shutdown()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """当前(已采样的)span"""
+    return _current_span.get()
+
+
+class Tracer:
+    """创建span并交给processor; 未配置processor时不产生任何span"""
+
+    def __init__(self):
+        self.processor = None
+        self.sample_ratio = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    def configure(self, processor, sample_ratio: float = 1.0) -> None:
+        self.processor = processor
+        self.sample_ratio = sample_ratio
+
+    def shutdown(self) -> None:
+        if self.processor is not None:
+            self.processor.shutdown()
+            self.processor = None
+
+    def should_sample(self, sampled: Optional[bool] = None) -> bool:
+        """根span的采样决定(上游traceparent已决定时沿用)"""
+        if sampled is not None:
+            return sampled
+        return self.sample_ratio >= 1.0 or random.random() < self.sample_ratio
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        kind: str = INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        trace_id: Optional[str] = None,
+        parent_span_id: Optional[str] = None,
+    ) -> Iterator[Span]:
+        """
+        开始一个span并设为当前span
+
+        不传trace_id时作为当前span的子span; 调用方负责先判断是否采样
+        """
+        parent = _current_span.get()
+        if trace_id is None:
+            if parent is not None:
+                trace_id, parent_span_id = parent.trace_id, parent.span_id
+            else:
+                trace_id = os.urandom(16).hex()
+        span = Span(name, trace_id, parent_span_id, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            span.end_time = time.time_ns()
+            _current_span.reset(token)
+            processor = self.processor
+            if processor is not None:
+                processor.on_end(span)
+
+
+tracer = Tracer()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """解析traceparent请求头 -> (trace_id, 上游span_id, 是否采样)"""
+    if not value:
+        return None
+    match = TRACEPARENT_RE.match(value.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def load_exporter(name: str) -> Optional[SpanExporter]:
+    """按配置创建导出器: none/memory/file, 或"模块:工厂函数" """
+    if name == "none":
+        return None
+    if name == "memory":
+        return InMemorySpanExporter()
+    if name == "file":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    module_name, _, factory = name.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def configure_tracing() -> None:
+    """按配置初始化全局tracer"""
+    exporter = load_exporter(settings.TRACING_EXPORTER)
+    if exporter is None:
+        return
+    if isinstance(exporter, InMemorySpanExporter):
+        processor = SimpleSpanProcessor(exporter)
+    else:
+        processor = BatchSpanProcessor(
+            exporter,
+            max_queue_size=settings.TRACING_MAX_QUEUE_SIZE,
+            batch_size=settings.TRACING_BATCH_SIZE,
+            interval=settings.TRACING_EXPORT_INTERVAL,
+        )
+    tracer.configure(processor, settings.TRACING_SAMPLE_RATIO)
+    logger.info(f"链路追踪已开启: exporter={settings.TRACING_EXPORTER}, 采样率={settings.TRACING_SAMPLE_RATIO}")
+
+
+def traced(qualname: str, layer: str, kind: str = INTERNAL, attributes: Optional[Dict[str, Any]] = None):
+    """
+    包装异步函数: 处于追踪中的请求时为每次调用生成子span
+
+    qualname中的{cls}在调用时替换为实例的实际类名(子类继承的方法按子类命名)
+    """
+    static_attributes = {"code.layer": layer, **(attributes or {})}
+
+    def decorator(func):
+        if getattr(func, "__traced__", False):
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return await func(*args, **kwargs)
+            name = qualname.format(cls=type(args[0]).__name__) if "{cls}" in qualname and args else qualname
+            with tracer.start_span(name, kind, static_attributes):
+                return await func(*args, **kwargs)
+
+        wrapper.__traced__ = True
+        return wrapper
+
+    return decorator
+
+
+def instrument_class(cls: type, layer: str, kind: str = INTERNAL, attributes: Optional[Dict[str, Any]] = None) -> None:
+    """包装类中定义的所有异步方法(含静态方法和类方法, 不含魔术方法)"""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("__"):
+            continue
+        wrapper_type = type(value) if isinstance(value, (staticmethod, classmethod)) else None
+        func = value.__func__ if wrapper_type is not None else value
+        if not inspect.iscoroutinefunction(func) or getattr(func, "__traced__", False):
+            continue
+        qualname = f"{cls.__name__}.{attr}" if wrapper_type is not None else f"{{cls}}.{attr}"
+        wrapped = traced(qualname, layer, kind, {**(attributes or {}), "code.function": attr})(func)
+        setattr(cls, attr, wrapper_type(wrapped) if wrapper_type is not None else wrapped)
+
+
+def instrument_layers() -> None:
+    """包装service、repository和RedisClient(重复调用无副作用)"""
+    from app import repositories, services
+    from app.core.redis_client import RedisClient
+
+    for module, layer in ((repositories, "repository"), (services, "service")):
+        for name, cls in vars(module).items():
+            if inspect.isclass(cls) and cls.__module__ == module.__name__:
+                instrument_class(cls, layer)
+    instrument_class(RedisClient, "redis", CLIENT, {"db.system": "redis"})
+
+
+class TracingMiddleware:
+    """为每个HTTP请求创建根span(未开启追踪或未被采样时直接透传)"""
+
+    def __init__(self, app: ASGIApp, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        upstream = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        if not self.tracer.should_sample(upstream[2] if upstream else None):
+            await self.app(scope, receive, send)
+            return
+
+        from app.core.logger import request_context
+
+        trace_id, parent_span_id = (upstream[0], upstream[1]) if upstream else (None, None)
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        with self.tracer.start_span(
+            f"{scope['method']} {scope['path']}", SERVER, attributes, trace_id, parent_span_id
+        ) as span:
+            log_context = request_context.get()
+            if log_context is not None:
+                log_context["trace_id"] = span.trace_id
+
+            async def send_with_trace(message: Message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(STATUS_ERROR)
+                    MutableHeaders(scope=message).append("X-Trace-Id", span.trace_id)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.name = f"{scope['method']} {route}"
+                    span.set_attribute("http.route", route)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Boolean, Enum, Numeric
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Boolean, Enum, Numeric, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -57,6 +57,7 @@ class Product(Base):
     detail_url = Column(String(1000), nullable=True, comment="详情链接")
     image_url = Column(String(1000), nullable=True, comment="原始图片URL")
     local_image_path = Column(String(1000), nullable=False, comment="本地图片路径")
+    image_variants = Column(JSON, nullable=True, comment="衍生图URL {尺寸名: {格式: URL}}")
     ingredients = Column(Text, nullable=True, comment="食材信息")
     description = Column(Text, nullable=True, comment="商品描述")
     price = Column(Numeric(10, 2), nullable=False, default=0.00, comment="价格")
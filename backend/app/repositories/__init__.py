@@ -2,14 +2,32 @@
 Repository层 - 数据访问层
 负责与数据库交互,提供CRUD操作
 """
-from typing import List, Optional, TypeVar, Generic, Tuple
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, TypeVar, Generic, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import (
+    Column, Executable, MetaData, Table, and_, bindparam, case, null, select, update, delete, insert, func, exists,
+    literal, or_, union_all
+)
 from sqlalchemy.orm import selectinload
+from app.core import metrics
 from app.models import Base
 
 ModelType = TypeVar("ModelType", bound=Base)
 
+# 热点查询的语句缓存: 按(模型, 查询名, 查询形状)保存构建好的语句, 参数通过bindparam传入。
+# 复用同一语句对象时不再重复构建, 缓存键也只计算一次, 执行时直接命中引擎的编译缓存
+_statements: Dict[tuple, Executable] = {}
+
+
+def cached_statement(key: tuple, build: Callable[[], Executable]) -> Executable:
+    """取缓存的语句, 不存在时调用build构建(build中的参数必须用bindparam)"""
+    statement = _statements.get(key)
+    if statement is None:
+        statement = _statements[key] = build()
+    return statement
+
 
 class BaseRepository(Generic[ModelType]):
     """基础Repository"""
@@ -20,9 +38,20 @@ class BaseRepository(Generic[ModelType]):
 
     async def get_by_id(self, id: int) -> Optional[ModelType]:
         """根据ID获取"""
-        result = await self.db.execute(select(self.model).where(self.model.id == id))
+        statement = cached_statement(
+            (self.model, "get_by_id"),
+            lambda: select(self.model).where(self.model.id == bindparam("id")),
+        )
+        result = await self.db.execute(statement, {"id": id})
         return result.scalar_one_or_none()
 
+    async def get_by_ids(self, ids: List[int]) -> List[ModelType]:
+        """根据ID列表批量获取(单次IN查询, 不保证顺序)"""
+        if not ids:
+            return []
+        result = await self.db.execute(select(self.model).where(self.model.id.in_(ids)))
+        return list(result.scalars().all())
+
     async def get_all(
         self,
         skip: int = 0,
@@ -132,9 +161,205 @@ class CategoryRepository(BaseRepository):
         return result.scalar_one_or_none()
 
 
+# 商品列表排序: sort_by -> (列名, 是否降序), 未知值按created_at降序
+PRODUCT_SORTS = {
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+    "sales": ("sales_count", True),
+    "views": ("views", True),
+    "created_at": ("created_at", True),
+}
+
+
 class ProductRepository(BaseRepository):
     """商品Repository"""
 
+    # 批量语句每条处理的ID数量(控制IN列表的绑定参数个数)
+    BULK_CHUNK_SIZE = 1000
+
+    @classmethod
+    def _chunks(cls, ids: List[int]) -> List[List[int]]:
+        """去重并按BULK_CHUNK_SIZE分块"""
+        ids = list(dict.fromkeys(ids))
+        return [ids[i:i + cls.BULK_CHUNK_SIZE] for i in range(0, len(ids), cls.BULK_CHUNK_SIZE)]
+
+    # 导入暂存表的列(值为None表示该行未提供, 已有商品保留原值)
+    IMPORT_COLUMNS = (
+        "title", "category_id", "price", "stock", "detail_url", "image_url", "local_image_path",
+        "ingredients", "description", "views", "favorites", "is_active", "sort_order"
+    )
+    # 新商品未提供的字段使用的默认值
+    IMPORT_DEFAULTS = {
+        "price": 0, "stock": 0, "local_image_path": "", "views": 0,
+        "favorites": 0, "is_active": True, "sort_order": 0
+    }
+
+    def _import_staging_table(self) -> Table:
+        """导入暂存表(临时表, 列类型与商品表一致)"""
+        products = self.model.__table__
+        return Table(
+            "product_import_staging",
+            MetaData(),
+            *(Column(name, products.c[name].type, nullable=True) for name in self.IMPORT_COLUMNS),
+            prefixes=["TEMPORARY"]
+        )
+
+    async def create_import_staging(self) -> Table:
+        """创建(重建)导入暂存表"""
+        staging = self._import_staging_table()
+        conn = await self.db.connection()
+        await conn.run_sync(lambda sync_conn: staging.drop(sync_conn, checkfirst=True))
+        await conn.run_sync(lambda sync_conn: staging.create(sync_conn))
+        return staging
+
+    async def drop_import_staging(self, staging: Table) -> None:
+        """删除导入暂存表"""
+        conn = await self.db.connection()
+        await conn.run_sync(lambda sync_conn: staging.drop(sync_conn, checkfirst=True))
+
+    async def load_import_staging(self, staging: Table, rows: List[dict]) -> None:
+        """写入一批导入行: PostgreSQL使用COPY, 其他数据库使用executemany"""
+        if not rows:
+            return
+        conn = await self.db.connection()
+        if conn.dialect.name == "postgresql":
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                staging.name,
+                records=[tuple(row.get(name) for name in self.IMPORT_COLUMNS) for row in rows],
+                columns=list(self.IMPORT_COLUMNS)
+            )
+        else:
+            await conn.execute(
+                insert(staging),
+                [{name: row.get(name) for name in self.IMPORT_COLUMNS} for row in rows]
+            )
+
+    async def upsert_from_staging(self, staging: Table) -> Tuple[List[int], int]:
+        """由暂存表按标题更新已有商品并插入新商品(两条语句)
+
+        Returns:
+            (更新的商品ID, 新增商品数)
+        """
+        from app.models import ProductStatus
+
+        products = self.model.__table__
+        now = datetime.utcnow()
+
+        result = await self.db.execute(
+            update(products)
+            .where(products.c.title == staging.c.title)
+            .values({
+                **{
+                    name: func.coalesce(staging.c[name], products.c[name])
+                    for name in self.IMPORT_COLUMNS if name != "title"
+                },
+                # 图片变化时清空衍生图, 由refresh_image_variants按新图片重新生成
+                "image_variants": case(
+                    (
+                        and_(
+                            staging.c.local_image_path.is_not(None),
+                            staging.c.local_image_path.is_distinct_from(products.c.local_image_path)
+                        ),
+                        null()
+                    ),
+                    else_=products.c.image_variants
+                ),
+                "updated_at": now
+            })
+            .returning(products.c.id)
+        )
+        updated_ids = list(result.scalars().all())
+
+        columns = [
+            func.coalesce(staging.c[name], literal(self.IMPORT_DEFAULTS[name], products.c[name].type))
+            if name in self.IMPORT_DEFAULTS else staging.c[name]
+            for name in self.IMPORT_COLUMNS
+        ]
+        result = await self.db.execute(
+            insert(products).from_select(
+                list(self.IMPORT_COLUMNS) + ["sales_count", "status", "created_at", "updated_at"],
+                select(
+                    *columns,
+                    literal(0, products.c.sales_count.type),
+                    literal(ProductStatus.ACTIVE, products.c.status.type),
+                    literal(now, products.c.created_at.type),
+                    literal(now, products.c.updated_at.type)
+                ).where(~exists().where(products.c.title == staging.c.title))
+            )
+        )
+        return updated_ids, result.rowcount
+
+    async def set_active_bulk(self, ids: List[int], is_active: bool) -> List[int]:
+        """批量设置上架状态(每块一条UPDATE), 返回实际更新的商品ID"""
+        updated = []
+        for chunk in self._chunks(ids):
+            result = await self.db.execute(
+                update(self.model)
+                .where(self.model.id.in_(chunk))
+                .values(is_active=is_active, updated_at=datetime.utcnow())
+                .returning(self.model.id)
+                .execution_options(synchronize_session=False)
+            )
+            updated.extend(result.scalars().all())
+        return updated
+
+    async def delete_bulk(self, ids: List[int]) -> Tuple[List[int], List[int]]:
+        """批量删除商品(每块固定条数的语句)
+
+        订单明细和评价是历史记录, 被引用的商品不删除;
+        其余商品的购物车和收藏记录随商品一起删除。
+
+        Returns:
+            (已删除的商品ID, 被订单或评价引用的商品ID)
+        """
+        from app.models import CartItem, Favorite, OrderItem, Review
+
+        deleted, referenced = [], []
+        for chunk in self._chunks(ids):
+            result = await self.db.execute(
+                select(OrderItem.product_id).where(OrderItem.product_id.in_(chunk)).union(
+                    select(Review.product_id).where(Review.product_id.in_(chunk))
+                )
+            )
+            blocked = set(result.scalars().all())
+            referenced.extend(product_id for product_id in chunk if product_id in blocked)
+            deletable = [product_id for product_id in chunk if product_id not in blocked]
+            if not deletable:
+                continue
+
+            await self.db.execute(
+                delete(CartItem).where(CartItem.product_id.in_(deletable))
+                .execution_options(synchronize_session=False)
+            )
+            await self.db.execute(
+                delete(Favorite).where(Favorite.product_id.in_(deletable))
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.db.execute(
+                delete(self.model).where(self.model.id.in_(deletable))
+                .returning(self.model.id)
+                .execution_options(synchronize_session=False)
+            )
+            deleted.extend(result.scalars().all())
+        return deleted, referenced
+
+    async def image_reference_counts(self, url_prefix: str) -> Dict[str, int]:
+        """统计以url_prefix开头的图片路径被多少个商品和订单商品引用
+
+        订单商品保存下单时的图片路径, 商品换图或删除后订单历史仍引用原来的文件
+        """
+        from app.models import OrderItem
+
+        paths = union_all(
+            select(self.model.local_image_path.label("path"))
+            .where(self.model.local_image_path.startswith(url_prefix)),
+            select(OrderItem.product_image.label("path"))
+            .where(OrderItem.product_image.startswith(url_prefix))
+        ).subquery()
+        result = await self.db.execute(select(paths.c.path, func.count()).group_by(paths.c.path))
+        return {path: count for path, count in result.all()}
+
     async def get_by_category(
         self,
         category_id: int,
@@ -221,79 +446,76 @@ class ProductRepository(BaseRepository):
         limit: int = 100
     ) -> Tuple[List[ModelType], int]:
         """获取带筛选的商品列表"""
-        from sqlalchemy import or_
-
-        # 构建查询
-        query = select(self.model).where(
-            self.model.is_active == True,
-            self.model.status == "active"
-        )
+        order_by = PRODUCT_SORTS.get(sort_by, PRODUCT_SORTS["created_at"])
+        shape = (bool(category_id), bool(keyword), order_by)
 
-        # 分类筛选
-        if category_id:
-            query = query.where(self.model.category_id == category_id)
-
-        # 关键词搜索
-        if keyword:
-            query = query.where(
-                or_(
-                    self.model.title.ilike(f"%{keyword}%"),
-                    self.model.description.ilike(f"%{keyword}%")
-                )
+        def build(*columns):
+            query = select(*columns).where(
+                self.model.is_active == True,
+                self.model.status == "active"
             )
+            # 分类筛选
+            if category_id:
+                query = query.where(self.model.category_id == bindparam("category_id"))
+            # 关键词搜索
+            if keyword:
+                query = query.where(
+                    or_(
+                        self.model.title.ilike(bindparam("pattern")),
+                        self.model.description.ilike(bindparam("pattern"))
+                    )
+                )
+            return query
 
-        # 排序
-        if sort_by == "price_asc":
-            query = query.order_by(self.model.price.asc())
-        elif sort_by == "price_desc":
-            query = query.order_by(self.model.price.desc())
-        elif sort_by == "sales":
-            query = query.order_by(self.model.sales_count.desc())
-        elif sort_by == "views":
-            query = query.order_by(self.model.views.desc())
-        else:  # created_at
-            query = query.order_by(self.model.created_at.desc())
+        params = {"category_id": category_id, "pattern": f"%{keyword}%", "skip": skip, "limit": limit}
 
         # 获取总数
-        count_query = select(func.count(self.model.id))
-        if category_id:
-            count_query = count_query.where(self.model.category_id == category_id)
-        if keyword:
-            count_query = count_query.where(
-                or_(
-                    self.model.title.ilike(f"%{keyword}%"),
-                    self.model.description.ilike(f"%{keyword}%")
-                )
-            )
-        count_query = count_query.where(
-            self.model.is_active == True,
-            self.model.status == "active"
+        count_query = cached_statement(
+            (self.model, "count_products_with_filter", shape[:2]),
+            lambda: build(func.count(self.model.id)),
         )
-
-        total_result = await self.db.execute(count_query)
+        total_result = await self.db.execute(count_query, params)
         total = total_result.scalar()
 
-        # 分页
-        query = query.offset(skip).limit(limit)
-        result = await self.db.execute(query)
+        # 排序和分页
+        column, descending = order_by
+        query = cached_statement(
+            (self.model, "get_products_with_filter", shape),
+            lambda: build(self.model).order_by(
+                getattr(self.model, column).desc() if descending else getattr(self.model, column).asc()
+            ).offset(bindparam("skip")).limit(bindparam("limit")),
+        )
+        result = await self.db.execute(query, params)
 
         return list(result.scalars().all()), total
 
-    async def lock_stock(self, product_id: int, quantity: int) -> ModelType:
-        """锁定库存(移除FOR UPDATE避免事务冲突)"""
-        # 使用普通查询，避免FOR UPDATE导致的事务问题
+    async def get_stock_states(self, ids: List[int]) -> Dict[int, dict]:
+        """按商品ID读取当前的库存和上下架状态(不加载整行)"""
+        if not ids:
+            return {}
         result = await self.db.execute(
-            select(self.model).where(self.model.id == product_id)
+            select(self.model.id, self.model.stock, self.model.is_active, self.model.status)
+            .where(self.model.id.in_(ids))
         )
-        product = result.scalar_one_or_none()
+        return {
+            row.id: {"stock": row.stock, "is_active": row.is_active, "status": row.status}
+            for row in result.all()
+        }
+
+    async def lock_stock(self, product_id: int, quantity: int) -> ModelType:
+        """锁定库存(移除FOR UPDATE避免事务冲突)"""
+        # 使用普通查询，避免FOR UPDATE导致的事务问题; 会话中已加载的商品不再查询
+        product = await self.db.get(self.model, product_id)
 
         if not product:
             raise ValueError("商品不存在")
 
         if product.stock < quantity:
+            metrics.STOCK_REJECTIONS.inc()
             raise ValueError(f"库存不足,当前库存: {product.stock}")
 
         product.stock -= quantity
+        metrics.STOCK_LOCKED.inc(amount=quantity)
         return product
 
     async def release_stock(self, product_id: int, quantity: int) -> ModelType:
@@ -309,6 +531,7 @@ class ProductRepository(BaseRepository):
             raise ValueError("商品不存在")
 
         product.stock += quantity
+        metrics.STOCK_RELEASED.inc(amount=quantity)
         # 移除commit和refresh - 由外层事务管理
         # await self.db.commit()
         # await self.db.refresh(product)
@@ -362,7 +585,7 @@ class CartRepository(BaseRepository):
         # 移除selectinload，使用join一次性获取所有数据，避免事务问题
         from app.models import Product
 
-        query = select(
+        query = cached_statement((self.model, "get_user_cart"), lambda: select(
             self.model.id,
             self.model.user_id,
             self.model.product_id,
@@ -373,10 +596,10 @@ class CartRepository(BaseRepository):
         ).join(
             Product, self.model.product_id == Product.id
         ).where(
-            self.model.user_id == user_id
-        )
+            self.model.user_id == bindparam("user_id")
+        ))
 
-        result = await self.db.execute(query)
+        result = await self.db.execute(query, {"user_id": user_id})
         rows = result.all()
 
         # 手动构建CartItem对象，避免lazy loading
@@ -396,6 +619,22 @@ class CartRepository(BaseRepository):
 
         return cart_items
 
+    async def get_cart_totals(self, user_id: int) -> Tuple[int, int, Decimal]:
+        """一条聚合查询获取购物车行数、商品数量和小计"""
+        from app.models import Product
+
+        query = select(
+            func.count(self.model.id),
+            func.coalesce(func.sum(self.model.quantity), 0),
+            func.coalesce(func.sum(self.model.quantity * Product.price), 0)
+        ).join(
+            Product, self.model.product_id == Product.id
+        ).where(
+            self.model.user_id == user_id
+        )
+        lines, quantity, subtotal = (await self.db.execute(query)).one()
+        return int(lines), int(quantity), Decimal(str(subtotal)).quantize(Decimal("0.01"))
+
     async def get_cart_item(self, user_id: int, product_id: int) -> Optional[ModelType]:
         """获取购物车商品"""
         query = select(self.model).where(
@@ -445,6 +684,47 @@ class CartRepository(BaseRepository):
         # await self.db.commit()
         return result.rowcount > 0
 
+    async def get_user_cart_items(self, user_id: int) -> List[ModelType]:
+        """获取用户购物车行(不加载商品)"""
+        result = await self.db.execute(select(self.model).where(self.model.user_id == user_id))
+        return list(result.scalars().all())
+
+    async def get_cart_rows(self, user_id: int) -> List[Tuple[int, int, Optional[datetime]]]:
+        """获取用户购物车的(商品ID, 数量, 加入时间), 不加载商品"""
+        query = select(
+            self.model.product_id,
+            self.model.quantity,
+            self.model.created_at
+        ).where(
+            self.model.user_id == user_id
+        ).order_by(self.model.id)
+        result = await self.db.execute(query)
+        return [tuple(row) for row in result.all()]
+
+    async def replace_user_carts(self, user_ids: List[int], rows: List[dict]) -> int:
+        """用给定内容整体替换多个用户的购物车(批量DELETE + 批量INSERT)
+
+        Args:
+            user_ids: 要替换的用户ID
+            rows: 新的购物车行, 包含user_id/product_id/quantity/created_at
+        Returns:
+            写入的行数(已删除商品的行被忽略)
+        """
+        from app.models import Product
+
+        await self.db.execute(delete(self.model).where(self.model.user_id.in_(user_ids)))
+        if not rows:
+            return 0
+
+        # 跳过已删除的商品, 避免外键错误导致整批失败
+        product_ids = {row["product_id"] for row in rows}
+        result = await self.db.execute(select(Product.id).where(Product.id.in_(product_ids)))
+        existing = set(result.scalars().all())
+        rows = [row for row in rows if row["product_id"] in existing]
+        if rows:
+            await self.db.execute(insert(self.model), rows)
+        return len(rows)
+
 
 class OrderRepository(BaseRepository):
     """订单Repository"""
@@ -541,7 +821,9 @@ class OrderRepository(BaseRepository):
                 f"状态转换不允许: {order.status} -> {new_status}"
             )
 
-        return await self.update_order_status(order_id, new_status)
+        order = await self.update_order_status(order_id, new_status)
+        metrics.ORDER_STATUS_CHANGES.inc(new_status)
+        return order
 
 
 class ReviewRepository(BaseRepository):
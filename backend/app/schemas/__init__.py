@@ -3,7 +3,7 @@ Pydantic Schemas定义
 用于请求和响应的数据验证
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import BaseModel, Field, ConfigDict
 from decimal import Decimal
 from enum import Enum
@@ -193,6 +193,9 @@ class ProductResponse(BaseModel):
     detail_url: Optional[str] = None
     image_url: Optional[str] = None
     local_image_path: str
+    image_variants: Optional[Dict[str, Dict[str, str]]] = Field(
+        None, description="缩略图/WebP等衍生图URL: {尺寸名(thumb/medium/large): {格式(webp/avif): URL}}"
+    )
     ingredients: Optional[str] = None
     description: Optional[str] = None
     price: Decimal
@@ -252,6 +255,25 @@ class CartItemUpdate(BaseModel):
     quantity: int = Field(..., ge=1, description="数量")
 
 
+class CartOperationType(str, Enum):
+    """购物车批量操作类型"""
+    SET = "set"  # 设置数量(不存在则添加)
+    INCREMENT = "increment"  # 增减数量(结果<=0时删除)
+    REMOVE = "remove"  # 删除
+
+
+class CartOperation(BaseModel):
+    """购物车批量操作项"""
+    op: CartOperationType = Field(..., description="操作类型: set / increment / remove")
+    product_id: int = Field(..., description="商品ID")
+    quantity: int = Field(0, description="set为新数量(>=1), increment为增量(可为负), remove忽略")
+
+
+class CartBatchUpdate(BaseModel):
+    """购物车批量修改Schema"""
+    operations: List[CartOperation] = Field(..., min_length=1, max_length=100, description="按顺序执行的操作")
+
+
 class CartItemResponse(BaseModel):
     """购物车响应Schema"""
     model_config = ConfigDict(from_attributes=True)
@@ -479,11 +501,62 @@ class AdminProductStockUpdate(BaseModel):
 
 class AdminProductBatchOperation(BaseModel):
     """管理后台商品批量操作Schema"""
-    product_ids: List[int] = Field(..., description="商品ID列表")
+    product_ids: List[int] = Field(..., min_length=1, max_length=10000, description="商品ID列表")
     operation: str = Field(..., description="操作类型: activate/deactivate/delete")
     reason: Optional[str] = Field(None, description="操作原因")
 
 
+class AdminProductBatchFailure(BaseModel):
+    """管理后台商品批量操作失败项Schema"""
+    product_id: int
+    reason: str
+
+
+class AdminProductBatchResult(MessageResponse):
+    """管理后台商品批量操作结果Schema"""
+    success_count: int = 0
+    failed_products: List[AdminProductBatchFailure] = []
+
+
+class ProductImportRow(BaseModel):
+    """商品导入行Schema
+
+    除标题和分类外的字段均可省略: 已有商品(按标题匹配)保留原值, 新商品使用默认值
+    """
+    title: str = Field(..., min_length=1, max_length=500, description="商品标题(匹配已有商品)")
+    category: Optional[str] = Field(None, max_length=100, description="分类名称或代码")
+    category_id: Optional[int] = Field(None, description="分类ID(优先于category)")
+    price: Optional[Decimal] = Field(None, ge=0, le=Decimal("99999999.99"), description="价格")
+    stock: Optional[int] = Field(None, ge=0, description="库存")
+    detail_url: Optional[str] = Field(None, max_length=1000)
+    image_url: Optional[str] = Field(None, max_length=1000)
+    local_image_path: Optional[str] = Field(None, max_length=1000)
+    ingredients: Optional[str] = None
+    description: Optional[str] = None
+    views: Optional[int] = Field(None, ge=0)
+    favorites: Optional[int] = Field(None, ge=0)
+    is_active: Optional[bool] = None
+    sort_order: Optional[int] = None
+
+
+class ProductImportError(BaseModel):
+    """商品导入错误行Schema"""
+    line: int = Field(..., description="行号(CSV不含表头)")
+    error: str
+
+
+class ProductImportReport(BaseModel):
+    """商品导入结果Schema"""
+    total_rows: int
+    inserted: int
+    updated: int
+    failed: int
+    categories_created: int = 0
+    errors: List[ProductImportError] = Field(default_factory=list, description="错误行(最多返回前1000条)")
+    elapsed_seconds: float
+    rows_per_second: float
+
+
 class AdminTodayStatsResponse(BaseModel):
     """管理后台今日统计响应Schema"""
     order_count: int
@@ -2,12 +2,17 @@
 Service层 - 业务逻辑层
 负责处理业务逻辑,调用Repository层
 """
-from typing import List, Optional, Tuple
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, update, func, and_, or_, bindparam
+from pydantic import ValidationError
 from datetime import datetime, timedelta
 from decimal import Decimal
+import asyncio
+import calendar
+import logging
 import secrets
+import time
 import json
 import csv
 import io
@@ -18,14 +23,25 @@ from app.repositories import (
     CartRepository, OrderRepository, ReviewRepository,
     BaseRepository
 )
+from app.schemas import ProductResponse, CategoryResponse, ProductImportRow
 from app.core.security import (
     verify_password, get_password_hash,
     create_user_access_token, create_admin_access_token
 )
 from app.core.redis_client import redis_client
+from app.core.database import primary_reads, replica_reads
+from app.core.read_routing import mark_catalog_write
+from app.core import image_store
+from app.core.images import create_variants, resolve_source
+from app.core.response_cache import (
+    CachedResponse, response_fields,
+    get_cached_response, set_cached_response, parse_cached_response,
+    bump_catalog_generation
+)
 from app.core.config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
 # ==================== 用户认证Service ====================
@@ -200,33 +216,54 @@ class CategoryService:
         """获取分类Repository"""
         return CategoryRepository(Category, db)
 
+    @replica_reads
     async def get_categories(
         self,
         db: AsyncSession = None,
         skip: int = 0,
         limit: int = 100
     ) -> List[Category]:
-        """获取分类列表(带缓存)"""
-        category_repo = self.get_category_repo(db)
+        """获取分类列表
 
-        # 尝试从缓存获取
-        cache_key = f"categories:all:{skip}:{limit}"
-        cached_categories = await redis_client.get_json(cache_key)
-        if cached_categories:
-            return cached_categories
+        响应级缓存见get_categories_response
+        """
+        category_repo = self.get_category_repo(db)
+        return await category_repo.get_active_categories(skip, limit)
 
-        # 从数据库获取
-        categories = await category_repo.get_active_categories(skip, limit)
+    @primary_reads
+    async def get_categories_response(
+        self,
+        db: AsyncSession = None,
+        skip: int = 0,
+        limit: int = 100,
+        encoding: Optional[str] = None
+    ) -> CachedResponse:
+        """获取分类列表响应(缓存序列化后的完整JSON)
 
-        # 缓存结果
-        await redis_client.set_json(
-            cache_key,
-            categories,
-            expire=1800  # 30分钟
-        )
+        Args:
+            encoding: 客户端接受的压缩编码, 命中缓存时只读取该版本
+        """
+        cache_key = f"categories:response:{skip}:{limit}"
+        cached = await get_cached_response(cache_key, encoding)
+        if cached:
+            return cached
+
+        categories = await self.get_categories(db, skip, limit)
+        cached = CachedResponse.from_payload([
+            CategoryResponse.model_validate(c).model_dump(mode="json") for c in categories
+        ])
+        await set_cached_response(cache_key, cached, expire=1800)  # 30分钟
+        return cached
 
-        return categories
+    @staticmethod
+    async def invalidate_cache():
+        """分类变更后清除分类缓存并递增目录版本号"""
+        # 先设置写入标记, 之后开始的请求不再读副本
+        await mark_catalog_write()
+        await redis_client.delete_pattern("categories:*")
+        await bump_catalog_generation()
 
+    @replica_reads
     async def get_category_by_id(self, category_id: int, db: AsyncSession = None) -> Optional[Category]:
         """获取分类详情"""
         category_repo = self.get_category_repo(db)
@@ -260,7 +297,7 @@ class CategoryService:
         category = await category_repo.create(category_data)
 
         # 清除分类列表缓存
-        await redis_client.delete_pattern("categories:*")
+        await self.invalidate_cache()
 
         return category
 
@@ -274,7 +311,7 @@ class CategoryService:
         category = await category_repo.update(category_id, kwargs)
 
         # 清除分类列表缓存
-        await redis_client.delete_pattern("categories:*")
+        await self.invalidate_cache()
 
         return category
 
@@ -284,7 +321,7 @@ class CategoryService:
         success = await category_repo.delete(category_id)
 
         # 清除分类列表缓存
-        await redis_client.delete_pattern("categories:*")
+        await self.invalidate_cache()
 
         return success
 
@@ -298,6 +335,7 @@ class ProductService:
         """获取商品Repository"""
         return ProductRepository(Product, db)
 
+    @replica_reads
     async def get_products(
         self,
         category_id: Optional[int] = None,
@@ -307,22 +345,13 @@ class ProductService:
         page_size: int = 20,
         db: AsyncSession = None
     ) -> Tuple[List[Product], int]:
-        """获取商品列表(带缓存、筛选、排序)"""
-        product_repo = self.get_product_repo(db)
+        """获取商品列表(筛选、排序、分页)
 
-        # 生成缓存key
-        cache_key = f"products:{category_id}:{keyword}:{sort_by}:{page}:{page_size}"
-        try:
-            cached_data = await redis_client.get_json(cache_key)
-            if cached_data:
-                return cached_data["products"], cached_data["total"]
-        except Exception:
-            # Redis失败时继续从数据库获取
-            pass
-
-        # 从数据库获取
+        响应级缓存见get_products_response
+        """
+        product_repo = self.get_product_repo(db)
         skip = (page - 1) * page_size
-        products, total = await product_repo.get_products_with_filter(
+        return await product_repo.get_products_with_filter(
             category_id=category_id,
             keyword=keyword,
             sort_by=sort_by,
@@ -330,137 +359,278 @@ class ProductService:
             limit=page_size
         )
 
-        # 尝试缓存结果（失败不影响业务）
-        try:
-            # 将ORM对象转换为字典以便序列化
-            products_dict = [
-                {
-                    "id": p.id,
-                    "title": p.title,
-                    "category_id": p.category_id,
-                    "description": p.description,
-                    "price": float(p.price),
-                    "stock": p.stock,
-                    "sales_count": p.sales_count,
-                    "views": p.views,
-                    "status": p.status,
-                    "is_active": p.is_active
-                }
-                for p in products
-            ]
-            cache_data = {
-                "products": products_dict,
-                "total": total
+    @staticmethod
+    def serialize_products(products: List[Union[Product, dict]]) -> List[dict]:
+        """按ProductResponse序列化为JSON兼容结构(与接口直接返回的格式一致)"""
+        return [ProductResponse.model_validate(p).model_dump(mode="json") for p in products]
+
+    @primary_reads
+    async def get_products_response(
+        self,
+        category_id: Optional[int] = None,
+        keyword: Optional[str] = None,
+        sort_by: str = "created_at",
+        page: int = 1,
+        page_size: int = 20,
+        db: AsyncSession = None,
+        encoding: Optional[str] = None
+    ) -> CachedResponse:
+        """获取商品列表响应(缓存序列化后的完整JSON)
+
+        Args:
+            encoding: 客户端接受的压缩编码, 命中缓存时只读取该版本
+        """
+        cache_key = redis_client.product_list_response_key(
+            category_id, keyword, sort_by, page, page_size
+        )
+        cached = await get_cached_response(cache_key, encoding)
+        if cached:
+            return cached
+
+        products, total = await self.get_products(
+            category_id=category_id,
+            keyword=keyword,
+            sort_by=sort_by,
+            page=page,
+            page_size=page_size,
+            db=db
+        )
+        cached = CachedResponse.from_payload({
+            "products": self.serialize_products(products),
+            "pagination": {
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": (total + page_size - 1) // page_size
             }
-            await redis_client.set_json(
-                cache_key,
-                cache_data,
-                expire=600  # 10分钟
+        })
+        await set_cached_response(cache_key, cached, expire=settings.PRODUCT_LIST_CACHE_TTL)
+        return cached
+
+    @staticmethod
+    def product_to_cache_dict(product: Product) -> dict:
+        """将商品ORM对象转换为可JSON序列化的字典(字段与ProductResponse一致)"""
+        return {
+            "id": product.id,
+            "title": product.title,
+            "category_id": product.category_id,
+            "detail_url": product.detail_url,
+            "image_url": product.image_url,
+            "local_image_path": product.local_image_path,
+            "image_variants": product.image_variants,
+            "ingredients": product.ingredients,
+            "description": product.description,
+            "price": str(product.price),
+            "stock": product.stock,
+            "sales_count": product.sales_count,
+            "views": product.views,
+            "favorites": product.favorites,
+            "status": getattr(product.status, "value", product.status),
+            "is_active": product.is_active,
+            "sort_order": product.sort_order,
+            "created_at": product.created_at.isoformat() if product.created_at else None,
+            "updated_at": product.updated_at.isoformat() if product.updated_at else None
+        }
+
+    @primary_reads
+    async def get_products_by_ids(
+        self,
+        product_ids: List[int],
+        db: AsyncSession = None
+    ) -> List[dict]:
+        """批量获取商品详情(带缓存)
+
+        一次MGET读取所有商品详情缓存, 未命中的商品用一次IN查询回源并批量回填,
+        返回顺序与product_ids一致, 不存在的商品被跳过
+        """
+        if not product_ids:
+            return []
+
+        cached = await redis_client.mget_json(
+            [redis_client.product_detail_key(pid) for pid in product_ids]
+        )
+        found = {pid: data for pid, data in zip(product_ids, cached) if data}
+
+        missing = [pid for pid in dict.fromkeys(product_ids) if pid not in found]
+        if missing:
+            products = await self.get_product_repo(db).get_by_ids(missing)
+            fresh = {p.id: self.product_to_cache_dict(p) for p in products}
+            found.update(fresh)
+            await redis_client.mset_json(
+                {redis_client.product_detail_key(pid): data for pid, data in fresh.items()},
+                expire=settings.CACHE_TTL
             )
-        except Exception:
-            # 缓存失败不影响业务
-            pass
 
-        return products, total
+        return [found[pid] for pid in product_ids if pid in found]
 
+    @primary_reads
     async def get_hot_products(
         self,
         limit: int = 10,
         db: AsyncSession = None
-    ) -> List[Product]:
-        """获取热销商品(带缓存)"""
+    ) -> List[dict]:
+        """获取热销商品(带缓存)
+
+        缓存只保存热销商品ID列表, 商品详情复用商品详情缓存(一次MGET批量读取)
+        """
         product_repo = self.get_product_repo(db)
 
         # 尝试从缓存获取
         cache_key = redis_client.hot_products_key(limit)
-        try:
-            cached_products = await redis_client.get_json(cache_key)
-            if cached_products:
-                return cached_products
-        except Exception:
-            # Redis失败时继续从数据库获取
-            pass
+        cached_ids = await redis_client.get_json(cache_key)
+        if cached_ids:
+            return await self.get_products_by_ids(cached_ids, db)
 
         # 从数据库获取
         products = await product_repo.get_hot_products(limit)
+        products_dict = [self.product_to_cache_dict(p) for p in products]
 
-        # 尝试缓存结果（失败不影响业务）
-        try:
-            # 将ORM对象转换为字典以便序列化
-            products_dict = [
-                {
-                    "id": p.id,
-                    "title": p.title,
-                    "category_id": p.category_id,
-                    "description": p.description,
-                    "price": float(p.price),
-                    "stock": p.stock,
-                    "sales_count": p.sales_count,
-                    "views": p.views,
-                    "status": p.status,
-                    "is_active": p.is_active
-                }
-                for p in products
-            ]
-            await redis_client.set_json(
-                cache_key,
-                products_dict,
-                expire=1800  # 30分钟
-            )
-        except Exception:
-            # 缓存失败不影响业务
-            pass
+        # ID列表和商品详情一次往返写入, 各自使用自己的TTL（失败不影响业务）
+        mapping = {redis_client.product_detail_key(p["id"]): p for p in products_dict}
+        expire = {key: settings.CACHE_TTL for key in mapping}
+        mapping[cache_key] = [p["id"] for p in products_dict]
+        expire[cache_key] = settings.HOT_PRODUCTS_CACHE_TTL
+        await redis_client.mset_json(mapping, expire=expire)
 
-        return products
+        return products_dict
 
-    async def get_product_detail(self, product_id: int, db: AsyncSession = None) -> Optional[Product]:
+    @primary_reads
+    async def get_hot_products_response(
+        self,
+        limit: int = 10,
+        db: AsyncSession = None,
+        encoding: Optional[str] = None
+    ) -> CachedResponse:
+        """获取热销商品响应(缓存序列化后的完整JSON)"""
+        cache_key = redis_client.hot_products_response_key(limit)
+        cached = await get_cached_response(cache_key, encoding)
+        if cached:
+            return cached
+
+        products = await self.get_hot_products(limit=limit, db=db)
+        cached = CachedResponse.from_payload(self.serialize_products(products))
+        await set_cached_response(cache_key, cached, expire=settings.HOT_PRODUCTS_CACHE_TTL)
+        return cached
+
+    @primary_reads
+    async def get_product_detail(self, product_id: int, db: AsyncSession = None) -> Optional[Union[Product, dict]]:
         """获取商品详情(带缓存)"""
         product_repo = self.get_product_repo(db)
 
-        # 尝试从缓存获取
+        # 读取缓存并增加浏览量(一次往返)
         cache_key = redis_client.product_detail_key(product_id)
-        try:
-            cached_product = await redis_client.get_json(cache_key)
-            if cached_product:
-                # 增加浏览量
-                await redis_client.increment_view_count(product_id)
-                return cached_product
-        except Exception:
-            # Redis失败时继续从数据库获取
-            pass
+        async with redis_client.pipeline() as pipe:
+            pipe.get(cache_key)
+            pipe.incr(redis_client.product_views_key(product_id))
+        cached_product = redis_client.loads_json(pipe.results[0])
+        if cached_product:
+            return cached_product
+        # 每次请求只计一次浏览量: Redis计数失败(未连接)时才写数据库
+        counted = pipe.results[1] is not None
 
         # 从数据库获取
         product = await product_repo.get_by_id(product_id)
         if product:
-            # 增加浏览量
+            if not counted:
+                await product_repo.increment_views(product_id)
+
+            # 缓存结果（失败不影响业务）
+            await redis_client.set_json(
+                cache_key,
+                self.product_to_cache_dict(product),
+                expire=settings.CACHE_TTL
+            )
+
+        return product
+
+    @primary_reads
+    async def get_product_detail_response(
+        self,
+        product_id: int,
+        db: AsyncSession = None,
+        encoding: Optional[str] = None
+    ) -> Optional[CachedResponse]:
+        """获取商品详情响应(缓存序列化后的完整JSON), 商品不存在返回None"""
+        # 读取缓存并增加浏览量(一次往返)
+        cache_key = redis_client.product_detail_response_key(product_id)
+        async with redis_client.pipeline() as pipe:
+            pipe.hmget(cache_key, response_fields(encoding))
+            pipe.incr(redis_client.product_views_key(product_id))
+        values = pipe.results[0] or [None, None]
+        cached = parse_cached_response(values, encoding)
+        if cached is None and encoding and values[0]:
+            # 响应太小未压缩, 读取原始内容
+            cached = await get_cached_response(cache_key)
+        if cached:
+            return cached
+        # 每次请求只计一次浏览量: Redis计数失败(未连接)时才写数据库
+        counted = pipe.results[1] is not None
+
+        product_repo = self.get_product_repo(db)
+        product = await product_repo.get_by_id(product_id)
+        if not product:
+            return None
+        if not counted:
             await product_repo.increment_views(product_id)
 
-            # 尝试缓存结果（失败不影响业务）
-            try:
-                # 将ORM对象转换为字典以便序列化
-                product_dict = {
-                    "id": product.id,
-                    "title": product.title,
-                    "category_id": product.category_id,
-                    "description": product.description,
-                    "price": float(product.price),
-                    "stock": product.stock,
-                    "sales_count": product.sales_count,
-                    "views": product.views,
-                    "status": product.status,
-                    "is_active": product.is_active
-                }
-                await redis_client.set_json(
-                    cache_key,
-                    product_dict,
-                    expire=3600  # 1小时
+        cached = CachedResponse.from_payload(self.serialize_products([product])[0])
+        await set_cached_response(cache_key, cached, expire=settings.CACHE_TTL)
+        return cached
+
+    @staticmethod
+    async def invalidate_cache(product_ids: Optional[List[int]] = None, price_changed: bool = False):
+        """商品变更后清除缓存: 指定商品的详情缓存, 以及所有列表/热销缓存, 并递增目录版本号
+
+        Args:
+            price_changed: 商品价格变化或商品被删除, 同时递增价格版本号使购物车汇总重新计算
+        """
+        # 先设置写入标记, 之后开始的请求不再读副本
+        await mark_catalog_write()
+        await ProductService.drop_cached_products(product_ids)
+        if price_changed and redis_client.is_connected:
+            async with redis_client.pipeline() as pipe:
+                ProductService.init_price_version(pipe)
+                pipe.incr(redis_client.price_version_key())
+
+    @staticmethod
+    async def invalidate_stock(product_ids: List[int]):
+        """库存变化(下单、取消订单)提交后清除相关商品缓存并递增目录版本号
+
+        详情和列表响应都包含库存, 不递增版本号时持有旧ETag的客户端会一直收到304;
+        只影响库存, 不设置目录写入标记
+        """
+        await ProductService.drop_cached_products(product_ids)
+
+    @staticmethod
+    async def drop_cached_products(product_ids: Optional[List[int]] = None):
+        """删除指定商品的详情缓存和所有列表/热销缓存, 并递增目录版本号"""
+        if product_ids:
+            # 批量操作可能涉及上千个商品, 详情缓存在一条DEL命令中删除
+            keys = [
+                key
+                for product_id in set(product_ids)
+                for key in (
+                    redis_client.product_detail_key(product_id),
+                    redis_client.product_detail_response_key(product_id)
                 )
-            except Exception:
-                # 缓存失败不影响业务
-                pass
+            ]
+            async with redis_client.pipeline() as pipe:
+                pipe.delete(*keys)
+        await redis_client.delete_pattern("products:*")
+        await bump_catalog_generation()
 
-        return product
+    @staticmethod
+    def init_price_version(pipe) -> None:
+        """在pipeline中初始化价格版本号(不存在时以毫秒时间戳初始化, 避免与旧汇总的版本号冲突)"""
+        pipe.set(redis_client.price_version_key(), int(time.time() * 1000), nx=True)
 
+    @classmethod
+    def queue_price_version(cls, pipe) -> None:
+        """在pipeline中读取价格版本号(占用两个结果: 初始化和读取)"""
+        cls.init_price_version(pipe)
+        pipe.get(redis_client.price_version_key())
+
+    @replica_reads
     async def search_products(
         self,
         keyword: str,
@@ -490,9 +660,10 @@ class ProductService:
         """创建商品"""
         product_repo = self.get_product_repo(db)
         product = await product_repo.create(product_data)
+        await self.apply_image_variants(product)
 
         # 清除商品列表缓存
-        await redis_client.delete_pattern("products:*")
+        await self.invalidate_cache()
 
         return product
 
@@ -505,105 +676,685 @@ class ProductService:
         """更新商品"""
         product_repo = self.get_product_repo(db)
         product = await product_repo.update(product_id, product_data)
+        if product and "local_image_path" in product_data:
+            await self.apply_image_variants(product)
 
         # 清除相关缓存
-        await redis_client.delete(redis_client.product_detail_key(product_id))
-        await redis_client.delete_pattern("products:*")
+        await self.invalidate_cache([product_id], price_changed="price" in product_data)
 
         return product
 
+    @staticmethod
+    async def apply_image_variants(product: Product) -> None:
+        """为商品图片生成衍生图并记录URL(同一原图只生成一次)"""
+        source = resolve_source(product.local_image_path)
+        product.image_variants = await create_variants(source) if source else None
+
+    async def refresh_image_variants(
+        self,
+        db: AsyncSession,
+        product_ids: Optional[List[int]] = None,
+        force: bool = False
+    ) -> List[int]:
+        """批量生成商品衍生图并保存URL(不提交事务, 不清除缓存)
+
+        Args:
+            product_ids: 指定商品, 默认全部商品
+            force: 已有衍生图的商品也重新生成(文件已存在时不重新编码)
+        Returns:
+            更新的商品ID
+        """
+        query = select(Product.id, Product.local_image_path)
+        if product_ids:
+            query = query.where(Product.id.in_(product_ids))
+        if not force:
+            query = query.where(Product.image_variants.is_(None))
+
+        # 同一原图只处理一次
+        products_by_source = {}
+        for product_id, image_path in (await db.execute(query)).all():
+            source = resolve_source(image_path)
+            if source is not None:
+                products_by_source.setdefault(source, []).append(product_id)
+        if not products_by_source:
+            return []
+
+        sources = list(products_by_source)
+        results = await asyncio.gather(*(create_variants(source) for source in sources))
+        params = [
+            {"product_id": product_id, "variants": variants}
+            for source, variants in zip(sources, results) if variants
+            for product_id in products_by_source[source]
+        ]
+        if params:
+            products = Product.__table__
+            await db.execute(
+                update(products)
+                .where(products.c.id == bindparam("product_id"))
+                .values(image_variants=bindparam("variants")),
+                params
+            )
+        return [item["product_id"] for item in params]
+
+    async def collect_image_garbage(
+        self,
+        db: AsyncSession,
+        grace_seconds: Optional[int] = None,
+        dry_run: bool = False
+    ) -> dict:
+        """回收图片存储中不再被任何商品或订单商品引用的文件(引用计数来自local_image_path和product_image)"""
+        repo = ProductRepository(Product, db)
+        references = await repo.image_reference_counts(f"{settings.IMAGE_STORE_URL}/")
+        return await asyncio.to_thread(image_store.collect_garbage, references, grace_seconds, dry_run)
+
+    async def batch_set_active(
+        self,
+        product_ids: List[int],
+        is_active: bool,
+        db: AsyncSession = None
+    ) -> List[int]:
+        """批量上架/下架(不提交事务, 不清除缓存)
+
+        Returns:
+            实际更新的商品ID
+        """
+        return await self.get_product_repo(db).set_active_bulk(product_ids, is_active)
+
+    async def batch_delete(
+        self,
+        product_ids: List[int],
+        db: AsyncSession = None
+    ) -> Tuple[List[int], List[int]]:
+        """批量删除商品(不提交事务, 不清除缓存)
+
+        Returns:
+            (已删除的商品ID, 存在订单或评价记录而未删除的商品ID)
+        """
+        return await self.get_product_repo(db).delete_bulk(product_ids)
+
     async def delete_product(self, product_id: int, db: AsyncSession = None) -> bool:
         """删除商品"""
         product_repo = self.get_product_repo(db)
         success = await product_repo.delete(product_id)
 
         # 清除相关缓存
-        await redis_client.delete(redis_client.product_detail_key(product_id))
-        await redis_client.delete_pattern("products:*")
+        await self.invalidate_cache([product_id], price_changed=True)
 
         return success
 
 
+# ==================== 商品导入Service ====================
+class ProductImportService:
+    """商品批量导入
+
+    逐行读取CSV/NDJSON并校验, 合法行按批写入临时暂存表(PostgreSQL使用COPY),
+    最后由两条集合语句按标题更新已有商品、插入新商品; 不提交事务。
+    """
+
+    FORMATS = ("csv", "ndjson")
+
+    @classmethod
+    def detect_format(cls, filename: Optional[str], fmt: Optional[str] = None) -> str:
+        """确定文件格式(显式指定优先, 否则按扩展名判断)"""
+        if fmt:
+            fmt = fmt.lower()
+        elif filename and filename.lower().endswith((".ndjson", ".jsonl")):
+            fmt = "ndjson"
+        else:
+            fmt = "csv"
+        if fmt not in cls.FORMATS:
+            raise ValueError(f"不支持的导入格式: {fmt}")
+        return fmt
+
+    @staticmethod
+    def iter_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Union[dict, str]]]:
+        """逐行读取记录, 产出(行号, 记录); 无法解析的行产出(行号, 错误信息)"""
+        if fmt == "csv":
+            for line, record in enumerate(csv.DictReader(stream), 1):
+                # 空单元格视为未提供
+                yield line, {key.strip(): value for key, value in record.items() if key and value not in (None, "")}
+            return
+
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except json.JSONDecodeError as e:
+                yield line, f"JSON解析失败: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line, "每行必须是JSON对象"
+                continue
+            yield line, record
+
+    @staticmethod
+    def format_validation_error(error: ValidationError) -> str:
+        """校验错误转换为一行文本"""
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in item['loc'])}: {item['msg']}" for item in error.errors()
+        )
+
+    async def _load_categories(self, db: AsyncSession) -> Tuple[dict, set]:
+        """加载分类(名称和代码 -> ID, 以及ID集合)"""
+        result = await db.execute(select(Category.id, Category.name, Category.code))
+        by_key, ids = {}, set()
+        for category_id, name, code in result.all():
+            by_key[name] = category_id
+            by_key[code] = category_id
+            ids.add(category_id)
+        return by_key, ids
+
+    async def import_records(
+        self,
+        records: Iterable[Tuple[int, Union[dict, str]]],
+        db: AsyncSession,
+        create_missing_categories: bool = False,
+        failed_lines: Optional[set] = None
+    ) -> Tuple[dict, List[int]]:
+        """导入记录
+
+        Args:
+            records: iter_records产出的(行号, 记录)
+            create_missing_categories: 自动创建不存在的分类(代码与名称相同)
+            failed_lines: 收集所有失败的行号(不受报告中错误条数上限的限制)
+        Returns:
+            (导入结果, 被更新的商品ID)
+        """
+        started = time.perf_counter()
+        product_repo = ProductRepository(Product, db)
+        categories, category_ids = await self._load_categories(db)
+        staging = await product_repo.create_import_staging()
+
+        total = failed = categories_created = 0
+        errors: List[dict] = []
+        seen_titles = {}
+        batch: List[dict] = []
+
+        def fail(line: int, message: str):
+            nonlocal failed
+            failed += 1
+            if failed_lines is not None:
+                failed_lines.add(line)
+            if len(errors) < settings.PRODUCT_IMPORT_MAX_ERRORS:
+                errors.append({"line": line, "error": message})
+
+        for line, record in records:
+            total += 1
+            if isinstance(record, str):
+                fail(line, record)
+                continue
+            try:
+                row = ProductImportRow.model_validate(record)
+            except ValidationError as e:
+                fail(line, self.format_validation_error(e))
+                continue
+
+            title = row.title.strip()
+            if title in seen_titles:
+                fail(line, f"与第{seen_titles[title]}行标题重复")
+                continue
+
+            if row.category_id is not None:
+                category_id = row.category_id if row.category_id in category_ids else None
+            elif row.category:
+                category_id = categories.get(row.category.strip())
+                if category_id is None and create_missing_categories:
+                    category = Category(name=row.category.strip(), code=row.category.strip()[:50])
+                    db.add(category)
+                    await db.flush()
+                    categories[category.name] = category_id = category.id
+                    category_ids.add(category_id)
+                    categories_created += 1
+            else:
+                fail(line, "缺少分类(category或category_id)")
+                continue
+            if category_id is None:
+                fail(line, f"分类不存在: {row.category_id or row.category}")
+                continue
+
+            seen_titles[title] = line
+            batch.append({**row.model_dump(exclude={"category"}), "title": title, "category_id": category_id})
+            if len(batch) >= settings.PRODUCT_IMPORT_BATCH_SIZE:
+                await product_repo.load_import_staging(staging, batch)
+                batch = []
+
+        await product_repo.load_import_staging(staging, batch)
+        updated_ids, inserted = await product_repo.upsert_from_staging(staging)
+        await product_repo.drop_import_staging(staging)
+
+        elapsed = time.perf_counter() - started
+        report = {
+            "total_rows": total,
+            "inserted": inserted,
+            "updated": len(updated_ids),
+            "failed": failed,
+            "categories_created": categories_created,
+            "errors": errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        return report, updated_ids
+
+    @staticmethod
+    async def invalidate_cache(updated_ids: List[int], categories_created: int = 0):
+        """导入提交后清除商品缓存(价格可能变化), 创建了分类时同时清除分类缓存"""
+        await ProductService.invalidate_cache(updated_ids, price_changed=True)
+        if categories_created:
+            await CategoryService.invalidate_cache()
+
+
 # ==================== 购物车Service ====================
 class CartService:
-    """购物车服务"""
+    """购物车服务
+
+    Redis可用时购物车保存在Redis hash中(字段为商品ID, 值为数量), 每次修改由一个Lua脚本
+    在一次往返内完成, 并把用户加入待写回集合, 由CartPersister批量写回cart_items表;
+    商品信息从商品缓存批量获取。Redis不可用时直接读写数据库。
+
+    购物车行统一以字典返回(字段与CartItemResponse一致), Redis购物车的行ID为商品ID。
+
+    Redis购物车在hash中增量维护汇总(行数、数量、以分为单位的精确小计)和每行的单价,
+    汇总带有计算时的价格版本号: 商品改价或删除时递增全局价格版本号,
+    版本不一致的汇总在下次读取时按最新价格重新计算。
+    """
+
+    # hash保留字段: 已加载标记、修改次数、汇总字段和汇总的价格版本
+    LOADED_FIELD = "_loaded"
+    REVISION_FIELD = "_rev"
+    LINES_FIELD = "_lines"
+    QUANTITY_FIELD = "_qty"
+    SUBTOTAL_FIELD = "_subtotal"
+    PRICE_VERSION_FIELD = "_pv"
+    # 每行的加入时间 t:{商品ID} 和单价(分) p:{商品ID}
+    ADDED_AT_PREFIX = "t:"
+    LINE_PRICE_PREFIX = "p:"
+
+    # 修改购物车 KEYS: [购物车hash, 待写回集合]
+    # ARGV: [当前时间戳, TTL, 用户ID, 操作1, 商品ID1, 数量1, 单价1(分), 操作2, ...]
+    # 操作: incr(累加, 结果<=0时删除) / set(修改已有商品) / put(设置数量, 不存在则添加) / del / clear
+    # 返回: 每个操作一项{修改后数量, 加入时间戳}, 数量为-1表示购物车中没有该商品(set/del);
+    #       购物车未从数据库加载时返回{{-2}}
+    MUTATE_SCRIPT = """
+    if redis.call('HEXISTS', KEYS[1], '_loaded') == 0 then return {{-2}} end
+    local results = {}
+    for i = 4, #ARGV, 4 do
+        local op, field, quantity, price = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2]), tonumber(ARGV[i + 3])
+        local result, added_at = 0, false
+        if op == 'clear' then
+            local revision = redis.call('HGET', KEYS[1], '_rev') or '0'
+            redis.call('DEL', KEYS[1])
+            redis.call('HSET', KEYS[1], '_loaded', '1', '_rev', revision)
+        else
+            local current = tonumber(redis.call('HGET', KEYS[1], field) or '0')
+            if (op == 'set' or op == 'del') and current == 0 then
+                result = -1
+            else
+                if op == 'incr' then
+                    result = current + quantity
+                elseif op ~= 'del' then
+                    result = quantity
+                end
+                local line_price = tonumber(redis.call('HGET', KEYS[1], 'p:' .. field) or '0')
+                if result <= 0 then
+                    result = 0
+                    price = 0
+                    redis.call('HDEL', KEYS[1], field, 't:' .. field, 'p:' .. field)
+                else
+                    redis.call('HSET', KEYS[1], field, result, 'p:' .. field, price)
+                    redis.call('HSETNX', KEYS[1], 't:' .. field, ARGV[1])
+                    added_at = redis.call('HGET', KEYS[1], 't:' .. field)
+                end
+                -- 增量维护汇总(旧行按原单价扣除, 新行按当前单价计入)
+                if current == 0 and result > 0 then
+                    redis.call('HINCRBY', KEYS[1], '_lines', 1)
+                elseif current > 0 and result == 0 then
+                    redis.call('HINCRBY', KEYS[1], '_lines', -1)
+                end
+                redis.call('HINCRBY', KEYS[1], '_qty', result - current)
+                redis.call('HINCRBY', KEYS[1], '_subtotal', result * price - current * line_price)
+            end
+        end
+        results[#results + 1] = {result, added_at}
+    end
+    redis.call('HINCRBY', KEYS[1], '_rev', 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    redis.call('SADD', KEYS[2], ARGV[3])
+    return results
+    """
+
+    # 批量操作类型 -> 脚本操作
+    BATCH_SCRIPT_OPS = {"set": "put", "increment": "incr", "remove": "del"}
+
+    # 从数据库加载购物车(已加载时不覆盖, 不含汇总, 首次读取时计算)
+    # KEYS: [购物车hash]  ARGV: [TTL, 字段1, 值1, ...]
+    LOAD_SCRIPT = """
+    if redis.call('HEXISTS', KEYS[1], '_loaded') == 1 then return 0 end
+    redis.call('DEL', KEYS[1])
+    for i = 2, #ARGV, 2 do
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('HSET', KEYS[1], '_loaded', '1')
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return 1
+    """
+
+    # 保存重新计算的汇总(读取后购物车被修改过则放弃)
+    # KEYS: [购物车hash]
+    # ARGV: [读取时的_rev, 价格版本, 行数, 数量, 小计(分), 单价个数n, 商品ID1, 单价1, ..., 已删除商品ID...]
+    STORE_TOTALS_SCRIPT = """
+    if redis.call('HEXISTS', KEYS[1], '_loaded') == 0 then return 0 end
+    if (redis.call('HGET', KEYS[1], '_rev') or '0') ~= ARGV[1] then return 0 end
+    redis.call('HSET', KEYS[1], '_pv', ARGV[2], '_lines', ARGV[3], '_qty', ARGV[4], '_subtotal', ARGV[5])
+    local last = 6 + tonumber(ARGV[6]) * 2
+    for i = 7, last, 2 do
+        redis.call('HSET', KEYS[1], 'p:' .. ARGV[i], ARGV[i + 1])
+    end
+    for i = last + 1, #ARGV do
+        redis.call('HDEL', KEYS[1], ARGV[i], 't:' .. ARGV[i], 'p:' .. ARGV[i])
+    end
+    return 1
+    """
 
     @staticmethod
     def get_cart_repo(db: AsyncSession) -> CartRepository:
         """获取购物车Repository"""
         return CartRepository(CartItem, db)
 
-    async def get_user_cart(self, user_id: int, db: AsyncSession = None) -> List[CartItem]:
-        """获取用户购物车(带缓存)"""
-        cart_repo = self.get_cart_repo(db)
+    # ---------- Redis购物车 ----------
+    @classmethod
+    def parse_cart_hash(cls, data: dict) -> List[Tuple[int, int, datetime]]:
+        """解析购物车hash为[(商品ID, 数量, 加入时间)], 按加入时间排序"""
+        added_at = {}
+        quantities = {}
+        for field, value in data.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field.startswith("_") or field.startswith(cls.LINE_PRICE_PREFIX):
+                continue
+            if field.startswith(cls.ADDED_AT_PREFIX):
+                added_at[int(field[len(cls.ADDED_AT_PREFIX):])] = int(value)
+            else:
+                quantities[int(field)] = int(value)
+
+        now = int(time.time())
+        rows = [
+            (product_id, quantity, datetime.utcfromtimestamp(added_at.get(product_id, now)))
+            for product_id, quantity in quantities.items()
+        ]
+        rows.sort(key=lambda row: (row[2], row[0]))
+        return rows
+
+    async def _load_redis_cart(self, user_id: int, db: AsyncSession) -> None:
+        """把数据库中的购物车加载到Redis(Redis中已有购物车时不覆盖)"""
+        rows = await self.get_cart_repo(db).get_cart_rows(user_id)
+        args: list = [settings.CART_CACHE_TTL]
+        for product_id, quantity, created_at in rows:
+            # 数据库中为UTC时间(无时区)
+            added_at = calendar.timegm((created_at or datetime.utcnow()).utctimetuple())
+            args.extend([product_id, quantity, f"{self.ADDED_AT_PREFIX}{product_id}", added_at])
+        await redis_client.eval_script(self.LOAD_SCRIPT, [redis_client.cart_key(user_id)], args)
+
+    async def _mutate_redis_cart(
+        self,
+        user_id: int,
+        operations: List[Tuple[str, int, int]],
+        db: AsyncSession = None
+    ) -> Optional[list]:
+        """执行购物车修改脚本(多个操作一次往返), 购物车未加载时先从数据库加载
 
-        # 尝试从缓存获取
+        Args:
+            operations: [(脚本操作, 商品ID, 数量, 单价(分))]
+        Returns:
+            每个操作的[修改后数量, 加入时间戳]; Redis失败返回None
+        """
+        keys = [redis_client.cart_key(user_id), redis_client.cart_dirty_key()]
+        args = [int(time.time()), settings.CART_CACHE_TTL, user_id]
+        for operation in operations:
+            args.extend(operation)
+
+        results = await redis_client.eval_script(self.MUTATE_SCRIPT, keys, args)
+        if results is not None and results[0][0] == -2:
+            await self._load_redis_cart(user_id, db)
+            results = await redis_client.eval_script(self.MUTATE_SCRIPT, keys, args)
+        return results
+
+    async def _read_redis_cart(self, user_id: int, db: AsyncSession) -> Optional[Tuple[dict, bytes]]:
+        """读取Redis购物车hash和当前价格版本(一次往返), 未加载时先从数据库加载
+
+        Returns:
+            (hash, 价格版本); Redis不可用返回None
+        """
         cache_key = redis_client.cart_key(user_id)
-        cached_cart = await redis_client.get_json(cache_key)
-        if cached_cart:
-            return cached_cart
+        for _ in range(2):
+            async with redis_client.pipeline() as pipe:
+                pipe.hgetall(cache_key)
+                ProductService.queue_price_version(pipe)
+            data, _, price_version = pipe.results
+            if data is None or price_version is None:
+                return None
+            if self.LOADED_FIELD.encode() in data:
+                return data, price_version
+            await self._load_redis_cart(user_id, db)
+        return None
 
-        # 从数据库获取
-        cart_items = await cart_repo.get_user_cart(user_id)
+    @staticmethod
+    def price_to_cents(price) -> int:
+        """价格转换为分(精确)"""
+        return int((Decimal(str(price)) * 100).to_integral_value())
 
-        # 缓存结果
-        await redis_client.set_json(
-            cache_key,
-            cart_items,
-            expire=300  # 5分钟
+    @staticmethod
+    def build_totals(lines: int, quantity: int, subtotal: Decimal) -> dict:
+        """构造购物车汇总"""
+        return {
+            "total_items": lines,
+            "total_quantity": quantity,
+            "total_amount": subtotal.quantize(Decimal("0.01"))
+        }
+
+    @classmethod
+    def totals_from_lines(cls, items: List[dict]) -> dict:
+        """由购物车行计算汇总"""
+        return cls.build_totals(
+            len(items),
+            sum(item["quantity"] for item in items),
+            sum((Decimal(item["product"]["price"]) * item["quantity"] for item in items), Decimal("0.00"))
         )
 
-        return cart_items
+    @classmethod
+    def totals_from_hash(cls, values: List[Optional[bytes]], price_version: bytes) -> Optional[dict]:
+        """由hash中的汇总字段构造汇总, 汇总不存在或价格版本不一致时返回None
 
-    async def get_cart_summary(self, user_id: int, db: AsyncSession = None) -> dict:
-        """获取购物车汇总信息"""
-        from decimal import Decimal
+        Args:
+            values: [_lines, _qty, _subtotal, _pv] 字段值
+        """
+        lines, quantity, subtotal, version = values
+        if version is None or version != price_version:
+            return None
+        return cls.build_totals(int(lines or 0), int(quantity or 0), Decimal(int(subtotal or 0)) / 100)
 
-        cart_items = await self.get_user_cart(user_id, db)
+    @classmethod
+    def totals_fields(cls) -> List[str]:
+        """汇总字段(与totals_from_hash的参数顺序一致)"""
+        return [cls.LINES_FIELD, cls.QUANTITY_FIELD, cls.SUBTOTAL_FIELD, cls.PRICE_VERSION_FIELD]
 
-        total_quantity = sum(item.quantity for item in cart_items)
-        total_amount = sum(
-            item.quantity * float(item.product.price) if item.product else 0
-            for item in cart_items
-        )
+    async def _store_redis_totals(
+        self,
+        user_id: int,
+        data: dict,
+        price_version: bytes,
+        items: List[dict]
+    ) -> None:
+        """保存重新计算的汇总和每行单价, 并清理已删除商品的行"""
+        totals = self.totals_from_lines(items)
+        args: list = [
+            data.get(self.REVISION_FIELD.encode(), b"0"),
+            price_version,
+            totals["total_items"],
+            totals["total_quantity"],
+            self.price_to_cents(totals["total_amount"]),
+            len(items)
+        ]
+        for item in items:
+            args.extend([item["product_id"], self.price_to_cents(item["product"]["price"])])
+        present = {item["product_id"] for item in items}
+        args.extend(product_id for product_id, _, _ in self.parse_cart_hash(data) if product_id not in present)
+        await redis_client.eval_script(self.STORE_TOTALS_SCRIPT, [redis_client.cart_key(user_id)], args)
 
+    # ---------- 购物车行 ----------
+    @staticmethod
+    def build_cart_line(
+        user_id: int,
+        product: dict,
+        quantity: int,
+        created_at: datetime,
+        item_id: Optional[int] = None
+    ) -> dict:
+        """构造购物车行(字段与CartItemResponse一致)"""
         return {
-            "total_items": len(cart_items),
-            "total_quantity": total_quantity,
-            "total_amount": Decimal(str(total_amount)),
-            "items": cart_items
+            "id": item_id or product["id"],
+            "user_id": user_id,
+            "product_id": product["id"],
+            "quantity": quantity,
+            "created_at": created_at,
+            "product": product
         }
 
-    async def add_item(
+    async def _build_cart_lines(
         self,
         user_id: int,
-        product_id: int,
-        quantity: int,
-        db: AsyncSession = None
-    ) -> CartItem:
-        """添加商品到购物车"""
-        cart_repo = self.get_cart_repo(db)
+        rows: List[Tuple[int, int, datetime]],
+        db: AsyncSession
+    ) -> List[dict]:
+        """批量获取商品快照并构造购物车行(已删除的商品被跳过)"""
+        products = await ProductService().get_products_by_ids([row[0] for row in rows], db)
+        products_by_id = {p["id"]: p for p in products}
+        return [
+            self.build_cart_line(user_id, products_by_id[product_id], quantity, created_at)
+            for product_id, quantity, created_at in rows
+            if product_id in products_by_id
+        ]
 
-        # 检查商品是否存在
-        product_repo = ProductRepository(Product, db)
-        product = await product_repo.get_by_id(product_id)
+    async def _get_cart_products(self, product_ids: List[int], db: AsyncSession) -> Dict[int, dict]:
+        """获取商品快照, 库存和上下架状态替换为数据库中的当前值
+
+        快照来自商品缓存(价格、标题等), 其中的库存可能是下单前的旧值,
+        校验只使用数据库中的库存和状态(一次按主键的查询); 数据库中已不存在的商品被跳过
+        """
+        products = await ProductService().get_products_by_ids(product_ids, db)
+        states = await ProductService.get_product_repo(db).get_stock_states([p["id"] for p in products])
+        return {p["id"]: {**p, **states[p["id"]]} for p in products if p["id"] in states}
+
+    @staticmethod
+    def _check_product(product: Optional[dict], quantity: int) -> dict:
+        """验证商品存在、已上架且库存充足
+
+        product应来自_get_cart_products(数据库中的库存); 下单时会锁定库存再次校验
+        """
         if not product:
             raise ValueError("商品不存在")
 
-        if not product.is_active or product.status != "active":
+        if not product["is_active"] or product["status"] != "active":
             raise ValueError("商品已下架")
 
-        # 验证库存
-        if not await product_repo.validate_stock(product_id, quantity):
-            raise ValueError(f"库存不足,当前库存: {product.stock}")
+        if product["stock"] < quantity:
+            raise ValueError(f"库存不足,当前库存: {product['stock']}")
 
-        # 添加或更新购物车
-        cart_item = await cart_repo.add_or_update_item(user_id, product_id, quantity)
+        return product
 
-        # 清除购物车缓存
-        await redis_client.delete(redis_client.cart_key(user_id))
+    async def _get_product_for_cart(self, product_id: int, quantity: int, db: AsyncSession) -> dict:
+        """获取商品快照并验证"""
+        products = await self._get_cart_products([product_id], db)
+        return self._check_product(products.get(product_id), quantity)
 
-        return cart_item
+    async def _get_db_cart_lines(self, user_id: int, db: AsyncSession) -> List[dict]:
+        """从数据库获取购物车行"""
+        cart_items = await self.get_cart_repo(db).get_user_cart(user_id)
+        return [
+            self.build_cart_line(
+                user_id,
+                ProductService.product_to_cache_dict(item.product),
+                item.quantity,
+                item.created_at,
+                item_id=item.id
+            )
+            for item in cart_items
+        ]
+
+    async def get_user_cart(self, user_id: int, db: AsyncSession = None) -> List[dict]:
+        """获取用户购物车"""
+        if redis_client.is_connected:
+            cart = await self._read_redis_cart(user_id, db)
+            if cart is not None:
+                return await self._build_cart_lines(user_id, self.parse_cart_hash(cart[0]), db)
+
+        return await self._get_db_cart_lines(user_id, db)
+
+    async def get_cart_summary(self, user_id: int, db: AsyncSession = None) -> dict:
+        """获取购物车汇总信息和购物车行
+
+        Redis购物车的汇总直接读取增量维护的值, 价格版本变化后重新计算并保存
+        """
+        if redis_client.is_connected:
+            cart = await self._read_redis_cart(user_id, db)
+            if cart is not None:
+                data, price_version = cart
+                items = await self._build_cart_lines(user_id, self.parse_cart_hash(data), db)
+                totals = self.totals_from_hash(
+                    [data.get(field.encode()) for field in self.totals_fields()], price_version
+                )
+                if totals is None:
+                    totals = self.totals_from_lines(items)
+                    await self._store_redis_totals(user_id, data, price_version, items)
+                return {**totals, "items": items}
+
+        items = await self._get_db_cart_lines(user_id, db)
+        return {**self.totals_from_lines(items), "items": items}
+
+    async def get_cart_totals(self, user_id: int, db: AsyncSession = None) -> dict:
+        """获取购物车汇总(行数、数量、小计), 不加载购物车行
+
+        Redis购物车一次往返读取汇总字段; 数据库购物车一条聚合查询
+        """
+        if redis_client.is_connected:
+            async with redis_client.pipeline() as pipe:
+                pipe.hmget(redis_client.cart_key(user_id), [self.LOADED_FIELD] + self.totals_fields())
+                ProductService.queue_price_version(pipe)
+            values, _, price_version = pipe.results
+            if values and values[0] and price_version is not None:
+                totals = self.totals_from_hash(values[1:], price_version)
+                if totals is not None:
+                    return totals
+            if values is not None and price_version is not None:
+                # 汇总过期或购物车未加载: 读取完整购物车并重新计算
+                summary = await self.get_cart_summary(user_id, db)
+                return {key: summary[key] for key in ("total_items", "total_quantity", "total_amount")}
+
+        lines, quantity, subtotal = await self.get_cart_repo(db).get_cart_totals(user_id)
+        return self.build_totals(lines, quantity, subtotal)
+
+    async def add_item(
+        self,
+        user_id: int,
+        product_id: int,
+        quantity: int,
+        db: AsyncSession = None
+    ) -> dict:
+        """添加商品到购物车(已存在则累加数量)"""
+        product = await self._get_product_for_cart(product_id, quantity, db)
+
+        if redis_client.is_connected:
+            results = await self._mutate_redis_cart(
+                user_id, [("incr", product_id, quantity, self.price_to_cents(product["price"]))], db
+            )
+            if results is not None:
+                result = results[0]
+                return self.build_cart_line(
+                    user_id, product, int(result[0]), datetime.utcfromtimestamp(int(result[1]))
+                )
+
+        # 添加或更新购物车
+        cart_item = await self.get_cart_repo(db).add_or_update_item(user_id, product_id, quantity)
+        return self.build_cart_line(user_id, product, cart_item.quantity, cart_item.created_at, cart_item.id)
 
     async def update_item_quantity(
         self,
@@ -611,46 +1362,228 @@ class CartService:
         product_id: int,
         quantity: int,
         db: AsyncSession = None
-    ) -> Optional[CartItem]:
+    ) -> dict:
         """更新购物车商品数量（由API层管理事务）"""
-        cart_repo = self.get_cart_repo(db)
-        product_repo = ProductRepository(Product, db)
+        if redis_client.is_connected:
+            product = await self._get_product_for_cart(product_id, quantity, db)
+            results = await self._mutate_redis_cart(
+                user_id, [("set", product_id, quantity, self.price_to_cents(product["price"]))], db
+            )
+            if results is not None:
+                result = results[0]
+                if result[0] == -1:
+                    raise ValueError("购物车商品不存在")
+                return self.build_cart_line(
+                    user_id, product, int(result[0]), datetime.utcfromtimestamp(int(result[1]))
+                )
 
-        # 验证商品和库存
+        cart_repo = self.get_cart_repo(db)
         cart_item = await cart_repo.get_cart_item(user_id, product_id)
         if not cart_item:
             raise ValueError("购物车商品不存在")
 
-        if not await product_repo.validate_stock(product_id, quantity):
-            product = await product_repo.get_by_id(product_id)
-            raise ValueError(f"库存不足,当前库存: {product.stock if product else 0}")
-
+        product = await self._get_product_for_cart(product_id, quantity, db)
         cart_item.quantity = quantity
+        return self.build_cart_line(user_id, product, quantity, cart_item.created_at, cart_item.id)
 
-        # 清除购物车缓存
-        await redis_client.delete(redis_client.cart_key(user_id))
+    async def _get_cart_quantities(self, user_id: int, db: AsyncSession) -> Dict[int, int]:
+        """获取购物车中每个商品的当前数量"""
+        if redis_client.is_connected:
+            cart = await self._read_redis_cart(user_id, db)
+            if cart is not None:
+                return {product_id: quantity for product_id, quantity, _ in self.parse_cart_hash(cart[0])}
+        rows = await self.get_cart_repo(db).get_cart_rows(user_id)
+        return {product_id: quantity for product_id, quantity, _ in rows}
 
-        return cart_item
+    async def apply_operations(self, user_id: int, operations: List[dict], db: AsyncSession = None) -> None:
+        """批量修改购物车(事务由API层管理)
+
+        所有操作先用一次批量商品查询完成校验, 任一操作不合法则全部不执行;
+        Redis购物车一次脚本调用完成, 数据库购物车一次查询后在会话中修改。
+
+        Args:
+            operations: [{"op": "set"/"increment"/"remove", "product_id": 1, "quantity": 2}]
+        """
+        products_by_id = await self._get_cart_products(
+            list({op["product_id"] for op in operations if op["op"] != "remove"}), db
+        )
+        # 按顺序模拟每个操作后的行数量: 增加数量时按结果数量校验库存,
+        # 只减少数量(包括已下架商品)时不校验上架状态和库存
+        quantities = await self._get_cart_quantities(user_id, db)
+        for op in operations:
+            product_id, quantity = op["product_id"], op["quantity"]
+            if op["op"] == "set" and quantity < 1:
+                raise ValueError(f"商品ID {product_id} 的数量必须大于0")
+            if op["op"] == "increment" and quantity == 0:
+                raise ValueError(f"商品ID {product_id} 的增量不能为0")
+            current = quantities.get(product_id, 0)
+            if op["op"] == "remove":
+                new_quantity = 0
+            elif op["op"] == "set":
+                new_quantity = quantity
+            else:
+                new_quantity = max(current + quantity, 0)
+            try:
+                if new_quantity > current:
+                    self._check_product(products_by_id.get(product_id), new_quantity)
+                elif new_quantity > 0 and product_id not in products_by_id:
+                    raise ValueError("商品不存在")
+            except ValueError as e:
+                raise ValueError(f"商品ID {product_id}: {e}")
+            quantities[product_id] = new_quantity
+
+        if redis_client.is_connected:
+            results = await self._mutate_redis_cart(
+                user_id,
+                [
+                    (
+                        self.BATCH_SCRIPT_OPS[op["op"]],
+                        op["product_id"],
+                        op["quantity"],
+                        # 减到0的行不需要单价(可能是已删除的商品)
+                        self.price_to_cents(products_by_id[op["product_id"]]["price"])
+                        if op["product_id"] in products_by_id else 0
+                    )
+                    for op in operations
+                ],
+                db
+            )
+            if results is not None:
+                return
+
+        # 数据库购物车: 一次查询当前内容, 修改由API层统一提交
+        items = {item.product_id: item for item in await self.get_cart_repo(db).get_user_cart_items(user_id)}
+        for op in operations:
+            product_id = op["product_id"]
+            item = items.get(product_id)
+            if op["op"] == "remove":
+                new_quantity = 0
+            elif op["op"] == "set":
+                new_quantity = op["quantity"]
+            else:
+                new_quantity = (item.quantity if item else 0) + op["quantity"]
+
+            if new_quantity <= 0:
+                if item:
+                    await db.delete(item)
+                    del items[product_id]
+            elif item:
+                item.quantity = new_quantity
+            else:
+                items[product_id] = CartItem(user_id=user_id, product_id=product_id, quantity=new_quantity)
+                db.add(items[product_id])
+        await db.flush()
 
     async def remove_item(self, user_id: int, product_id: int, db: AsyncSession = None) -> bool:
         """删除购物车商品"""
-        cart_repo = self.get_cart_repo(db)
-        success = await cart_repo.remove_item(user_id, product_id)
-
-        # 清除购物车缓存
-        await redis_client.delete(redis_client.cart_key(user_id))
+        if redis_client.is_connected:
+            results = await self._mutate_redis_cart(user_id, [("del", product_id, 0, 0)], db)
+            if results is not None:
+                return results[0][0] != -1
 
-        return success
+        return await self.get_cart_repo(db).remove_item(user_id, product_id)
 
     async def clear_cart(self, user_id: int, db: AsyncSession = None) -> bool:
         """清空购物车"""
-        cart_repo = self.get_cart_repo(db)
-        success = await cart_repo.clear_cart(user_id)
+        if redis_client.is_connected:
+            results = await self._mutate_redis_cart(user_id, [("clear", 0, 0, 0)], db)
+            if results is not None:
+                return True
 
-        # 清除购物车缓存
-        await redis_client.delete(redis_client.cart_key(user_id))
+        return await self.get_cart_repo(db).clear_cart(user_id)
 
-        return success
+
+class CartPersister:
+    """购物车写回任务
+
+    定期从待写回集合中批量取出用户, 读取其Redis购物车, 在一个事务中整体替换cart_items。
+    多个进程可同时运行(SPOP保证每个用户只被一个进程取出), 写回失败的用户放回集合重试。
+    """
+
+    def __init__(self):
+        self._session_factory = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, session_factory) -> None:
+        """启动后台写回任务"""
+        self._session_factory = session_factory
+        self._task = asyncio.create_task(self._run())
+        logger.info("购物车写回任务已启动")
+
+    async def stop(self) -> None:
+        """停止后台任务并写回剩余的购物车"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CART_PERSIST_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"购物车写回失败: {e}")
+
+    async def flush(self) -> int:
+        """写回所有待写回的购物车, 返回写回的用户数"""
+        dirty_key = redis_client.cart_dirty_key()
+        total = 0
+        while True:
+            user_ids = [int(uid) for uid in await redis_client.spop(dirty_key, settings.CART_PERSIST_BATCH_SIZE)]
+            if not user_ids:
+                break
+            try:
+                await self.persist(user_ids)
+            except Exception:
+                await redis_client.sadd(dirty_key, *user_ids)
+                raise
+            total += len(user_ids)
+            if len(user_ids) < settings.CART_PERSIST_BATCH_SIZE:
+                break
+        return total
+
+    async def persist(self, user_ids: List[int]) -> None:
+        """把一批用户的Redis购物车写入数据库"""
+        async with redis_client.pipeline() as pipe:
+            for user_id in user_ids:
+                pipe.hgetall(redis_client.cart_key(user_id))
+        if any(data is None for data in pipe.results):
+            raise RuntimeError("读取Redis购物车失败")
+
+        loaded = CartService.LOADED_FIELD.encode()
+        persisted_users = []
+        rows = []
+        now = datetime.utcnow()
+        for user_id, data in zip(user_ids, pipe.results):
+            if loaded not in data:
+                # 购物车已过期, 不能用空内容覆盖数据库
+                continue
+            persisted_users.append(user_id)
+            rows.extend(
+                {
+                    "user_id": user_id,
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "created_at": created_at,
+                    "updated_at": now
+                }
+                for product_id, quantity, created_at in CartService.parse_cart_hash(data)
+            )
+
+        if not persisted_users:
+            return
+        async with self._session_factory() as db:
+            await CartRepository(CartItem, db).replace_user_carts(persisted_users, rows)
+            await db.commit()
+
+
+cart_persister = CartPersister()
 
 
 # ==================== 订单Service ====================
@@ -675,14 +1608,16 @@ class OrderService:
         delivery_type: str
     ) -> dict:
         """计算订单金额"""
-        from decimal import Decimal
-
         # 商品小计
         subtotal = Decimal("0.00")
         for item in cart_items:
             if item.product:
                 subtotal += Decimal(str(item.product.price)) * item.quantity
 
+        return self.calculate_amount_breakdown(subtotal, delivery_type)
+
+    def calculate_amount_breakdown(self, subtotal: Decimal, delivery_type: str) -> dict:
+        """根据商品小计计算配送费、优惠和总金额"""
         # 配送费
         delivery_fee = Decimal(str(self.DELIVERY_FEE)) if delivery_type == "delivery" else Decimal("0.00")
 
@@ -736,10 +1671,15 @@ class OrderService:
                     self.quantity = quantity
                     self.price = Decimal(str(price))
 
+            # 一次查询加载全部商品(后续锁定库存直接使用会话中已加载的对象)
+            products = {
+                product.id: product
+                for product in await product_repo.get_by_ids([item["product_id"] for item in items])
+            }
             cart_items = []
             for item in items:
                 # 获取商品信息
-                product = await product_repo.get_by_id(item["product_id"])
+                product = products.get(item["product_id"])
                 if not product:
                     raise ValueError(f"商品ID {item['product_id']} 不存在")
 
@@ -987,6 +1927,7 @@ class ReviewService:
 
         return review
 
+    @replica_reads
     async def get_product_reviews(
         self,
         product_id: int,
@@ -1003,6 +1944,7 @@ class ReviewService:
 
         return reviews, total
 
+    @replica_reads
     async def get_product_rating_summary(
         self,
         product_id: int,
@@ -1022,11 +1964,13 @@ class ReviewService:
             "rating_distribution": rating_distribution
         }
 
+    @replica_reads
     async def get_review_detail(self, review_id: int, db: AsyncSession = None) -> Optional[Review]:
         """获取评价详情"""
         review_repo = self.get_review_repo(db)
         return await review_repo.get_by_id(review_id)
 
+    @replica_reads
     async def get_user_reviews(
         self,
         user_id: int,
@@ -1188,6 +2132,7 @@ class AdminService:
         order_repo = OrderRepository(Order, db)
         return await order_repo.update_status_with_check(order_id, status)
 
+    @replica_reads
     async def export_orders_to_csv(
         self,
         user_id: Optional[int] = None,
@@ -1208,6 +2153,17 @@ class AdminService:
             db=db
         )
 
+        # 商品数量一次分组查询, 不逐个订单加载明细
+        item_counts = {}
+        order_ids = [order["id"] for order in orders]
+        for start in range(0, len(order_ids), ProductRepository.BULK_CHUNK_SIZE):
+            result = await db.execute(
+                select(OrderItem.order_id, func.count(OrderItem.id))
+                .where(OrderItem.order_id.in_(order_ids[start:start + ProductRepository.BULK_CHUNK_SIZE]))
+                .group_by(OrderItem.order_id)
+            )
+            item_counts.update(result.all())
+
         # 生成CSV
         output = io.StringIO()
         writer = csv.writer(output)
@@ -1221,19 +2177,20 @@ class AdminService:
         # 写入数据
         for order in orders:
             writer.writerow([
-                order.id,
-                order.order_number,
-                order.user.phone if order.user else "",
-                order.user.nickname if order.user else "",
-                len(order.order_items),
-                float(order.total_amount),
-                order.status,
-                order.delivery_type,
-                order.created_at.strftime("%Y-%m-%d %H:%M:%S")
+                order["id"],
+                order["order_number"],
+                order["user_phone"] or "",
+                order["user_nickname"] or "",
+                item_counts.get(order["id"], 0),
+                order["total_amount"],
+                getattr(order["status"], "value", order["status"]),
+                getattr(order["delivery_type"], "value", order["delivery_type"]),
+                datetime.fromisoformat(order["created_at"]).strftime("%Y-%m-%d %H:%M:%S") if order["created_at"] else ""
             ])
 
         return output.getvalue()
 
+    @replica_reads
     async def get_order_stats(
         self,
         start_date: Optional[str] = None,
@@ -1290,6 +2247,7 @@ class AdminService:
         }
 
     # ==================== 统计分析 ====================
+    @replica_reads
     async def get_today_stats(self, db: AsyncSession = None) -> dict:
         """获取今日统计数据"""
         now = datetime.now()
@@ -1324,6 +2282,7 @@ class AdminService:
             "completed_orders": completed_orders
         }
 
+    @replica_reads
     async def get_trend_analysis(
         self,
         days: int = 7,
@@ -1363,6 +2322,7 @@ class AdminService:
 
         return trend_data[::-1]  # 按日期正序
 
+    @replica_reads
     async def get_hot_products(
         self,
         limit: int = 10,
@@ -1399,6 +2359,7 @@ class AdminService:
             for row in result.all()
         ]
 
+    @replica_reads
     async def get_category_sales(
         self,
         start_date: Optional[str] = None,
@@ -1461,6 +2422,7 @@ class AdminService:
             for row in result.all()
         ]
 
+    @replica_reads
     async def get_user_growth_stats(
         self,
         days: int = 30,
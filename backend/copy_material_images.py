@@ -1,14 +1,13 @@
 """
-从Material目录复制商品图片并更新商品数据
+从Material目录导入商品图片(放入内容寻址存储)并输出商品图片映射
 """
 import os
-import shutil
-import glob
 from pathlib import Path
 
-# 源目录和目标目录
+from app.core import image_store
+
+# 源目录
 MATERIAL_DIR = "/Volumes/545S/general final/Material/material"
-TARGET_DIR = "/Volumes/545S/general final/backend/public/images/products"
 
 # 商品与图片的匹配关系
 PRODUCT_IMAGE_MAPPING = {
@@ -64,51 +63,33 @@ def find_image_for_product(product_name):
 
 
 def copy_images():
-    """复制图片到目标目录"""
+    """将匹配的图片放入内容寻址存储(相同图片只保存一份, 不再清空和重复复制)"""
     print("=" * 80)
-    print("从Material目录复制商品图片")
+    print("从Material目录导入商品图片到图片存储")
     print("=" * 80)
 
-    # 确保目标目录存在
-    os.makedirs(TARGET_DIR, exist_ok=True)
-
-    # 清空目标目录（删除旧图片）
-    print("\n清空目标目录...")
-    old_files = glob.glob(os.path.join(TARGET_DIR, "*.png")) + glob.glob(os.path.join(TARGET_DIR, "*.jpg"))
-    for old_file in old_files:
-        os.remove(old_file)
-    print(f"  删除了 {len(old_files)} 个旧文件")
-
-    # 为每个商品复制图片
-    print("\n复制商品图片:")
+    print("\n导入商品图片:")
     print("-" * 80)
 
-    copied_files = []
+    image_mapping = {}
+    created_count = 0
     for product_name in PRODUCT_IMAGE_MAPPING.keys():
         image_path = find_image_for_product(product_name)
 
         if image_path:
-            # 生成新的文件名（保持原文件名）
-            filename = os.path.basename(image_path)
-            target_path = os.path.join(TARGET_DIR, filename)
-
-            # 复制文件
-            shutil.copy2(image_path, target_path)
-            copied_files.append(filename)
+            url, created = image_store.store_file(Path(image_path))
+            image_mapping[product_name] = url
+            created_count += created
 
     print("-" * 80)
-    print(f"\n✅ 成功复制 {len(copied_files)} 张图片")
+    print(f"\n✅ 共 {len(image_mapping)} 张图片, 新写入 {created_count} 张(其余内容已存在)")
+    print("   不再使用的旧图片通过 scripts/gc_image_store.py 回收")
 
-    # 生成交互式Python代码，输出图片映射
+    # 输出商品图片映射
     print("\n商品图片映射:")
     print("-" * 80)
-    image_mapping = {}
-    for product_name in PRODUCT_IMAGE_MAPPING.keys():
-        image_path = find_image_for_product(product_name)
-        if image_path:
-            filename = os.path.basename(image_path)
-            image_mapping[product_name] = f"/images/products/{filename}"
-            print(f"{product_name}: {filename}")
+    for product_name, url in image_mapping.items():
+        print(f"{product_name}: {url}")
 
     return image_mapping
 
@@ -8,6 +8,13 @@ import json
 import random
 
 
+# 购物车同步请求数统计(逐行同步 vs 批量同步)
+CART_SYNC_STATS = {
+    "per_line": {"syncs": 0, "requests": 0},
+    "batch": {"syncs": 0, "requests": 0},
+}
+
+
 class RestaurantUser(HttpUser):
     """餐厅系统用户模拟"""
 
@@ -102,6 +109,52 @@ class RestaurantUser(HttpUser):
             headers=self.get_headers()
         )
 
+    def _random_cart_edits(self):
+        """模拟客户端本地编辑后的购物车变更"""
+        return [
+            {"product_id": product_id, "quantity": random.randint(0, 3)}
+            for product_id in random.sample(range(1, 11), random.randint(2, 5))
+        ]
+
+    @task(2)
+    def sync_cart_per_line(self):
+        """逐行同步购物车(旧方式: 每行一个请求)"""
+        edits = self._random_cart_edits()
+        for edit in edits:
+            if edit["quantity"]:
+                self.client.put(
+                    f"/api/v1/cart/{edit['product_id']}",
+                    json={"quantity": edit["quantity"]},
+                    headers=self.get_headers(),
+                    name="/api/v1/cart/[product_id]"
+                )
+            else:
+                self.client.delete(
+                    f"/api/v1/cart/{edit['product_id']}",
+                    headers=self.get_headers(),
+                    name="/api/v1/cart/[product_id]"
+                )
+        CART_SYNC_STATS["per_line"]["syncs"] += 1
+        CART_SYNC_STATS["per_line"]["requests"] += len(edits)
+
+    @task(2)
+    def sync_cart_batch(self):
+        """批量同步购物车(PATCH /cart: 一个请求)"""
+        edits = self._random_cart_edits()
+        operations = [
+            {"op": "set", "product_id": edit["product_id"], "quantity": edit["quantity"]}
+            if edit["quantity"] else
+            {"op": "remove", "product_id": edit["product_id"]}
+            for edit in edits
+        ]
+        self.client.patch(
+            "/api/v1/cart",
+            json={"operations": operations},
+            headers=self.get_headers()
+        )
+        CART_SYNC_STATS["batch"]["syncs"] += 1
+        CART_SYNC_STATS["batch"]["requests"] += 1
+
     @task(3)
     def view_cart(self):
         """查看购物车(中频操作)"""
@@ -282,3 +335,9 @@ def on_test_stop(environment, **kwargs):
         print("测试完成,生成报告...")
     else:
         print("测试完成!")
+
+    # 购物车同步请求数对比(分布式运行时为本进程的统计)
+    for mode, stats in CART_SYNC_STATS.items():
+        if stats["syncs"]:
+            print(f"购物车同步[{mode}]: {stats['syncs']}次同步, "
+                  f"平均每次 {stats['requests'] / stats['syncs']:.2f} 个请求")
@@ -4,6 +4,7 @@ FastAPI应用主文件
 """
 import os
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
@@ -11,16 +12,27 @@ from sqlalchemy.exc import SQLAlchemyError
 from contextlib import asynccontextmanager
 
 from app.core.config import get_settings
-from app.core.database import init_db
-from app.core.redis_client import init_redis, close_redis
-from app.core.logger import setup_logger
+from app.core.database import init_db, dispose_engines, AsyncSessionLocal
+from app.core.redis_client import redis_client, init_redis, close_redis
+from app.core.logger import RequestLoggingMiddleware, setup_logger
+from app.core.serialization import DefaultJSONResponse
+from app.core.compression import APICompressionMiddleware
+from app.core.images import shutdown_executor
+from app.core.query_stats import QueryStatsMiddleware, instrument_engines
+from app.core.loop_monitor import LoopBlockingMiddleware, loop_detector
+from app.core.profiler import RequestProfilerMiddleware
+from app.core.tracing import TracingMiddleware, configure_tracing, instrument_layers, tracer
+from app.core.read_routing import ReadRoutingMiddleware
+from app.core.health import ReadOnlyModeMiddleware, health_checker
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, default_registry, loop_lag_monitor
 from app.core.exceptions import (
     AppException, app_exception_handler,
     validation_exception_handler, sqlalchemy_exception_handler,
     general_exception_handler
 )
-from app.api import auth, users, products, categories, cart, orders, reviews, admin_auth, favorites, addresses
-from app.api.admin import orders as admin_orders, analytics, users as admin_users, reviews as admin_reviews, audit_logs, products as admin_products, uploads
+from app.services import cart_persister
+from app.api import auth, users, products, categories, cart, orders, reviews, admin_auth, favorites, addresses, images
+from app.api.admin import orders as admin_orders, analytics, users as admin_users, reviews as admin_reviews, audit_logs, products as admin_products, uploads, diagnostics
 
 settings = get_settings()
 logger = setup_logger()
@@ -35,14 +47,28 @@ async def lifespan(app: FastAPI):
     # 启动事件
     logger.info("应用启动中...")
     await init_db()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_detector.start(asyncio_debug=settings.LOOP_MONITOR_ASYNCIO_DEBUG)
     if not IS_TESTING:
+        loop_lag_monitor.start()
         await init_redis()
+        if redis_client.is_connected:
+            # Redis购物车定期写回数据库
+            await cart_persister.start(AsyncSessionLocal)
+        health_checker.start()
     logger.info("应用启动完成")
     yield
     # 关闭事件
     logger.info("应用关闭中...")
     if not IS_TESTING:
+        await health_checker.stop()
+        await cart_persister.stop()
         await close_redis()
+        await loop_lag_monitor.stop()
+        await dispose_engines()
+    loop_detector.stop()
+    shutdown_executor()
+    tracer.shutdown()
     logger.info("应用关闭完成")
 
 
@@ -52,7 +78,8 @@ app = FastAPI(
     description="餐厅管理系统API",
     version="1.0.0",
     debug=settings.DEBUG,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse
 )
 
 # 配置CORS
@@ -64,6 +91,47 @@ app.add_middleware(
     allow_headers=settings.CORS_ALLOW_HEADERS,
 )
 
+# API响应压缩(已预压缩的缓存响应不会重复压缩, 图片接口不压缩)
+app.add_middleware(
+    APICompressionMiddleware,
+    path_prefix=settings.API_V1_PREFIX,
+    exclude_prefixes=(f"{settings.API_V1_PREFIX}/images",),
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    compresslevel=settings.GZIP_COMPRESS_LEVEL,
+)
+
+# 按请求统计SQL查询(Server-Timing响应头, 超出预算或疑似N+1时告警)
+instrument_engines()
+app.add_middleware(
+    QueryStatsMiddleware,
+    budget=settings.QUERY_BUDGET,
+    strict=settings.QUERY_BUDGET_STRICT,
+)
+
+# Redis不可用时的只读降级模式
+app.add_middleware(ReadOnlyModeMiddleware, checker=health_checker, path_prefix=settings.API_V1_PREFIX)
+
+# 只读副本路由: 写请求和刚写入过的用户固定读主库(未配置副本时直接透传)
+app.add_middleware(ReadRoutingMiddleware)
+
+# 事件循环阻塞检测按请求归类(未开启时直接透传)
+app.add_middleware(LoopBlockingMiddleware, detector=loop_detector)
+
+# 管理员通过请求头按需采样分析单个请求(不带该请求头时直接透传)
+app.add_middleware(RequestProfilerMiddleware, header_name=settings.PROFILER_REQUEST_HEADER)
+
+# 请求耗时和状态码指标(包含其余中间件的耗时)
+app.add_middleware(MetricsMiddleware)
+
+# 链路追踪: 请求根span, service/repository/Redis调用的子span
+if settings.TRACING_ENABLED:
+    configure_tracing()
+    instrument_layers()
+app.add_middleware(TracingMiddleware)
+
+# 请求日志上下文(request_id)和访问日志, 最外层以覆盖其余中间件输出的日志
+app.add_middleware(RequestLoggingMiddleware, access_log=settings.LOG_ACCESS_ENABLED)
+
 # 注册异常处理器
 app.add_exception_handler(AppException, app_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
@@ -102,6 +170,7 @@ app.include_router(orders.router, prefix=settings.API_V1_PREFIX)
 app.include_router(reviews.router, prefix=settings.API_V1_PREFIX)
 app.include_router(favorites.router, prefix=settings.API_V1_PREFIX)
 app.include_router(addresses.router, prefix=settings.API_V1_PREFIX)
+app.include_router(images.router, prefix=settings.API_V1_PREFIX)
 
 # 注册管理后台API路由
 app.include_router(admin_orders.router, prefix=settings.API_V1_PREFIX)
@@ -111,6 +180,7 @@ app.include_router(admin_reviews.router, prefix=settings.API_V1_PREFIX)
 app.include_router(audit_logs.router, prefix=settings.API_V1_PREFIX)
 app.include_router(admin_products.router, prefix=settings.API_V1_PREFIX)
 app.include_router(uploads.router, prefix=settings.API_V1_PREFIX)
+app.include_router(diagnostics.router, prefix=settings.API_V1_PREFIX)
 
 
 @app.get("/")
@@ -125,14 +195,39 @@ async def root():
     }
 
 
+@app.get("/health/live")
+async def liveness():
+    """存活探针(不检查外部依赖)"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """就绪探针: 数据库不可用时返回503; Redis不可用时仍返回200(只读降级)"""
+    report = await health_checker.check()
+    return DefaultJSONResponse(report, status_code=503 if report["status"] == "unavailable" else 200)
+
+
 @app.get("/health")
 async def health_check():
-    """健康检查"""
-    return {
-        "status": "healthy",
-        "database": "connected",
-        "redis": "connected"
-    }
+    """健康检查摘要(兼容旧格式, 数据基于就绪检查结果)"""
+    report = await health_checker.check()
+    dependency_status = {"ok": "connected", "error": "unavailable", "disabled": "disabled"}
+    return DefaultJSONResponse(
+        {
+            "status": {"ok": "healthy", "degraded": "degraded"}.get(report["status"], "unhealthy"),
+            "database": dependency_status[report["checks"]["database"]["status"]],
+            "redis": dependency_status[report["checks"]["redis"]["status"]],
+            "read_only": report["read_only"],
+        },
+        status_code=503 if report["status"] == "unavailable" else 200
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus指标"""
+    return Response(default_registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 
 if __name__ == "__main__":
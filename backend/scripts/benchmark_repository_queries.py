@@ -0,0 +1,125 @@
+"""
+Repository热点查询基准脚本
+对比每次调用重新构建语句(原实现)和缓存语句(cached_statement)的单次查询耗时
+
+使用内存SQLite和100个模拟商品, 不依赖外部数据库; 两种方式的驱动和数据库耗时相同,
+差值即为每次查询节省的Python开销(语句构建 + 缓存键计算):
+    python scripts/benchmark_repository_queries.py [--rounds 2000]
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["TESTING"] = "true"
+
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, CartItem, Category, Product, User
+from app.repositories import CartRepository, ProductRepository
+
+from benchmark_serialization import seed_products
+
+
+async def legacy_get_by_id(db: AsyncSession, id: int):
+    """原实现: 每次构建SELECT"""
+    result = await db.execute(select(Product).where(Product.id == id))
+    return result.scalar_one_or_none()
+
+
+async def legacy_get_user_cart(db: AsyncSession, user_id: int):
+    """原实现: 每次构建购物车JOIN查询"""
+    query = select(
+        CartItem.id, CartItem.user_id, CartItem.product_id, CartItem.quantity,
+        CartItem.created_at, CartItem.updated_at, Product
+    ).join(Product, CartItem.product_id == Product.id).where(CartItem.user_id == user_id)
+    result = await db.execute(query)
+    return result.all()
+
+
+async def legacy_products_with_filter(db: AsyncSession, category_id: int, keyword: str, skip: int, limit: int):
+    """原实现: 每次构建列表和计数查询"""
+    conditions = [
+        Product.is_active == True,
+        Product.status == "active",
+        Product.category_id == category_id,
+        or_(Product.title.ilike(f"%{keyword}%"), Product.description.ilike(f"%{keyword}%")),
+    ]
+    total = (await db.execute(select(func.count(Product.id)).where(*conditions))).scalar()
+    query = select(Product).where(*conditions).order_by(Product.price.desc()).offset(skip).limit(limit)
+    result = await db.execute(query)
+    return list(result.scalars().all()), total
+
+
+async def timeit(func, rounds: int) -> float:
+    """返回单次调用平均耗时(微秒)"""
+    await func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+async def main(rounds: int):
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_maker() as db:
+        await seed_products(db)
+        user = User(phone="13800000000", password_hash="x")
+        db.add(user)
+        await db.flush()
+        db.add_all([CartItem(user_id=user.id, product_id=i, quantity=1) for i in range(1, 6)])
+        await db.commit()
+        category_id = (await db.execute(select(Category.id))).scalar()
+
+        products = ProductRepository(Product, db)
+        carts = CartRepository(CartItem, db)
+        cases = [
+            (
+                "get_by_id",
+                lambda: legacy_get_by_id(db, 42),
+                lambda: products.get_by_id(42),
+            ),
+            (
+                "get_user_cart",
+                lambda: legacy_get_user_cart(db, user.id),
+                lambda: carts.get_user_cart(user.id),
+            ),
+            (
+                "get_products_with_filter",
+                lambda: legacy_products_with_filter(db, category_id, "菜品1", 0, 20),
+                lambda: products.get_products_with_filter(
+                    category_id=category_id, keyword="菜品1", sort_by="price_desc", skip=0, limit=20
+                ),
+            ),
+        ]
+
+        print("=" * 60)
+        print(f"{'查询':26s} {'原实现':>10s} {'缓存语句':>10s} {'节省':>10s}")
+        print("-" * 60)
+        for name, legacy, cached in cases:
+            before = await timeit(legacy, rounds)
+            after = await timeit(cached, rounds)
+            print(f"{name:26s} {before:8.1f} µs {after:8.1f} µs {before - after:8.1f} µs")
+        print("=" * 60)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repository热点查询基准")
+    parser.add_argument("--rounds", type=int, default=2000, help="每项测试的循环次数")
+    args = parser.parse_args()
+    asyncio.run(main(args.rounds))
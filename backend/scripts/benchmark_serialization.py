@@ -0,0 +1,114 @@
+"""
+序列化性能基准脚本
+对比 /api/products?page_size=100 响应渲染和缓存codec的编解码耗时
+
+使用内存SQLite和100个模拟商品, 不依赖外部数据库和Redis:
+    python scripts/benchmark_serialization.py [--rounds 500]
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+from decimal import Decimal
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["TESTING"] = "true"
+
+from httpx import AsyncClient
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, Category, Product
+from app.core.serialization import CODECS, decode_cache_value
+
+
+async def seed_products(db: AsyncSession, count: int = 100):
+    """写入模拟商品"""
+    category = Category(name="热菜", code="hot_dish", sort_order=1)
+    db.add(category)
+    await db.flush()
+    for i in range(count):
+        db.add(Product(
+            title=f"测试菜品{i}",
+            category_id=category.id,
+            local_image_path=f"/static/测试菜品{i}.png",
+            ingredients="鸡蛋 200g、番茄 2个、葱花 少许、盐 适量" * 3,
+            description="家常菜, 酸甜开胃, 老少皆宜" * 4,
+            price=Decimal("28.50") + i,
+            stock=100,
+            views=i * 37,
+            favorites=i * 3,
+        ))
+    await db.commit()
+
+
+def timeit(func, rounds: int) -> float:
+    """返回单次调用平均耗时(微秒)"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+async def main(rounds: int):
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    from main import app
+    from app.core.database import get_db
+
+    async with session_maker() as db:
+        await seed_products(db)
+
+        async def override_get_db():
+            yield db
+
+        app.dependency_overrides[get_db] = override_get_db
+
+        async with AsyncClient(app=app, base_url="http://bench") as client:
+            url = "/api/products?page_size=100"
+            response = await client.get(url)
+            payload = response.json()
+
+            start = time.perf_counter()
+            for _ in range(rounds // 10 or 1):
+                await client.get(url)
+            request_us = (time.perf_counter() - start) / (rounds // 10 or 1) * 1e6
+
+        app.dependency_overrides.clear()
+
+    await engine.dispose()
+
+    print("=" * 60)
+    print(f"GET {url}: {len(response.content)} 字节, 平均 {request_us:.0f} µs/请求")
+    print(f"响应类: {app.router.default_response_class.__name__}")
+    print("-" * 60)
+    print("响应渲染(同一payload):")
+    print(f"  JSONResponse   {timeit(lambda: JSONResponse(payload), rounds):8.1f} µs")
+    print(f"  ORJSONResponse {timeit(lambda: ORJSONResponse(payload), rounds):8.1f} µs")
+    print("-" * 60)
+    print("缓存codec(100个商品字典, 编码 / 解码):")
+    products = payload["products"]
+    for name, codec in CODECS.items():
+        encoded = codec.encode(products)
+        assert decode_cache_value(encoded) == products
+        encode_us = timeit(lambda: codec.encode(products), rounds)
+        decode_us = timeit(lambda: decode_cache_value(encoded), rounds)
+        print(f"  {name:8s} {encode_us:8.1f} µs / {decode_us:8.1f} µs  ({len(encoded)} 字节)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="序列化性能基准")
+    parser.add_argument("--rounds", type=int, default=500, help="每项测试的循环次数")
+    args = parser.parse_args()
+    asyncio.run(main(args.rounds))
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+图片存储回收工具
+删除内容寻址存储中不再被任何商品或订单商品引用的图片(最近写入的文件保留一段时间)
+
+用法:
+    python scripts/gc_image_store.py --dry-run      # 只统计
+    python scripts/gc_image_store.py
+    python scripts/gc_image_store.py --grace 0      # 不保留最近上传的文件
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.database import AsyncSessionLocal
+from app.services import ProductService
+
+
+async def run(args):
+    """统计引用并回收"""
+    async with AsyncSessionLocal() as db:
+        stats = await ProductService().collect_image_garbage(db, grace_seconds=args.grace, dry_run=args.dry_run)
+
+    action = "可回收" if args.dry_run else "已删除"
+    print(f"扫描文件: {stats['scanned']}  被引用: {stats['referenced']}")
+    print(f"{action}: {stats['removed']}  ({stats['freed_bytes'] / 1024 / 1024:.1f} MB)")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="回收未被引用的商品图片")
+    parser.add_argument("--dry-run", action="store_true", help="只统计不删除")
+    parser.add_argument("--grace", type=int, default=None, help="保留最近多少秒内写入的文件, 默认IMAGE_STORE_GC_GRACE_SECONDS")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
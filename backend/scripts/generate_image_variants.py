@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+商品衍生图生成工具
+为已有商品生成缩略图和WebP(AVIF)版本并保存URL; 衍生图按原图内容哈希命名, 重复运行不会重新编码
+
+用法:
+    python scripts/generate_image_variants.py              # 只处理尚无衍生图的商品
+    python scripts/generate_image_variants.py --force      # 重新检查全部商品
+    python scripts/generate_image_variants.py --ids 1 2 3
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.database import AsyncSessionLocal
+from app.core.images import shutdown_executor
+from app.services import ProductService
+
+
+async def run(args):
+    """生成衍生图并提交"""
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        product_ids = await ProductService().refresh_image_variants(db, product_ids=args.ids, force=args.force)
+        await db.commit()
+    await ProductService.invalidate_cache(product_ids)
+    shutdown_executor()
+
+    elapsed = time.perf_counter() - started
+    rate = len(product_ids) / elapsed if elapsed > 0 else 0.0
+    print(f"更新商品: {len(product_ids)}  耗时: {elapsed:.2f}s  ({rate:.1f} 个/秒)")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="生成商品衍生图")
+    parser.add_argument("--ids", type=int, nargs="*", help="商品ID, 默认全部")
+    parser.add_argument("--force", action="store_true", help="已有衍生图的商品也重新处理")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 """
 Material数据导入脚本
 从Material文件夹导入菜品JSON数据到数据库
+
+增量重新导入(只处理新增或变化的文件)使用:
+    python scripts/import_products.py <Material目录> --material
 """
 import os
 import json
+import hashlib
 import re
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import create_engine
@@ -18,6 +26,7 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from app.models import Base, Category, Product, ProductStatus
+from app.core import image_store
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -151,56 +160,40 @@ def parse_views_favorites(views_str: str) -> Tuple[int, int]:
     return views, favorites
 
 
-def scan_material_files(material_path: str) -> List[Dict]:
+def parse_material_file(json_path: str, store_images: bool = False) -> Dict:
     """
-    扫描Material文件夹,解析所有JSON文件
+    解析单个菜品JSON文件(在进程池中执行)
 
     Args:
-        material_path: Material文件夹路径
+        json_path: JSON文件路径
+        store_images: 将图片放入内容寻址存储, local_image_path使用存储URL(相同图片只保存一份)
 
     Returns:
-        解析后的菜品数据列表
+        {"file": 文件名, "product": 商品数据(失败为None), "error": 错误信息, "seconds": 耗时}
     """
-    material_dir = Path(material_path)
-    products_data = []
-
-    print(f"开始扫描目录: {material_path}")
-
-    # 扫描所有JSON文件
-    json_files = list(material_dir.glob("*.json"))
-    total_files = len(json_files)
-
-    print(f"找到 {total_files} 个JSON文件")
-
-    for idx, json_file in enumerate(json_files, 1):
-        try:
-            # 读取JSON文件
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # 检查对应的图片文件
-            png_file = json_file.with_suffix('.png')
-            if not png_file.exists():
-                print(f"警告: 图片文件不存在: {png_file.name}")
-                continue
+    started = time.perf_counter()
+    json_file = Path(json_path)
+    result = {"file": json_file.name, "product": None, "error": None}
 
-            # 解析数据
-            title = data.get('title', '').strip()
-            if not title:
-                print(f"警告: 标题为空: {json_file.name}")
-                continue
-
-            # 分类
-            category = classify_product(title)
-
-            # 解析浏览量和收藏量
-            views_str = data.get('views_and_favorites', '')
-            views, favorites = parse_views_favorites(views_str)
-
-            # 本地图片路径 (相对于material目录)
-            local_image_path = f"/static/{png_file.name}"
-
-            product_data = {
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # 检查对应的图片文件
+        png_file = json_file.with_suffix('.png')
+        title = data.get('title', '').strip()
+        if not png_file.exists():
+            result["error"] = f"图片文件不存在: {png_file.name}"
+        elif not title:
+            result["error"] = f"标题为空: {json_file.name}"
+        else:
+            views, favorites = parse_views_favorites(data.get('views_and_favorites', ''))
+            if store_images:
+                local_image_path, _ = image_store.store_file(png_file)
+            else:
+                # 本地图片路径 (相对于material目录)
+                local_image_path = f"/static/{png_file.name}"
+            result["product"] = {
                 'title': title,
                 'detail_url': data.get('detail_url', ''),
                 'image_url': data.get('image_url', ''),
@@ -208,25 +201,195 @@ def scan_material_files(material_path: str) -> List[Dict]:
                 'ingredients': data.get('ingredients', ''),
                 'views': views,
                 'favorites': favorites,
-                'category': category,
+                'category': classify_product(title),
                 'json_file': str(json_file),
                 'png_file': str(png_file)
             }
+    except json.JSONDecodeError as e:
+        result["error"] = f"JSON解析失败 {json_file.name}: {e}"
+    except Exception as e:
+        result["error"] = f"处理文件失败 {json_file.name}: {e}"
 
-            products_data.append(product_data)
+    result["seconds"] = time.perf_counter() - started
+    return result
 
-            if idx % 100 == 0:
-                print(f"已处理: {idx}/{total_files} ({idx*100//total_files}%)")
 
-        except json.JSONDecodeError as e:
-            print(f"错误: JSON解析失败 {json_file.name}: {e}")
-        except Exception as e:
-            print(f"错误: 处理文件失败 {json_file.name}: {e}")
+def parse_material_chunk(json_paths: List[str], store_images: bool = False) -> List[Dict]:
+    """解析一组文件(按块提交到进程池, 减少进程间通信次数)"""
+    return [parse_material_file(path, store_images) for path in json_paths]
+
 
+class MaterialManifest:
+    """
+    增量导入清单
+    记录每个JSON文件导入时的mtime、大小和内容哈希, 重新导入时只处理新增或变化的文件
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        """文件内容哈希"""
+        return hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+    def check(self, json_file: Path) -> Optional[Dict]:
+        """
+        检查文件是否需要导入
+
+        Returns:
+            新增或内容变化时返回新的清单项(导入成功后由update写入), 否则返回None
+        """
+        stat = json_file.stat()
+        entry = self.entries.get(json_file.name)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return None
+
+        new_entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": self.file_hash(json_file)}
+        if entry and entry["hash"] == new_entry["hash"]:
+            # 只有mtime变化(如重新复制), 内容未变
+            self.entries[json_file.name] = new_entry
+            return None
+        return new_entry
+
+    def update(self, entries: Dict[str, Dict]):
+        """记录导入成功的文件"""
+        self.entries.update(entries)
+
+    def prune(self, names: set):
+        """移除已不存在的文件"""
+        self.entries = {name: entry for name, entry in self.entries.items() if name in names}
+
+    def save(self):
+        """写入清单(先写临时文件再替换, 中断时不会损坏原清单)"""
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def iter_material_products(
+    material_path: str,
+    workers: Optional[int] = None,
+    manifest: Optional[MaterialManifest] = None,
+    pending: Optional[Dict[str, Dict]] = None,
+    sources: Optional[List[str]] = None,
+    stats: Optional[Dict] = None,
+    chunk_size: int = 50,
+    max_pending_chunks: int = 8,
+    store_images: bool = False
+) -> Iterator[Dict]:
+    """
+    并行解析Material文件夹, 逐个产出商品数据
+
+    JSON解析和分类在进程池中执行; 同时在途的块数有上限(有界队列),
+    调用方(数据库写入)处理结果时进程池继续解析后续文件。
+
+    Args:
+        material_path: Material文件夹路径
+        workers: 进程数, 默认CPU核数; 0表示在当前进程中解析
+        manifest: 增量导入清单, 提供时只解析新增或变化的文件
+        pending: 收集解析成功文件的新清单项, 导入提交后调用manifest.update写入
+        sources: 按产出顺序记录每个商品的文件名(第N个商品来自sources[N-1])
+        stats: 收集各阶段统计(scan/parse)
+        store_images: 解析时将图片放入内容寻址存储(哈希和复制在进程池中执行)
+    """
+    stats = stats if stats is not None else {}
+    material_dir = Path(material_path)
+
+    # 1. 扫描: 列出文件, 按清单过滤未变化的文件
+    started = time.perf_counter()
+    json_files = sorted(material_dir.glob("*.json"))
+    total_files = len(json_files)
+    entries = {}
+    if manifest is not None:
+        manifest.prune({json_file.name for json_file in json_files})
+        for json_file in json_files:
+            entry = manifest.check(json_file)
+            if entry is not None:
+                entries[json_file.name] = entry
+        json_files = [json_file for json_file in json_files if json_file.name in entries]
+    stats["scan"] = {"files": total_files, "changed": len(json_files), "seconds": time.perf_counter() - started}
+
+    # 2. 解析
+    started = time.perf_counter()
+    parse_stats = {"files": len(json_files), "parsed": 0, "errors": 0, "worker_seconds": 0.0}
+    stats["parse"] = parse_stats
+
+    def handle(results: List[Dict]) -> Iterator[Dict]:
+        for result in results:
+            parse_stats["worker_seconds"] += result["seconds"]
+            if result["error"]:
+                parse_stats["errors"] += 1
+                print(f"警告: {result['error']}")
+                continue
+            parse_stats["parsed"] += 1
+            if pending is not None and result["file"] in entries:
+                pending[result["file"]] = entries[result["file"]]
+            if sources is not None:
+                sources.append(result["file"])
+            yield result["product"]
+
+    paths = iter(str(json_file) for json_file in json_files)
+    if workers == 0 or len(json_files) <= chunk_size:
+        # 文件很少时进程池的启动开销大于收益
+        for path in paths:
+            yield from handle([parse_material_file(path, store_images)])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+
+            def submit_next():
+                chunk = list(islice(paths, chunk_size))
+                if chunk:
+                    in_flight.append(pool.submit(parse_material_chunk, chunk, store_images))
+
+            for _ in range(max_pending_chunks):
+                submit_next()
+            while in_flight:
+                results = in_flight.popleft().result()
+                submit_next()
+                yield from handle(results)
+
+    parse_stats["seconds"] = time.perf_counter() - started
+
+
+def scan_material_files(material_path: str, workers: Optional[int] = None) -> List[Dict]:
+    """
+    扫描Material文件夹,并行解析所有JSON文件
+
+    Args:
+        material_path: Material文件夹路径
+        workers: 解析进程数, 默认CPU核数
+
+    Returns:
+        解析后的菜品数据列表
+    """
+    print(f"开始扫描目录: {material_path}")
+    stats = {}
+    products_data = list(iter_material_products(material_path, workers=workers, stats=stats))
+    print(f"找到 {stats['scan']['files']} 个JSON文件")
     print(f"解析完成,共 {len(products_data)} 条数据")
     return products_data
 
 
+def print_stage_stats(stats: Dict):
+    """打印各阶段吞吐量"""
+    for stage, item in stats.items():
+        seconds = item.get("seconds", 0.0)
+        count = item.get("rows", item.get("files", 0))
+        rate = count / seconds if seconds > 0 else 0.0
+        details = ", ".join(
+            f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in item.items() if key != "seconds"
+        )
+        print(f"  {stage:<6} {seconds:8.3f}s  {rate:10.1f}/s  {details}")
+
+
 def import_categories(db: Session) -> Dict[str, Category]:
     """
     创建或获取商品分类
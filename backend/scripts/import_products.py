@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+商品批量导入工具
+导入CSV(带表头)/NDJSON文件或Material目录, 与管理后台 POST /api/admin/products/import 使用同一导入流程
+
+用法:
+    python scripts/import_products.py products.csv
+    python scripts/import_products.py products.ndjson --create-categories
+    python scripts/import_products.py /path/to/Material --material --create-categories
+    python scripts/import_products.py /path/to/Material --material --full --workers 8
+    python scripts/import_products.py /path/to/Material --material --images
+    python scripts/import_products.py /path/to/Material --material --store-images
+
+Material目录按增量清单只导入新增或变化的文件(--full忽略清单);
+--store-images将图片复制到内容寻址存储(相同图片只保存一份), 商品图片路径使用存储URL
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.database import AsyncSessionLocal
+from app.services import ProductImportService, ProductService
+
+# Material数据中导入的字段
+MATERIAL_FIELDS = (
+    "title", "category", "detail_url", "image_url", "local_image_path", "ingredients", "views", "favorites"
+)
+
+
+def iter_material_records(products):
+    """Material菜品转换为导入记录"""
+    for line, data in enumerate(products, 1):
+        yield line, {field: data[field] for field in MATERIAL_FIELDS if data.get(field) not in (None, "")}
+
+
+def imported_entries(pending: dict, sources: list, failed_lines: set) -> dict:
+    """去掉导入失败的行对应的文件, 返回可以写入清单的项(sources[N-1]为第N行的文件)"""
+    failed_files = {sources[line - 1] for line in failed_lines}
+    return {name: entry for name, entry in pending.items() if name not in failed_files}
+
+
+async def run_import(args) -> dict:
+    """执行导入并提交"""
+    from scripts.import_material_data import MaterialManifest, iter_material_products, print_stage_stats
+
+    service = ProductImportService()
+    manifest = None
+    pending, stats = {}, {}
+    sources, failed_lines = [], set()
+    async with AsyncSessionLocal() as db:
+        if args.material:
+            if not args.full:
+                manifest = MaterialManifest(args.manifest or str(Path(args.path) / ".import_manifest.json"))
+            products = iter_material_products(
+                args.path, workers=args.workers, manifest=manifest, pending=pending, sources=sources,
+                stats=stats, store_images=args.store_images
+            )
+            report, updated_ids = await service.import_records(
+                iter_material_records(products), db, create_missing_categories=args.create_categories,
+                failed_lines=failed_lines
+            )
+        else:
+            fmt = service.detect_format(args.path, args.format)
+            with open(args.path, "r", encoding="utf-8-sig", newline="") as f:
+                report, updated_ids = await service.import_records(
+                    service.iter_records(f, fmt), db, create_missing_categories=args.create_categories
+                )
+        await db.commit()
+
+    # 提交成功后才记录清单; 导入失败的行(如分类不存在、校验失败)对应的文件不记录, 下次重新处理
+    if manifest is not None:
+        manifest.update(imported_entries(pending, sources, failed_lines))
+        manifest.save()
+
+    await service.invalidate_cache(updated_ids, report["categories_created"])
+
+    if stats:
+        # 写入阶段与解析阶段并行, 耗时包含等待解析结果的时间
+        stats["write"] = {"rows": report["total_rows"], "seconds": report["elapsed_seconds"]}
+
+    if args.images:
+        # 为新导入(尚无衍生图)的商品生成缩略图和WebP版本
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            image_product_ids = await ProductService().refresh_image_variants(db)
+            await db.commit()
+        await ProductService.invalidate_cache(image_product_ids)
+        stats["images"] = {"rows": len(image_product_ids), "seconds": time.perf_counter() - started}
+
+    if stats:
+        print("各阶段吞吐量:")
+        print_stage_stats(stats)
+    return report
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="商品批量导入")
+    parser.add_argument("path", help="CSV/NDJSON文件, 或Material目录(配合--material)")
+    parser.add_argument("--format", choices=ProductImportService.FORMATS, help="文件格式, 默认按扩展名判断")
+    parser.add_argument("--material", action="store_true", help="从Material目录导入")
+    parser.add_argument("--create-categories", action="store_true", help="自动创建不存在的分类")
+    parser.add_argument("--workers", type=int, default=None, help="Material解析进程数, 默认CPU核数, 0为不使用进程池")
+    parser.add_argument("--manifest", help="增量导入清单路径, 默认为Material目录下的.import_manifest.json")
+    parser.add_argument("--full", action="store_true", help="忽略增量清单, 重新导入全部Material文件")
+    parser.add_argument("--store-images", action="store_true", help="将Material图片放入内容寻址存储, 不再引用/static路径")
+    parser.add_argument("--images", action="store_true", help="导入后为尚无衍生图的商品生成缩略图和WebP版本")
+    parser.add_argument("--show-errors", type=int, default=20, help="打印的错误行数")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_import(args))
+
+    print("=" * 50)
+    print(f"总行数: {report['total_rows']}")
+    print(f"新增: {report['inserted']}  更新: {report['updated']}  失败: {report['failed']}")
+    print(f"新建分类: {report['categories_created']}")
+    print(f"耗时: {report['elapsed_seconds']}s  ({report['rows_per_second']} 行/秒)")
+    for error in report["errors"][:args.show_errors]:
+        print(f"  第{error['line']}行: {error['error']}")
+    if report["failed"] > args.show_errors:
+        print(f"  ... 共{report['failed']}行错误")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
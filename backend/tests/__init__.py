@@ -13,6 +13,8 @@ from app.core.config import get_settings
 
 # 设置测试环境标志
 os.environ["TESTING"] = "true"
+# 请求查询次数超出预算或疑似N+1时使测试失败
+os.environ.setdefault("QUERY_BUDGET_STRICT", "true")
 
 settings = get_settings()
 
@@ -55,12 +57,13 @@ async def test_db():
 @pytest.fixture(scope="function")
 async def client(test_db: AsyncSession):
     """创建测试客户端"""
-    from app.core.database import get_db
+    from app.core.database import get_db, get_reporting_db
 
     async def override_get_db():
         yield test_db
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_reporting_db] = override_get_db
 
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
@@ -117,7 +117,7 @@ async def _seed_test_data(db: AsyncSession):
 @pytest.fixture(scope="function")
 async def client(test_db: AsyncSession):
     """创建测试客户端"""
-    from app.core.database import get_db
+    from app.core.database import get_db, get_reporting_db
     from tests import get_app
 
     app = get_app()
@@ -126,6 +126,7 @@ async def client(test_db: AsyncSession):
         yield test_db
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_reporting_db] = override_get_db
 
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
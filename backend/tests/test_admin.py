@@ -85,6 +85,47 @@ class TestAdminProducts:
         assert response.status_code in [200, 401, 403, 404]
 
 
+class TestAdminProductBatch:
+    """商品批量操作测试(集合语句)"""
+
+    @pytest.mark.asyncio
+    async def test_batch_set_active(self, test_db):
+        """测试批量下架返回实际更新的商品ID"""
+        from app.models import Product
+        from app.services import ProductService
+
+        updated = await ProductService().batch_set_active([1, 2, 99999, 1], False, test_db)
+        await test_db.commit()
+        assert sorted(updated) == [1, 2]
+        product = await test_db.get(Product, 1)
+        await test_db.refresh(product)
+        assert product.is_active is False
+
+    @pytest.mark.asyncio
+    async def test_batch_delete_keeps_referenced(self, test_db):
+        """测试批量删除: 被评价引用的商品保留, 购物车记录随商品删除"""
+        from sqlalchemy import select
+        from app.models import CartItem, Product, Review, User
+        from app.services import ProductService
+
+        user = User(phone="13900000000", password_hash="x")
+        test_db.add(user)
+        await test_db.flush()
+        test_db.add_all([
+            Review(user_id=user.id, product_id=2, rating=5),
+            CartItem(user_id=user.id, product_id=3, quantity=1),
+        ])
+        await test_db.commit()
+
+        deleted, referenced = await ProductService().batch_delete([3, 2, 99999], test_db)
+        await test_db.commit()
+        assert deleted == [3]
+        assert referenced == [2]
+        assert (await test_db.execute(select(CartItem))).scalars().all() == []
+        ids = (await test_db.execute(select(Product.id))).scalars().all()
+        assert 2 in ids and 3 not in ids
+
+
 class TestAdminOrders:
     """管理员订单管理测试"""
 
@@ -121,3 +121,167 @@ class TestCart:
             headers={"Authorization": f"Bearer {token}"}
         )
         assert response.status_code in [200, 204]
+
+
+class TestCartFlow:
+    """购物车完整流程测试(Redis不可用时走数据库)"""
+
+    @pytest.mark.asyncio
+    async def test_cart_lifecycle(self, client: AsyncClient, test_token: str):
+        """测试添加、累加、修改、汇总、金额预览和删除"""
+        headers = {"Authorization": f"Bearer {test_token}"}
+
+        response = await client.post("/api/cart", json={"product_id": 1, "quantity": 2}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["quantity"] == 2
+        response = await client.post("/api/cart", json={"product_id": 1, "quantity": 1}, headers=headers)
+        assert response.json()["quantity"] == 3
+        response = await client.put("/api/cart/1", json={"quantity": 4}, headers=headers)
+        assert response.status_code == 200
+        await client.post("/api/cart", json={"product_id": 2, "quantity": 1}, headers=headers)
+
+        data = (await client.get("/api/cart", headers=headers)).json()
+        assert data["total_items"] == 2
+        assert data["total_quantity"] == 5
+        assert data["total_amount"] == 28.00 * 4 + 48.00
+        assert data["items"][0]["product"]["title"] == "青椒炒肉"
+
+        preview = (await client.get("/api/orders/amount/preview?delivery_type=pickup", headers=headers)).json()
+        assert float(preview["subtotal"]) == data["total_amount"]
+
+        response = await client.delete("/api/cart/1", headers=headers)
+        assert response.status_code == 200
+        data = (await client.get("/api/cart", headers=headers)).json()
+        assert [item["product_id"] for item in data["items"]] == [2]
+
+    @pytest.mark.asyncio
+    async def test_add_exceeds_stock(self, client: AsyncClient, test_token: str):
+        """测试超过库存时拒绝加入购物车"""
+        response = await client.post(
+            "/api/cart",
+            json={"product_id": 1, "quantity": 9999},
+            headers={"Authorization": f"Bearer {test_token}"}
+        )
+        assert response.status_code == 400
+
+    def test_parse_cart_hash(self):
+        """测试解析Redis购物车hash(忽略标记字段, 按加入时间排序)"""
+        from app.services import CartService
+
+        rows = CartService.parse_cart_hash({
+            b"_loaded": b"1", b"_rev": b"3", b"_lines": b"2", b"_qty": b"3", b"_subtotal": b"4800", b"_pv": b"7",
+            b"5": b"2", b"t:5": b"1700000100", b"p:5": b"1200",
+            b"3": b"1", b"t:3": b"1700000000", b"p:3": b"2400",
+        })
+        assert [(product_id, quantity) for product_id, quantity, _ in rows] == [(3, 1), (5, 2)]
+        assert rows[0][2].year == 2023
+
+    def test_totals_from_hash(self):
+        """测试汇总字段(分)转换为精确金额, 价格版本不一致时视为过期"""
+        from decimal import Decimal
+        from app.services import CartService
+
+        totals = CartService.totals_from_hash([b"2", b"3", b"4810", b"7"], b"7")
+        assert totals == {"total_items": 2, "total_quantity": 3, "total_amount": Decimal("48.10")}
+        assert CartService.totals_from_hash([b"2", b"3", b"4810", b"6"], b"7") is None
+        assert CartService.totals_from_hash([None, None, None, None], b"7") is None
+        assert CartService.price_to_cents("0.29") * 3 == 87
+
+    @pytest.mark.asyncio
+    async def test_preview_empty_cart(self, client: AsyncClient, test_token: str):
+        """测试空购物车预览金额返回400"""
+        response = await client.get(
+            "/api/orders/amount/preview?delivery_type=pickup",
+            headers={"Authorization": f"Bearer {test_token}"}
+        )
+        assert response.status_code == 400
+
+
+class TestCartBatch:
+    """购物车批量修改测试"""
+
+    @pytest.mark.asyncio
+    async def test_batch_operations(self, client: AsyncClient, test_token: str):
+        """测试一次请求执行多个操作并返回新购物车"""
+        headers = {"Authorization": f"Bearer {test_token}"}
+        await client.post("/api/cart", json={"product_id": 1, "quantity": 2}, headers=headers)
+        await client.post("/api/cart", json={"product_id": 2, "quantity": 1}, headers=headers)
+
+        response = await client.patch("/api/cart", json={"operations": [
+            {"op": "increment", "product_id": 1, "quantity": 3},
+            {"op": "remove", "product_id": 2},
+            {"op": "set", "product_id": 4, "quantity": 2},
+            {"op": "increment", "product_id": 5, "quantity": -1},
+        ]}, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert {item["product_id"]: item["quantity"] for item in data["items"]} == {1: 5, 4: 2}
+        assert data["total_amount"] == 28.00 * 5 + 12.00 * 2
+
+        # 删除到0
+        response = await client.patch("/api/cart", json={"operations": [
+            {"op": "increment", "product_id": 4, "quantity": -2},
+        ]}, headers=headers)
+        assert [item["product_id"] for item in response.json()["items"]] == [1]
+
+    @pytest.mark.asyncio
+    async def test_batch_is_atomic(self, client: AsyncClient, test_token: str):
+        """测试任一操作不合法时整批不执行"""
+        headers = {"Authorization": f"Bearer {test_token}"}
+        response = await client.patch("/api/cart", json={"operations": [
+            {"op": "set", "product_id": 1, "quantity": 2},
+            {"op": "set", "product_id": 99999, "quantity": 1},
+        ]}, headers=headers)
+        assert response.status_code == 400
+
+        data = (await client.get("/api/cart", headers=headers)).json()
+        assert data["items"] == []
+
+    @pytest.mark.asyncio
+    async def test_stock_checked_against_database(self, test_db, monkeypatch):
+        """测试商品缓存中的库存过期时, 按数据库中的当前库存和状态校验"""
+        from app.models import Product
+        from app.services import CartService, ProductService
+
+        original = ProductService.get_products_by_ids
+
+        async def stale_snapshot(self, ids, db):
+            return [{**p, "stock": 100, "is_active": True} for p in await original(self, ids, db)]
+
+        monkeypatch.setattr(ProductService, "get_products_by_ids", stale_snapshot)
+        product = await test_db.get(Product, 1)
+        product.stock = 2
+        await test_db.commit()
+
+        with pytest.raises(ValueError, match="库存不足"):
+            await CartService().add_item(1, 1, 3, test_db)
+        line = await CartService().add_item(1, 1, 2, test_db)
+        assert line["product"]["stock"] == 2
+
+        product.is_active = False
+        await test_db.commit()
+        with pytest.raises(ValueError, match="已下架"):
+            await CartService().apply_operations(1, [{"op": "set", "product_id": 1, "quantity": 3}], test_db)
+
+    @pytest.mark.asyncio
+    async def test_batch_checks_resulting_quantity(self, test_db):
+        """测试增量按结果数量校验库存, 只减少数量时不校验上架状态"""
+        from app.models import Product
+        from app.services import CartService
+
+        service = CartService()
+        await service.add_item(1, 1, 3, test_db)
+        product = await test_db.get(Product, 1)
+        product.stock = 4
+        await test_db.commit()
+
+        with pytest.raises(ValueError, match="库存不足"):
+            await service.apply_operations(1, [{"op": "increment", "product_id": 1, "quantity": 2}], test_db)
+
+        product.is_active = False
+        await test_db.commit()
+        await service.apply_operations(1, [{"op": "increment", "product_id": 1, "quantity": -1}], test_db)
+        await service.apply_operations(1, [{"op": "set", "product_id": 1, "quantity": 1}], test_db)
+        with pytest.raises(ValueError, match="已下架"):
+            await service.apply_operations(1, [{"op": "increment", "product_id": 1, "quantity": 1}], test_db)
+        assert [line["quantity"] for line in await service.get_user_cart(1, test_db)] == [1]
@@ -43,6 +43,29 @@ class TestCategories:
         data = response.json()
         assert isinstance(data, list)
 
+    @pytest.mark.asyncio
+    async def test_get_categories_not_modified(self, client: AsyncClient):
+        """测试分类列表条件请求(Redis不可用时使用内容ETag)"""
+        response = await client.get("/api/categories")
+        etag = response.headers["etag"]
+
+        response = await client.get("/api/categories", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_catalog_etag_per_resource(self):
+        """测试目录版本ETag随版本号和URL变化, 与参数顺序无关"""
+        from starlette.requests import Request
+        from app.core.response_cache import catalog_etag
+
+        def make_request(path: str, query: str) -> Request:
+            return Request({"type": "http", "path": path, "query_string": query.encode(), "headers": []})
+
+        etag = catalog_etag(make_request("/api/products", "page=1&page_size=20"), 7)
+        assert etag == catalog_etag(make_request("/api/products", "page_size=20&page=1"), 7)
+        assert etag != catalog_etag(make_request("/api/products", "page=2&page_size=20"), 7)
+        assert etag != catalog_etag(make_request("/api/products", "page=1&page_size=20"), 8)
+
     @pytest.mark.asyncio
     async def test_get_category_by_id(self, client: AsyncClient):
         """测试获取单个分类"""
@@ -0,0 +1,106 @@
+"""
+数据库引擎和连接池配置测试
+"""
+import pytest
+
+
+class TestEngineConfiguration:
+    """按配置创建的连接池测试"""
+
+    @pytest.mark.asyncio
+    async def test_pool_settings(self):
+        """测试连接池参数来自调用方/Settings, SQLite不使用连接池参数"""
+        from app.core.database import create_engine_for, settings
+
+        engine = create_engine_for("postgresql+asyncpg://user:pw@localhost/db", 3, 1, 5.0)
+        try:
+            pool = engine.pool
+            assert pool.size() == 3
+            assert pool._max_overflow == 1
+            assert pool._timeout == 5.0
+            assert pool._recycle == settings.DB_POOL_RECYCLE
+            assert pool._pre_ping == settings.DB_POOL_PRE_PING
+        finally:
+            await engine.dispose()
+
+        sqlite_engine = create_engine_for("sqlite+aiosqlite:///:memory:", 3, 1)
+        assert not hasattr(sqlite_engine.pool, "_max_overflow")
+        await sqlite_engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_pool_metrics_per_pool(self, monkeypatch):
+        """测试连接池指标按连接池名称分别输出"""
+        from app.core import database, metrics
+
+        primary = database.create_engine_for("postgresql+asyncpg://user:pw@localhost/db", 10, 20)
+        reporting = database.create_engine_for("postgresql+asyncpg://user:pw@localhost/db", 2, 1)
+        monkeypatch.setattr(database, "get_engines", lambda: {"primary": primary, "reporting": reporting})
+        try:
+            rendered = "\n".join(metrics.DB_POOL.render())
+        finally:
+            await primary.dispose()
+            await reporting.dispose()
+
+        assert 'db_pool_connections{pool="primary",state="size"} 10' in rendered
+        assert 'db_pool_connections{pool="reporting",state="size"} 2' in rendered
+        assert 'db_pool_connections{pool="reporting",state="checked_out"} 0' in rendered
+
+    def test_statement_cache_settings(self, monkeypatch):
+        """测试asyncpg连接启用预编译语句缓存, 其他驱动不传该参数"""
+        from app.core import database
+
+        calls = []
+        monkeypatch.setattr(database, "create_async_engine", lambda url, **kwargs: calls.append(kwargs))
+        database.create_engine_for("postgresql+asyncpg://user:pw@localhost/db", 3, 1)
+        database.create_engine_for("sqlite+aiosqlite:///:memory:", 3, 1)
+
+        size = database.settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+        assert calls[0]["connect_args"] == {"prepared_statement_cache_size": size}
+        assert "connect_args" not in calls[1]
+        assert all(kwargs["query_cache_size"] == database.settings.DB_COMPILED_CACHE_SIZE for kwargs in calls)
+
+
+class TestStatementCache:
+    """Repository热点查询的语句缓存测试"""
+
+    @pytest.mark.asyncio
+    async def test_products_with_filter_reuses_statements(self, test_db):
+        """测试同一查询形状复用缓存的语句, 参数不同时结果正确"""
+        from app import repositories
+        from app.models import Product
+        from app.repositories import ProductRepository
+
+        repo = ProductRepository(Product, test_db)
+        products, total = await repo.get_products_with_filter(keyword="肉", sort_by="price_desc")
+        assert total == 4
+        assert [p.price for p in products] == sorted((p.price for p in products), reverse=True)
+        assert all("肉" in p.title + (p.description or "") for p in products)
+
+        statement = repositories._statements[(Product, "get_products_with_filter", (False, True, ("price", True)))]
+        products, total = await repo.get_products_with_filter(keyword="鸡", sort_by="price_desc", skip=1, limit=1)
+        assert total == 2
+        assert [p.title for p in products] == ["番茄鸡蛋汤"]
+        assert repositories._statements[(Product, "get_products_with_filter", (False, True, ("price", True)))] is statement
+
+        first = (await repo.get_products_with_filter(category_id=1, sort_by="unknown"))[0]
+        assert len(first) == 3 and {p.category_id for p in first} == {1}
+
+    @pytest.mark.asyncio
+    async def test_get_by_id_and_user_cart(self, test_db):
+        """测试get_by_id和购物车查询按参数返回对应的行"""
+        from app.models import CartItem, Product, User
+        from app.repositories import CartRepository, ProductRepository
+
+        user = User(phone="13800000001", password_hash="x")
+        test_db.add(user)
+        await test_db.flush()
+        test_db.add_all([CartItem(user_id=user.id, product_id=1, quantity=2), CartItem(user_id=user.id, product_id=2, quantity=1)])
+        await test_db.commit()
+
+        repo = ProductRepository(Product, test_db)
+        assert (await repo.get_by_id(2)).id == 2
+        assert await repo.get_by_id(999) is None
+
+        items = await CartRepository(CartItem, test_db).get_user_cart(user.id)
+        assert sorted((item.product_id, item.quantity, item.product.id) for item in items) == [(1, 2, 1), (2, 1, 2)]
+        assert await CartRepository(CartItem, test_db).get_user_cart(user.id + 1) == []
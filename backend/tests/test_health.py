@@ -0,0 +1,88 @@
+"""
+健康检查和只读降级测试
+"""
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+
+class TestHealthProbes:
+    """存活/就绪探针测试"""
+
+    @pytest.mark.asyncio
+    async def test_live_and_ready(self, client: AsyncClient):
+        """测试探针接口(测试环境没有生产数据库引擎和Redis)"""
+        response = await client.get("/health/live")
+        assert response.status_code == 200
+
+        response = await client.get("/health/ready")
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data["checks"]) == {"database", "redis", "db_pool", "event_loop"}
+        assert data["checks"]["redis"]["status"] == "disabled"
+        assert data["read_only"] is False
+
+    @pytest.mark.asyncio
+    async def test_database_check_and_cache(self, monkeypatch, test_db: AsyncSession):
+        """测试数据库检查, 结果在缓存期内复用, 并发调用只检查一次"""
+        from app.core import health
+
+        calls = []
+        original = health.check_database
+
+        async def counting_check(engine, timeout):
+            calls.append(engine)
+            return await original(engine, timeout)
+
+        monkeypatch.setattr(health, "check_database", counting_check)
+        checker = health.HealthChecker(lambda: test_db.bind)
+        reports = await asyncio.gather(*(checker.check() for _ in range(5)))
+        assert len(calls) == 1
+        assert all(report is reports[0] for report in reports)
+        assert reports[0]["status"] == "ok"
+        assert reports[0]["checks"]["database"]["status"] == "ok"
+
+        assert await checker.check() is reports[0]
+        await checker.check(max_age=0)
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_database_unavailable(self, tmp_path):
+        """测试数据库无法连接时状态为unavailable"""
+        from app.core.health import HealthChecker
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/db.sqlite")
+        report = await HealthChecker(lambda: engine).check()
+        await engine.dispose()
+        assert report["status"] == "unavailable"
+        assert report["checks"]["database"]["status"] == "error"
+
+
+class TestReadOnlyMode:
+    """Redis不可用时的只读降级测试"""
+
+    @pytest.mark.asyncio
+    async def test_rejects_writes_when_redis_down(self, monkeypatch, client: AsyncClient, test_token: str):
+        """测试Redis不可用时写请求返回503, 读请求和登录不受影响"""
+        from app.core import health
+
+        async def redis_down(timeout):
+            return {"status": health.ERROR, "error": "PING失败或超时"}
+
+        monkeypatch.setattr(health, "check_redis", redis_down)
+        monkeypatch.setattr(health.health_checker, "_report", None)
+        report = await health.health_checker.check(max_age=0)
+        assert report["read_only"] and report["status"] == "degraded"
+
+        headers = {"Authorization": f"Bearer {test_token}"}
+        response = await client.post("/api/cart", json={"product_id": 1, "quantity": 1}, headers=headers)
+        assert response.status_code == 503
+        assert "retry-after" in response.headers
+        assert (await client.get("/api/products/1")).status_code == 200
+        response = await client.post("/api/auth/login", json={"phone": "13800138000", "password": "test123456"})
+        assert response.status_code == 200
+
+        health_response = await client.get("/health")
+        assert health_response.json()["read_only"] is True
@@ -0,0 +1,94 @@
+"""
+日志队列、JSON格式和切分测试
+"""
+import json
+import logging
+import logging.handlers
+import queue
+
+import pytest
+from httpx import AsyncClient
+
+
+class TestStructuredLogging:
+    """QueueHandler日志管道测试"""
+
+    def test_queue_handler_json_with_context(self):
+        """测试记录带请求上下文、extra字段和异常文本, 经队列由监听线程格式化"""
+        from app.core.logger import ContextQueueHandler, JSONFormatter, request_context
+
+        output = []
+
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                output.append(self.format(record))
+
+        target = ListHandler()
+        target.setFormatter(JSONFormatter())
+        handler = ContextQueueHandler(queue.Queue())
+        listener = logging.handlers.QueueListener(handler.queue, target)
+        test_logger = logging.getLogger("tests.structured")
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        token = request_context.set({"request_id": "abc123", "method": "GET", "path": "/api/x"})
+        listener.start()
+        try:
+            test_logger.warning("库存不足: %s", 3, extra={"product_id": 7})
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                test_logger.exception("计算失败")
+        finally:
+            listener.stop()
+            request_context.reset(token)
+            test_logger.removeHandler(handler)
+            test_logger.propagate = True
+
+        first, second = (json.loads(line) for line in output)
+        assert first["message"] == "库存不足: 3"
+        assert first["level"] == "WARNING"
+        assert first["request_id"] == "abc123" and first["path"] == "/api/x"
+        assert first["product_id"] == 7
+        assert "exception" not in first
+        assert "ZeroDivisionError" in second["exception"]
+        assert second["message"] == "计算失败"
+
+    def test_debug_sampling_and_full_queue(self, monkeypatch):
+        """测试DEBUG日志超限后抽样, 队列满时丢弃不阻塞"""
+        from app.core.logger import ContextQueueHandler, DebugSampler
+
+        sampler = DebugSampler(limit=5, ratio=0.0)
+        debug = logging.LogRecord("t", logging.DEBUG, "", 0, "d", None, None)
+        error = logging.LogRecord("t", logging.ERROR, "", 0, "e", None, None)
+        kept = [sampler.filter(debug) for _ in range(20)]
+        assert sum(kept) == 5 and sampler.dropped == 15
+        assert sampler.filter(error)
+
+        handler = ContextQueueHandler(queue.Queue(2))
+        for _ in range(5):
+            handler.handle(logging.LogRecord("t", logging.INFO, "", 0, "i", None, None))
+        assert handler.queue.qsize() == 2 and handler.dropped == 3
+
+    def test_size_rotation(self, tmp_path):
+        """测试文件超过大小时提前切分, 同一时段内的历史文件追加序号"""
+        from app.core.logger import SizedTimedRotatingFileHandler
+
+        handler = SizedTimedRotatingFileHandler(tmp_path / "app.log", max_bytes=200, when="midnight", backupCount=5)
+        record = logging.LogRecord("t", logging.INFO, "", 0, "x" * 80, None, None)
+        for _ in range(8):
+            handler.handle(record)
+        handler.close()
+
+        rotated = sorted(path.name for path in tmp_path.iterdir() if path.name != "app.log")
+        assert len(rotated) == 3
+        assert rotated[0].count(".") == 2 and rotated[1].endswith(".001")
+        assert all(path.stat().st_size <= 200 for path in tmp_path.iterdir())
+
+    @pytest.mark.asyncio
+    async def test_request_id_header(self, client: AsyncClient):
+        """测试响应头返回X-Request-ID, 沿用客户端传入的值"""
+        response = await client.get("/api/products")
+        assert len(response.headers["x-request-id"]) == 32
+
+        response = await client.get("/api/products", headers={"X-Request-ID": "trace-1"})
+        assert response.headers["x-request-id"] == "trace-1"
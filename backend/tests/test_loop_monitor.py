@@ -0,0 +1,41 @@
+"""
+事件循环阻塞检测测试
+"""
+import asyncio
+import time
+
+import pytest
+
+
+class TestLoopBlockingDetector:
+    """阻塞采样与按路由汇总测试"""
+
+    @pytest.mark.asyncio
+    async def test_blocking_request_is_reported(self):
+        """测试请求中的同步阻塞被采样并按路由归类"""
+        from app.core.loop_monitor import LoopBlockingDetector, LoopBlockingMiddleware
+
+        async def slow_app(scope, receive, send):
+            time.sleep(0.2)  # 模拟在事件循环中执行同步代码
+
+        detector = LoopBlockingDetector(threshold=0.05, interval=0.01)
+        detector.start()
+        # 调试模式从下一次回调开始计时
+        await asyncio.sleep(0)
+        try:
+            await LoopBlockingMiddleware(slow_app, detector)({"type": "http", "method": "GET", "path": "/slow"}, None, None)
+            await asyncio.sleep(0.05)
+        finally:
+            detector.stop()
+
+        report = detector.report()
+        [offender] = [item for item in report["offenders"] if item["route"] == "GET /slow"]
+        assert offender["count"] == 1
+        assert 0.1 <= offender["max_seconds"] < 1
+        assert "test_loop_monitor.py" in offender["site"]
+        assert any("time.sleep" in line for line in offender["stack"])
+        assert any("took" in item["message"] for item in report["slow_callbacks"])
+        assert not asyncio.get_running_loop().get_debug()
+
+        detector.reset()
+        assert detector.report()["offenders"] == []
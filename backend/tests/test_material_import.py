@@ -0,0 +1,75 @@
+"""
+Material数据扫描测试
+"""
+import json
+
+import pytest
+
+from scripts.import_material_data import MaterialManifest, classify_product, iter_material_products
+
+
+class TestMaterialScanner:
+    """Material并行扫描和增量清单测试"""
+
+    @staticmethod
+    def write_recipe(directory, name: str, title: str):
+        (directory / f"{name}.json").write_text(
+            json.dumps({"title": title, "views_and_favorites": "120浏览 8收藏"}, ensure_ascii=False),
+            encoding="utf-8"
+        )
+        (directory / f"{name}.png").write_bytes(b"png")
+
+    def test_parse_and_classify(self, tmp_path):
+        """测试解析菜品并分类, 缺少图片的文件报告错误"""
+        self.write_recipe(tmp_path, "a", "西红柿鸡蛋汤")
+        (tmp_path / "b.json").write_text('{"title": "无图"}', encoding="utf-8")
+
+        stats = {}
+        products = list(iter_material_products(str(tmp_path), workers=0, stats=stats))
+        assert [(p["title"], p["category"], p["views"], p["favorites"]) for p in products] == [
+            ("西红柿鸡蛋汤", classify_product("西红柿鸡蛋汤"), 120, 8)
+        ]
+        assert stats["parse"]["errors"] == 1
+
+    def test_manifest_only_yields_changed_files(self, tmp_path):
+        """测试增量清单: 重新扫描只产出新增或内容变化的文件"""
+        material = tmp_path / "material"
+        material.mkdir()
+        self.write_recipe(material, "a", "红烧肉")
+        self.write_recipe(material, "b", "拍黄瓜")
+        manifest = MaterialManifest(str(tmp_path / "manifest.json"))
+
+        pending = {}
+        assert len(list(iter_material_products(str(material), workers=0, manifest=manifest, pending=pending))) == 2
+        manifest.update(pending)
+        manifest.save()
+
+        manifest = MaterialManifest(str(tmp_path / "manifest.json"))
+        assert list(iter_material_products(str(material), workers=0, manifest=manifest, pending={})) == []
+
+        self.write_recipe(material, "b", "凉拌黄瓜")
+        self.write_recipe(material, "c", "牛肉面")
+        titles = [p["title"] for p in iter_material_products(str(material), workers=0, manifest=manifest, pending={})]
+        assert titles == ["凉拌黄瓜", "牛肉面"]
+
+    @pytest.mark.asyncio
+    async def test_manifest_skips_rejected_files(self, tmp_path, test_db):
+        """测试导入时被拒绝的文件(如分类不存在)不写入清单, 下次重新处理"""
+        from app.services import ProductImportService
+        from scripts.import_products import imported_entries, iter_material_records
+
+        self.write_recipe(tmp_path, "a", "西红柿鸡蛋汤")
+        self.write_recipe(tmp_path, "b", "红烧肉")
+        manifest = MaterialManifest(str(tmp_path / "manifest.json"))
+        pending, sources, failed_lines = {}, [], set()
+        products = iter_material_products(str(tmp_path), workers=0, manifest=manifest, pending=pending, sources=sources)
+        records = (
+            (line, record if record["title"] == "红烧肉" else {**record, "category": "不存在的分类"})
+            for line, record in iter_material_records(products)
+        )
+
+        report, _ = await ProductImportService().import_records(records, test_db, failed_lines=failed_lines)
+
+        assert report["failed"] == 1
+        assert sources == ["a.json", "b.json"]
+        assert list(imported_entries(pending, sources, failed_lines)) == ["b.json"]
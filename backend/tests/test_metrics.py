@@ -0,0 +1,68 @@
+"""
+指标测试
+"""
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+
+class TestMetrics:
+    """Prometheus指标测试"""
+
+    def test_histogram_render(self):
+        """测试分桶累计、总和与计数的文本格式"""
+        from app.core.metrics import Histogram, Registry
+
+        registry = Registry()
+        histogram = Histogram("demo_seconds", "示例", ("route",), buckets=(0.1, 1.0), registry=registry)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, "/a")
+
+        lines = registry.render().splitlines()
+        assert 'demo_seconds_bucket{route="/a",le="0.1"} 2' in lines
+        assert 'demo_seconds_bucket{route="/a",le="1.0"} 3' in lines
+        assert 'demo_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+        assert 'demo_seconds_sum{route="/a"} 3.65' in lines
+        assert 'demo_seconds_count{route="/a"} 4' in lines
+
+    def test_redis_key_family(self):
+        """测试按key前两段归类"""
+        from app.core.metrics import redis_key_family
+
+        assert redis_key_family("product:detail:12") == "product:detail"
+        assert redis_key_family("products:response:list:None:None:created_at:1:20") == "products:response"
+        assert redis_key_family("cart:dirty") == "cart:dirty"
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self, client: AsyncClient):
+        """测试请求按路由模板记录, 指标以Prometheus文本格式输出"""
+        from app.core import metrics
+
+        before = metrics.HTTP_REQUESTS.value("GET", "/api/products/{product_id}", "200")
+        await client.get("/api/products/1")
+        await client.get("/api/products/2")
+        assert metrics.HTTP_REQUESTS.value("GET", "/api/products/{product_id}", "200") == before + 2
+
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE http_request_duration_seconds histogram" in response.text
+        assert 'route="/api/products/{product_id}"' in response.text
+        assert 'route="/metrics"' not in response.text
+
+    @pytest.mark.asyncio
+    async def test_loop_lag_monitor(self):
+        """测试事件循环被阻塞时记录延迟"""
+        import time
+        from app.core import metrics
+
+        monitor = metrics.LoopLagMonitor()
+        before = metrics.LOOP_LAG_HISTOGRAM.count()
+        monitor.start(interval=0.01)
+        await asyncio.sleep(0)
+        time.sleep(0.05)  # 阻塞事件循环
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+        assert metrics.LOOP_LAG_HISTOGRAM.count() > before
+        assert metrics.LOOP_LAG.value() >= 0
@@ -132,6 +132,41 @@ async def test_cancel_order(client: AsyncClient, test_token: str, test_db: Async
         assert response.status_code in [200, 400, 404, 405]
 
 
+@pytest.mark.asyncio
+async def test_cancel_order_invalidates_product_caches(
+    client: AsyncClient, test_token: str, test_db: AsyncSession, monkeypatch
+):
+    """测试取消订单提交后清除商品缓存并递增目录版本号(避免旧ETag一直返回304)"""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app import services
+    from app.core.security import decode_token
+    from app.models import Order, OrderItem, Product
+
+    bumps = []
+
+    async def bump():
+        bumps.append(True)
+
+    monkeypatch.setattr(services, "bump_catalog_generation", bump)
+
+    order = Order(order_number="TEST_STOCK", user_id=int(decode_token(test_token)["sub"]), total_amount=56, status="pending")
+    order.order_items.append(OrderItem(product_id=1, product_name="青椒炒肉", quantity=2, price=28, subtotal=56))
+    test_db.add(order)
+    await test_db.commit()
+    stock = (await test_db.get(Product, 1)).stock
+
+    response = await client.post(f"/api/orders/{order.id}/cancel", headers={"Authorization": f"Bearer {test_token}"})
+
+    assert response.status_code == 200
+    assert bumps == [True]
+
+    # 请求结束时会话关闭会丢弃未提交的修改; 用新会话确认库存释放和订单状态已提交
+    await test_db.rollback()
+    async with async_sessionmaker(test_db.bind, expire_on_commit=False)() as fresh:
+        assert (await fresh.get(Product, 1)).stock == stock + 2
+        assert (await fresh.get(Order, order.id)).status == "cancelled"
+
+
 @pytest.mark.asyncio
 async def test_pay_order(client: AsyncClient, test_token: str, test_db: AsyncSession):
     """测试支付订单"""
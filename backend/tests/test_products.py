@@ -198,3 +198,466 @@ class TestHealth:
         data = response.json()
         assert "message" in data
         assert "version" in data
+
+
+class TestProductBatchFetch:
+    """商品批量获取测试"""
+
+    @pytest.mark.asyncio
+    async def test_get_products_by_ids_keeps_order(self, test_db: AsyncSession):
+        """测试批量获取商品保持请求顺序并跳过不存在的商品"""
+        from app.services import ProductService
+        from app.schemas import ProductResponse
+
+        products = await ProductService().get_products_by_ids([3, 999, 1, 3], test_db)
+
+        assert [p["id"] for p in products] == [3, 1, 3]
+        # 缓存字典字段与ProductResponse一致
+        assert ProductResponse.model_validate(products[0]).id == 3
+
+    @pytest.mark.asyncio
+    async def test_redis_batch_without_connection(self):
+        """测试Redis未连接时批量接口降级"""
+        from app.core.redis_client import RedisClient
+
+        client = RedisClient()
+        assert await client.mget_json(["a", "b"]) == [None, None]
+        assert await client.mset_json({"a": 1}, expire={"a": 10}) is True
+
+        async with client.pipeline() as pipe:
+            pipe.get("a")
+            pipe.incr("b")
+        assert pipe.results == [None, None]
+
+    @pytest.mark.asyncio
+    async def test_detail_miss_counts_view_once(self, test_db: AsyncSession, monkeypatch):
+        """测试详情缓存未命中时浏览量只计一次: Redis已计数则不再写数据库"""
+        from app.core.redis_client import redis_client
+        from app.models import Product
+        from app.services import ProductService
+
+        async def views():
+            product = await test_db.get(Product, 1)
+            await test_db.refresh(product)
+            return product.views
+
+        before = await views()
+        await ProductService().get_product_detail_response(1, test_db)
+        assert await views() == before + 1
+
+        async def counted_batch(batch, transaction=False):
+            return [None] * (len(batch) - 1) + [7]
+
+        monkeypatch.setattr(redis_client, "_execute_batch", counted_batch)
+        await ProductService().get_product_detail(1, test_db)
+        await ProductService().get_product_detail_response(1, test_db)
+        assert await views() == before + 1
+
+
+class TestProductImport:
+    """商品批量导入测试(SQLite使用executemany写入暂存表)"""
+
+    @pytest.mark.asyncio
+    async def test_import_csv_upserts_and_reports_errors(self, test_db: AsyncSession):
+        """测试CSV导入: 按标题更新/新增, 未提供的字段保留原值, 错误行报告行号"""
+        import io
+        from decimal import Decimal
+        from sqlalchemy import select
+        from app.models import Product
+        from app.services import ProductImportService
+
+        csv_text = (
+            "title,category,price,stock,local_image_path\n"
+            "青椒炒肉,热菜,30.50,,\n"
+            "新菜品,凉菜,9.90,5,/images/new.png\n"
+            "坏价格,凉菜,abc,1,/images/x.png\n"
+            "新菜品,凉菜,1,1,/images/dup.png\n"
+            "无分类,不存在的分类,1,1,/images/y.png\n"
+        )
+        service = ProductImportService()
+        report, updated_ids = await service.import_records(
+            service.iter_records(io.StringIO(csv_text), "csv"), test_db
+        )
+        await test_db.commit()
+
+        assert (report["total_rows"], report["inserted"], report["updated"], report["failed"]) == (5, 1, 1, 3)
+        assert [error["line"] for error in report["errors"]] == [3, 4, 5]
+        assert "第2行" in report["errors"][1]["error"]
+
+        updated = (await test_db.execute(select(Product).where(Product.title == "青椒炒肉"))).scalar_one()
+        await test_db.refresh(updated)
+        assert updated_ids == [updated.id]
+        assert updated.price == Decimal("30.50")
+        assert updated.stock == 50
+
+        created = (await test_db.execute(select(Product).where(Product.title == "新菜品"))).scalar_one()
+        assert (created.price, created.stock, created.is_active) == (Decimal("9.90"), 5, True)
+
+    @pytest.mark.asyncio
+    async def test_import_image_change_resets_variants(self, test_db: AsyncSession):
+        """测试导入改变图片路径时清空衍生图, 图片未变化或未提供时保留"""
+        import io
+        from sqlalchemy import select
+        from app.models import Product
+        from app.services import ProductImportService
+
+        variants = {"thumb": {"webp": "/derived/old.webp"}}
+        products = (await test_db.execute(select(Product).where(Product.id.in_([1, 2, 3])))).scalars().all()
+        for product in products:
+            product.image_variants = variants
+        await test_db.commit()
+        by_id = {p.id: p for p in products}
+
+        csv_text = (
+            "title,category,price,local_image_path\n"
+            f"{by_id[1].title},热菜,1,/images/changed.png\n"
+            f"{by_id[2].title},热菜,1,{by_id[2].local_image_path}\n"
+            f"{by_id[3].title},热菜,1,\n"
+        )
+        service = ProductImportService()
+        await service.import_records(service.iter_records(io.StringIO(csv_text), "csv"), test_db)
+        await test_db.commit()
+
+        for product in products:
+            await test_db.refresh(product)
+        assert [by_id[i].image_variants for i in (1, 2, 3)] == [None, variants, variants]
+
+    @pytest.mark.asyncio
+    async def test_import_ndjson_creates_categories(self, test_db: AsyncSession):
+        """测试NDJSON导入和自动创建分类"""
+        import io
+        from app.services import ProductImportService
+
+        ndjson = '{"title": "寿司拼盘", "category": "日料", "price": 58}\nnot json\n\n[1]\n'
+        service = ProductImportService()
+        report, _ = await service.import_records(
+            service.iter_records(io.StringIO(ndjson), "ndjson"), test_db, create_missing_categories=True
+        )
+        assert (report["inserted"], report["failed"], report["categories_created"]) == (1, 2, 1)
+        assert [error["line"] for error in report["errors"]] == [2, 4]
+        assert service.detect_format("items.jsonl") == "ndjson"
+
+
+class TestImageVariants:
+    """商品衍生图测试"""
+
+    @staticmethod
+    def use_tmp_dirs(monkeypatch, tmp_path):
+        from app.core.images import settings
+
+        monkeypatch.setattr(settings, "IMAGE_DERIVATIVES_DIR", str(tmp_path / "derived"))
+        monkeypatch.setattr(settings, "STATIC_FILES_PATH", str(tmp_path / "static"))
+        (tmp_path / "static").mkdir()
+        return tmp_path / "static"
+
+    def test_generate_variants_idempotent(self, monkeypatch, tmp_path):
+        """测试生成等比缩略图, 按内容哈希命名, 重复生成不重新编码"""
+        from PIL import Image
+        from app.core.images import generate_variants, resolve_source
+
+        static_dir = self.use_tmp_dirs(monkeypatch, tmp_path)
+        Image.new("RGB", (800, 400), "red").save(static_dir / "dish.png")
+        source = resolve_source("/static/dish.png")
+        assert source is not None
+        assert resolve_source("/static/../secret.png") is None
+        assert resolve_source("/static/missing.png") is None
+
+        variants = generate_variants(str(source))
+        thumb_url = variants["thumb"]["webp"]
+        thumb_path = tmp_path / "derived" / thumb_url.split("/images/derived/")[1]
+        assert Image.open(thumb_path).size == (240, 120)
+        # 原图小于尺寸上限时不放大
+        large_url = variants["large"]["webp"]
+        assert Image.open(tmp_path / "derived" / large_url.split("/images/derived/")[1]).size == (800, 400)
+
+        mtime = thumb_path.stat().st_mtime_ns
+        assert generate_variants(str(source)) == variants
+        assert thumb_path.stat().st_mtime_ns == mtime
+
+    @pytest.mark.asyncio
+    async def test_refresh_image_variants(self, monkeypatch, tmp_path, test_db: AsyncSession):
+        """测试批量生成衍生图并保存到商品"""
+        from PIL import Image
+        from app.models import Product
+        from app.schemas import ProductResponse
+        from app.services import ProductService
+
+        static_dir = self.use_tmp_dirs(monkeypatch, tmp_path)
+        Image.new("RGB", (64, 64), "green").save(static_dir / "dish.png")
+        for product_id in (1, 2):
+            product = await test_db.get(Product, product_id)
+            product.local_image_path = "/static/dish.png"
+        await test_db.commit()
+
+        assert sorted(await ProductService().refresh_image_variants(test_db)) == [1, 2]
+        await test_db.commit()
+        product = await test_db.get(Product, 1)
+        await test_db.refresh(product)
+        assert set(product.image_variants) == {"thumb", "medium", "large"}
+        assert ProductResponse.model_validate(product).image_variants["thumb"]["webp"].endswith(".webp")
+
+        # 已有衍生图的商品不再处理
+        assert await ProductService().refresh_image_variants(test_db) == []
+
+
+class TestImageResize:
+    """按需缩放图片测试"""
+
+    @pytest.mark.asyncio
+    async def test_resize_endpoint(self, client: AsyncClient, monkeypatch, tmp_path):
+        """测试缩放接口返回缓存文件和长缓存头, 非法路径返回404"""
+        from PIL import Image
+        import io
+        import app.api.images as images_api
+        from app.core.images import ResizeCache, settings
+
+        monkeypatch.setattr(settings, "STATIC_FILES_PATH", str(tmp_path / "static"))
+        (tmp_path / "static").mkdir()
+        Image.new("RGB", (800, 600), "blue").save(tmp_path / "static" / "dish.png")
+        monkeypatch.setattr(images_api, "resize_cache", ResizeCache(str(tmp_path / "cache")))
+
+        response = await client.get("/api/images/resize", params={"path": "/static/dish.png", "w": 100})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert "max-age" in response.headers["cache-control"]
+        assert "content-encoding" not in response.headers
+        assert Image.open(io.BytesIO(response.content)).size == (100, 75)
+
+        response = await client.get("/api/images/resize", params={"path": "/static/../x.png", "w": 100})
+        assert response.status_code == 404
+        response = await client.get("/api/images/resize", params={"path": "/static/dish.png", "w": 100, "format": "bmp"})
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_resize_cache_coalesces_and_evicts(self, monkeypatch, tmp_path):
+        """测试并发请求同一尺寸只生成一次, 超过总字节数时淘汰最久未访问的文件"""
+        import asyncio
+        from PIL import Image
+        import app.core.images as images
+        from app.core.images import ResizeCache
+
+        source = tmp_path / "dish.png"
+        Image.new("RGB", (400, 400), "white").save(source)
+
+        calls = []
+        original = images.resize_to_file
+
+        def counting_resize(*args):
+            calls.append(args)
+            return original(*args)
+
+        monkeypatch.setattr(images, "resize_to_file", counting_resize)
+        cache = ResizeCache(str(tmp_path / "cache"), max_bytes=10 ** 9)
+        paths = await asyncio.gather(*(cache.get(source, 50, 50, "png") for _ in range(5)))
+        assert len(set(paths)) == 1 and len(calls) == 1
+
+        first = paths[0]
+        cache.max_bytes = first.stat().st_size + 1
+        second = await cache.get(source, 60, 60, "png")
+        assert second.exists() and not first.exists()
+        assert cache.total_bytes == second.stat().st_size
+        cache.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_resize_cache_bounded_across_workers(self, tmp_path):
+        """测试多个进程(实例)共享目录时按磁盘总量淘汰, 命中更新访问时间"""
+        import os
+        from PIL import Image
+        from app.core.images import ResizeCache
+
+        source = tmp_path / "dish.png"
+        Image.new("RGB", (400, 400), "white").save(source)
+        worker_a = ResizeCache(str(tmp_path / "cache"), max_bytes=10 ** 9, scan_seconds=0)
+        worker_b = ResizeCache(str(tmp_path / "cache"), max_bytes=10 ** 9, scan_seconds=0)
+
+        old = await worker_a.get(source, 50, 50, "png")
+        recent = await worker_a.get(source, 60, 60, "png")
+        os.utime(old, (1, 1))
+        os.utime(recent, (2, 2))
+        assert await worker_b.get(source, 50, 50, "png") == old
+
+        # 另一个进程写入的文件也计入总量, 淘汰最久未访问的文件
+        worker_b.EVICT_RATIO = 1.0
+        worker_b.max_bytes = old.stat().st_size + recent.stat().st_size
+        new = await worker_b.get(source, 40, 40, "png")
+        assert old.exists() and new.exists() and not recent.exists()
+        assert worker_b.total_bytes == old.stat().st_size + new.stat().st_size
+        worker_a.shutdown()
+        worker_b.shutdown()
+
+
+class TestImageUpload:
+    """商品图片上传测试"""
+
+    @pytest.mark.asyncio
+    async def test_streaming_upload_dedup(self, monkeypatch, tmp_path):
+        """测试分块保存、按内容哈希去重、超过大小上限时中止且不留临时文件"""
+        import io
+        from PIL import Image
+        from starlette.datastructures import UploadFile
+        from app.api.admin import uploads
+        from app.core import image_store
+        from app.core.images import settings
+
+        monkeypatch.setattr(settings, "IMAGE_STORE_DIR", str(tmp_path / "store"))
+        monkeypatch.setattr(settings, "IMAGE_DERIVATIVES_DIR", str(tmp_path / "derived"))
+        buffer = io.BytesIO()
+        Image.new("RGB", (300, 200), "blue").save(buffer, "PNG")
+        content = buffer.getvalue()
+
+        first = await uploads.save_upload(UploadFile(io.BytesIO(content), filename="a.png"))
+        second = await uploads.save_upload(UploadFile(io.BytesIO(content), filename="b.png"))
+        assert first["size"] == len(content)
+        assert not first["duplicate"] and second["duplicate"]
+        assert first["url"] == second["url"]
+        assert first["filename"] == f"{first['sha256']}.png"
+        assert second["variants"] == first["variants"] is not None
+
+        monkeypatch.setattr(uploads, "MAX_FILE_SIZE", len(content) - 1)
+        with pytest.raises(uploads.UploadRejected):
+            await uploads.save_upload(UploadFile(io.BytesIO(content + b"x"), filename="c.png"))
+        with pytest.raises(uploads.UploadRejected):
+            await uploads.save_upload(UploadFile(io.BytesIO(content), filename="d.txt"))
+        assert [path.name for path in image_store.iter_blobs()] == [first["filename"]]
+        assert list((tmp_path / "store" / image_store.TMP_DIR_NAME).iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_image_store_gc(self, monkeypatch, tmp_path, test_db: AsyncSession):
+        """测试导入路径写入存储去重, 回收不被商品或订单商品引用的文件"""
+        from app.core import image_store
+        from app.models import Order, OrderItem, Product
+        from app.services import ProductService
+
+        monkeypatch.setattr(image_store.settings, "IMAGE_STORE_DIR", str(tmp_path / "store"))
+        (tmp_path / "a.png").write_bytes(b"image-a")
+        (tmp_path / "copy.PNG").write_bytes(b"image-a")
+        (tmp_path / "b.png").write_bytes(b"image-b")
+
+        url_a, created = image_store.store_file(tmp_path / "a.png")
+        assert created and url_a.startswith("/images/store/")
+        assert image_store.store_file(tmp_path / "copy.PNG") == (url_a, False)
+        url_b, _ = image_store.store_file(tmp_path / "b.png")
+        (tmp_path / "c.png").write_bytes(b"image-c")
+        url_c, _ = image_store.store_file(tmp_path / "c.png")
+
+        product = await test_db.get(Product, 1)
+        product.local_image_path = url_a
+        # 只被订单历史引用的图片(商品已换图)
+        order = Order(order_number="TEST_GC", user_id=1, total_amount=28, status="completed")
+        order.order_items.append(
+            OrderItem(product_id=2, product_name="红烧肉", product_image=url_c, quantity=1, price=28, subtotal=28)
+        )
+        test_db.add(order)
+        await test_db.flush()
+
+        service = ProductService()
+        # 宽限期内不回收
+        assert (await service.collect_image_garbage(test_db))["removed"] == 0
+        stats = await service.collect_image_garbage(test_db, grace_seconds=0, dry_run=True)
+        assert stats == {"scanned": 3, "referenced": 2, "removed": 1, "freed_bytes": len(b"image-b")}
+        await service.collect_image_garbage(test_db, grace_seconds=0)
+        assert sorted(path.name for path in image_store.iter_blobs()) == sorted(
+            url.rsplit("/", 1)[1] for url in (url_a, url_c)
+        )
+
+
+class TestCacheCodec:
+    """缓存编解码测试"""
+
+    def test_codecs_round_trip(self):
+        """测试各codec编码后可被统一解码"""
+        from decimal import Decimal
+        from app.core.serialization import CODECS, decode_cache_value
+
+        value = {"id": 1, "title": "番茄炒蛋", "price": Decimal("28.50")}
+        for codec in CODECS.values():
+            assert decode_cache_value(codec.encode(value)) == {
+                "id": 1, "title": "番茄炒蛋", "price": "28.50"
+            }
+
+    def test_decode_legacy_and_unknown_values(self):
+        """测试旧的纯JSON缓存值可读, 未知格式按未命中处理"""
+        from app.core.serialization import decode_cache_value
+
+        assert decode_cache_value('{"id": 1}') == {"id": 1}
+        assert decode_cache_value(b"\x00zdata") is None
+        assert decode_cache_value(b"not json") is None
+        assert decode_cache_value(None) is None
+
+
+class TestProductResponseCache:
+    """商品响应缓存和ETag测试"""
+
+    @pytest.mark.asyncio
+    async def test_detail_etag(self, client: AsyncClient):
+        """测试商品详情返回完整字段和内容ETag"""
+        from app.core.response_cache import make_etag
+
+        response = await client.get("/api/products/1")
+        assert response.status_code == 200
+        assert response.headers["etag"] == make_etag(response.content)
+        data = response.json()
+        assert data["id"] == 1
+        assert "local_image_path" in data and "created_at" in data
+
+        response = await client.get("/api/products/999999")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_list_response_shape(self, client: AsyncClient):
+        """测试商品列表响应字段与ProductResponse一致"""
+        from app.schemas import ProductResponse
+
+        response = await client.get("/api/products?page_size=5")
+        assert response.status_code == 200
+        assert response.headers["etag"]
+        data = response.json()
+        for product in data["products"]:
+            assert set(product) == set(ProductResponse.model_fields)
+
+        response = await client.get(
+            "/api/products?page_size=5",
+            headers={"If-None-Match": f'W/"other", {response.headers["etag"]}'}
+        )
+        assert response.status_code == 304
+
+
+class TestResponseCompression:
+    """响应压缩测试"""
+
+    def test_negotiate_encoding(self):
+        """测试Accept-Encoding协商"""
+        from app.core.compression import negotiate_encoding, SUPPORTED_ENCODINGS
+
+        assert negotiate_encoding(None) is None
+        assert negotiate_encoding("identity") is None
+        assert negotiate_encoding("gzip;q=0") is None
+        assert negotiate_encoding("gzip, deflate") == "gzip"
+        assert negotiate_encoding("*") == SUPPORTED_ENCODINGS[0]
+        assert negotiate_encoding("br;q=0, *") == "gzip"
+
+    @pytest.mark.asyncio
+    async def test_precompressed_product_list(self, client: AsyncClient):
+        """测试商品列表返回预压缩内容, 与未压缩内容一致, 压缩版本有独立的ETag"""
+        plain = await client.get("/api/products?page_size=100", headers={"Accept-Encoding": "identity"})
+        assert plain.status_code == 200
+        assert "content-encoding" not in plain.headers
+
+        response = await client.get("/api/products?page_size=100", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert len(plain.content) >= 1024
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        # httpx自动解压
+        assert response.content == plain.content
+        assert response.headers["etag"] != plain.headers["etag"]
+        assert response.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+        # 任一编码版本的ETag都能命中条件请求
+        for etag in (response.headers["etag"], plain.headers["etag"]):
+            cached = await client.get(
+                "/api/products?page_size=100",
+                headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+            )
+            assert cached.status_code == 304
+            assert cached.headers["etag"] == etag
@@ -0,0 +1,94 @@
+"""
+采样式性能分析测试
+"""
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@pytest.fixture
+async def admin_token(test_db: AsyncSession):
+    """创建管理员并签发access token(测试种子数据中没有管理员)"""
+    from app.core.security import create_admin_access_token, get_password_hash
+    from app.models import Admin
+
+    admin = Admin(username="profiler_admin", password_hash=get_password_hash("admin123456"))
+    test_db.add(admin)
+    await test_db.commit()
+    return create_admin_access_token(admin.id)[0]
+
+
+def busy_wait(seconds: float):
+    """在事件循环线程中占用CPU"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSamplingProfiler:
+    """采样器和管理员分析接口测试"""
+
+    @pytest.mark.asyncio
+    async def test_collapsed_output(self):
+        """测试采样结果为collapsed stack格式, 热点函数在叶帧"""
+        from app.core.profiler import profile_worker
+
+        async def burn():
+            await asyncio.sleep(0.01)
+            busy_wait(0.2)
+
+        task = asyncio.create_task(burn())
+        profiler = await profile_worker(0.3, interval=0.005)
+        await task
+
+        assert profiler.samples > 0
+        lines = profiler.collapsed().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0
+        hot = [line for line in lines if "busy_wait (tests/test_profiler.py" in line.split(";")[-1]]
+        assert hot and sum(int(line.rsplit(" ", 1)[1]) for line in hot) >= 10
+
+    @pytest.mark.asyncio
+    async def test_profile_endpoint_requires_admin(self, client: AsyncClient, test_token: str, admin_token: str):
+        """测试按时长分析接口只对管理员开放, 返回文本"""
+        response = await client.get(
+            "/api/admin/diagnostics/profile",
+            params={"seconds": 0.05},
+            headers={"Authorization": f"Bearer {test_token}"},
+        )
+        assert response.status_code == 401
+
+        response = await client.get(
+            "/api/admin/diagnostics/profile",
+            params={"seconds": 0.05, "interval_ms": 5},
+            headers={"Authorization": f"Bearer {admin_token}"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert int(response.headers["x-profile-samples"]) > 0
+
+    @pytest.mark.asyncio
+    async def test_profile_single_request(self, client: AsyncClient, test_token: str, admin_token: str):
+        """测试通过请求头分析单个请求, 非管理员token不触发分析"""
+        response = await client.get("/api/products", headers={"X-Profile-Token": test_token})
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+
+        response = await client.get("/api/products", headers={"X-Profile-Token": admin_token})
+        assert response.status_code == 200
+        profile_id = response.headers["x-profile-id"]
+
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        profiles = (await client.get("/api/admin/diagnostics/profiles", headers=admin_headers)).json()
+        assert profiles[0]["id"] == profile_id
+        assert profiles[0]["request"] == "GET /api/products"
+
+        response = await client.get(f"/api/admin/diagnostics/profiles/{profile_id}", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.headers["x-profile-samples"] == str(profiles[0]["samples"])
+
+        response = await client.get("/api/admin/diagnostics/profiles/missing", headers=admin_headers)
+        assert response.status_code == 404
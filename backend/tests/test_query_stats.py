@@ -0,0 +1,76 @@
+"""
+请求SQL查询统计测试
+"""
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.query_stats import QueryBudgetExceeded, fingerprint, instrument_engines, track_queries
+
+
+class TestQueryStats:
+    """查询计数、Server-Timing和N+1检测测试"""
+
+    def test_fingerprint(self):
+        """测试字面量、绑定参数和IN列表归一"""
+        assert fingerprint("SELECT * FROM products WHERE id = 1") == "SELECT * FROM products WHERE id = ?"
+        assert fingerprint("SELECT *\n  FROM t WHERE name = 'a''b' AND id IN (?, ?, ?)") == (
+            "SELECT * FROM t WHERE name = ? AND id IN (?)"
+        )
+        assert fingerprint("SELECT * FROM t WHERE id = $1") == fingerprint("SELECT * FROM t WHERE id = %(id_1)s")
+
+    @pytest.mark.asyncio
+    async def test_server_timing_header(self, client: AsyncClient):
+        """测试响应头包含本次请求的查询次数和耗时"""
+        response = await client.get("/api/products/1")
+        assert response.status_code == 200
+        timing = response.headers["server-timing"]
+        assert timing.startswith("db;dur=")
+        assert 'desc="' in timing and "queries" in timing
+
+    @pytest.mark.asyncio
+    async def test_budget_and_repeated_statements(self, test_db: AsyncSession):
+        """测试超过预算抛出异常, 逐个查询被识别为重复语句"""
+        from app.models import Product
+        from app.repositories import ProductRepository
+
+        instrument_engines()
+        repo = ProductRepository(Product, test_db)
+        with pytest.raises(QueryBudgetExceeded):
+            with track_queries(budget=5) as stats:
+                for product_id in range(1, 13):
+                    await repo.get_by_id(product_id)
+        assert stats.count == 12
+        [(sql, count)] = stats.repeated(threshold=10)
+        assert count == 12 and "WHERE products.id = ?" in sql
+
+        with track_queries(budget=1) as stats:
+            await repo.get_by_ids(list(range(1, 13)))
+        assert stats.count == 1 and stats.seconds > 0
+
+    @pytest.mark.asyncio
+    async def test_export_orders_query_count(self, test_db: AsyncSession):
+        """测试导出订单CSV的查询次数与订单数量无关"""
+        from decimal import Decimal
+        from app.models import Order, OrderItem, User
+        from app.services import AdminService
+
+        user = User(phone="13900000000", password_hash="x", nickname="导出")
+        test_db.add(user)
+        await test_db.flush()
+        for index in range(20):
+            order = Order(order_number=f"EXPORT{index:04d}", user_id=user.id, total_amount=Decimal("28.00"))
+            test_db.add(order)
+            await test_db.flush()
+            test_db.add(OrderItem(
+                order_id=order.id, product_id=1, product_name="青椒炒肉",
+                quantity=1, price=Decimal("28.00"), subtotal=Decimal("28.00")
+            ))
+        await test_db.flush()
+
+        instrument_engines()
+        with track_queries(budget=4):
+            content = await AdminService().export_orders_to_csv(db=test_db)
+        lines = content.strip().splitlines()
+        assert len(lines) == 21
+        assert lines[1].split(",")[2:5] == ["13900000000", "导出", "1"]
@@ -0,0 +1,157 @@
+"""
+只读副本路由和读写一致性测试(两个SQLite文件分别模拟主库和副本)
+"""
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """主库和副本中同一分类的名称不同, 据此判断查询发到了哪个库"""
+    from app.core.database import create_session_factory
+    from app.models import Base, Category, Product
+
+    engines = {}
+    for name in ("primary", "replica"):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/{name}.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(Category.__table__.insert().values(id=1, name=name, code="hot_dish"))
+            await conn.execute(Product.__table__.insert().values(
+                id=1, title=name, category_id=1, local_image_path="/images/x.png", price=1, stock=1
+            ))
+        engines[name] = engine
+
+    yield create_session_factory(engines["primary"], engines["replica"])
+
+    for engine in engines.values():
+        await engine.dispose()
+
+
+class TestReplicaRouting:
+    """RoutingSession按语句和上下文选择主库或副本"""
+
+    @pytest.mark.asyncio
+    async def test_replica_reads_only_in_marked_methods(self, session_factory):
+        """测试只有@replica_reads方法中的SELECT读副本, 固定主库时不读副本"""
+        from app.core.database import pin_primary
+        from app.repositories import CategoryRepository
+        from app.models import Category
+        from app.services import CategoryService
+
+        async with session_factory() as db:
+            assert (await CategoryService().get_category_by_id(1, db)).name == "replica"
+        async with session_factory() as db:
+            assert (await CategoryRepository(Category, db).get_by_id(1)).name == "primary"
+        async with session_factory() as db:
+            with pin_primary():
+                assert (await CategoryService().get_category_by_id(1, db)).name == "primary"
+
+    @pytest.mark.asyncio
+    async def test_reads_after_write_and_locking_reads_use_primary(self, session_factory):
+        """测试会话写入后的查询和SELECT ... FOR UPDATE都在主库"""
+        from app.core.database import replica_reads
+        from app.models import Category
+        from app.services import CategoryService
+
+        async with session_factory() as db:
+            db.add(Category(name="new", code="new"))
+            await db.flush()
+            assert (await CategoryService().get_category_by_id(1, db)).name == "primary"
+            await db.rollback()
+
+        @replica_reads
+        async def locked_read(db):
+            result = await db.execute(select(Category).where(Category.id == 1).with_for_update())
+            return result.scalar_one()
+
+        async with session_factory() as db:
+            assert (await locked_read(db)).name == "primary"
+
+
+    @pytest.mark.asyncio
+    async def test_cache_fills_read_primary(self, session_factory):
+        """测试回填共享缓存的方法读主库, 即使调用方处于@replica_reads方法中"""
+        import json
+        from app.core.database import replica_reads
+        from app.services import ProductService
+
+        service = ProductService()
+        async with session_factory() as db:
+            products, _ = await service.get_products(db=db)
+            assert products[0].title == "replica"
+        async with session_factory() as db:
+            cached = await service.get_products_response(db=db)
+            assert json.loads(cached.body)["products"][0]["title"] == "primary"
+        async with session_factory() as db:
+            assert (await service.get_product_detail(1, db)).title == "primary"
+
+        @replica_reads
+        async def read_in_replica_context(db):
+            return await service.get_products_by_ids([1], db)
+
+        async with session_factory() as db:
+            assert (await read_in_replica_context(db))[0]["title"] == "primary"
+
+
+class TestReadYourWrites:
+    """写入标记和ReadRoutingMiddleware测试"""
+
+    @pytest.mark.asyncio
+    async def test_middleware_pins_recent_writers(self):
+        """测试写请求、刚写入的用户和目录写入后的请求固定读主库"""
+        from app.core import database
+        from app.core.read_routing import CATALOG, ReadRoutingMiddleware, WriteFence, user_scope
+        from app.core.security import create_user_access_token
+
+        pinned = []
+
+        async def app(scope, receive, send):
+            pinned.append(database._primary_pinned.get())
+
+        fence = WriteFence(5, enabled=True)
+        middleware = ReadRoutingMiddleware(app, fence)
+
+        async def request(method="GET", user_id=None):
+            headers = []
+            if user_id is not None:
+                token = create_user_access_token(user_id)[0]
+                headers.append((b"authorization", f"Bearer {token}".encode()))
+            await middleware({"type": "http", "method": method, "path": "/api/x", "headers": headers}, None, None)
+            return pinned[-1]
+
+        assert await request(user_id=1) is False
+        assert await request("POST", user_id=1) is True
+
+        await fence.mark(user_scope(1))
+        assert await request(user_id=1) is True
+        assert await request(user_id=2) is False
+        assert await request() is False
+
+        await fence.mark(CATALOG)
+        assert await request(user_id=2) is True
+        assert database._primary_pinned.get() is False
+
+        fence.seconds = 0
+        await fence.mark(user_scope(1), CATALOG)
+        assert await request(user_id=1) is False
+
+    @pytest.mark.asyncio
+    async def test_catalog_fence_set_before_invalidation(self, monkeypatch):
+        """测试目录写入标记在清除缓存和递增版本号之前设置"""
+        from app import services
+
+        calls = []
+
+        async def fence():
+            calls.append("fence")
+
+        async def bump():
+            calls.append("bump")
+
+        monkeypatch.setattr(services, "mark_catalog_write", fence)
+        monkeypatch.setattr(services, "bump_catalog_generation", bump)
+        await services.ProductService.invalidate_cache([1])
+        await services.CategoryService.invalidate_cache()
+        assert calls == ["fence", "bump", "fence", "bump"]
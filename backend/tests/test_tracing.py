@@ -0,0 +1,102 @@
+"""
+链路追踪测试
+"""
+import json
+
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.fixture
+def memory_exporter():
+    """全局tracer改为内存导出, 测试结束后关闭追踪"""
+    from app.core.tracing import InMemorySpanExporter, SimpleSpanProcessor, instrument_layers, tracer
+
+    instrument_layers()
+    exporter = InMemorySpanExporter()
+    tracer.configure(SimpleSpanProcessor(exporter))
+    yield exporter
+    tracer.configure(None)
+
+
+class TestTracing:
+    """span模型、上下文传递和导出测试"""
+
+    @pytest.mark.asyncio
+    async def test_request_spans_across_layers(self, memory_exporter, client: AsyncClient, test_token: str):
+        """测试请求根span沿用traceparent, service和repository调用作为子span"""
+        memory_exporter.clear()
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        response = await client.post(
+            "/api/cart",
+            json={"product_id": 1, "quantity": 1},
+            headers={
+                "Authorization": f"Bearer {test_token}",
+                "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01",
+            },
+        )
+        assert response.status_code == 200
+        assert response.headers["x-trace-id"] == trace_id
+
+        spans = {span.span_id: span for span in memory_exporter.spans}
+        assert all(span.trace_id == trace_id for span in spans.values())
+        [root] = [span for span in spans.values() if span.kind == "SPAN_KIND_SERVER"]
+        assert root.name == "POST /api/cart"
+        assert root.parent_span_id == "00f067aa0ba902b7"
+        assert root.attributes["http.status_code"] == 200
+
+        names = [span.name for span in memory_exporter.spans]
+        assert "CartService.add_item" in names
+        assert any(name.startswith("ProductRepository.") for name in names)
+        # 子span都挂在根span之下
+        for span in spans.values():
+            if span is root:
+                continue
+            parent = span
+            while parent.parent_span_id in spans:
+                parent = spans[parent.parent_span_id]
+            assert parent is root
+            assert span.end_time >= span.start_time
+
+    @pytest.mark.asyncio
+    async def test_unsampled_and_errors(self, memory_exporter):
+        """测试不在追踪中时不产生span, 异常记录到span状态"""
+        from app.core.tracing import parse_traceparent, traced, tracer
+
+        @traced("failing", "service")
+        async def failing():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await failing()
+        assert memory_exporter.spans == []
+
+        with pytest.raises(ValueError):
+            with tracer.start_span("root"):
+                await failing()
+        child, root = memory_exporter.spans
+        assert child.parent_span_id == root.span_id
+        assert child.status == root.status == "STATUS_CODE_ERROR"
+        assert child.events[0]["attributes"]["exception.type"] == "ValueError"
+
+        assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+        assert parse_traceparent("garbage") is None
+        assert parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00")[2] is False
+
+    def test_batch_file_export(self, tmp_path):
+        """测试批量处理器在关闭时导出剩余span到JSON lines文件"""
+        from app.core.tracing import BatchSpanProcessor, FileSpanExporter, Tracer
+
+        path = tmp_path / "traces.jsonl"
+        local_tracer = Tracer()
+        local_tracer.configure(BatchSpanProcessor(FileSpanExporter(str(path)), batch_size=2, interval=60))
+        with local_tracer.start_span("root", attributes={"k": "v"}):
+            for _ in range(3):
+                with local_tracer.start_span("child"):
+                    pass
+        local_tracer.shutdown()
+
+        rows = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [row["name"] for row in rows] == ["child", "child", "child", "root"]
+        assert rows[-1]["attributes"] == {"k": "v"}
+        assert {row["traceId"] for row in rows} == {rows[-1]["traceId"]}